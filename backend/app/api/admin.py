@@ -1,46 +1,45 @@
-from fastapi import APIRouter, HTTPException, Depends
-from sqlalchemy.orm import Session
-from typing import List
-import csv
-import io
+from fastapi import APIRouter, HTTPException, Depends, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
+from datetime import datetime
 import os
-import base64
-import random
 from fastapi.responses import StreamingResponse, FileResponse
 
 from ..models.user import User, UserCreate, UserRole, UserUpdate
-from ..models.appointment import Appointment
-from ..core.database import get_db
-from ..db.models import DBUser, DBAppointment
-from ..core.security import get_password_hash
+from ..models.appointment import Appointment, AppointmentStatus
+from ..core.database import get_async_db
+from ..db.models import DBUser, DBAppointment, DBAppointmentRollup
+from ..db.queries import appointment_listing_query, to_appointments
+from ..db.pagination import Page, PageParams, page_params, fetch_page, to_naive
+from ..db.exports import stream_appointments_csv, stream_appointments_ndjson
+from ..db.manifest import facility_day
+from ..core.security import default_password_hash
+from ..core.auth import (
+    Principal, get_current_principal, invalidate_principal, require_admin, require_staff, require_staff_query_token
+)
+from ..core.faces import ingest_face, enroll_embedding
+from ..core.images import (
+    ImageIngestError, FACE_IMAGES_DIR, THUMBNAIL_SIZES, blob_digest, thumbnail_path, image_etag, etag_matches
+)
 
 router = APIRouter()
 
-FACE_IMAGES_DIR = "storage/faces"
-os.makedirs(FACE_IMAGES_DIR, exist_ok=True)
-
 @router.post("/create-user", response_model=User)
-async def admin_create_user(user: UserCreate, admin_id: int, db: Session = Depends(get_db)): 
-    admin = db.query(DBUser).filter(DBUser.id == admin_id).first()
-    if not admin or admin.role != UserRole.ADMIN:
-        raise HTTPException(status_code=403, detail="Only admins can create employees/security")
-
-    existing = db.query(DBUser).filter(DBUser.phone_number == user.phone_number).first()
+async def admin_create_user(user: UserCreate, admin: Principal = Depends(require_admin), db: AsyncSession = Depends(get_async_db)): 
+    existing = await db.scalar(select(DBUser).where(DBUser.phone_number == user.phone_number))
     if existing:
         raise HTTPException(status_code=400, detail="User already registered")
 
-    default_hashed = get_password_hash("admin123")
+    default_hashed = await default_password_hash()
 
     image_path = None
+    face_embedding = None
     if user.face_image:
         try:
-            header, encoded = user.face_image.split(",", 1)
-            image_data = base64.b64decode(encoded)
-            image_filename = f"staff_{user.phone_number}_{random.randint(1000, 9999)}.jpg"
-            image_path = os.path.join(FACE_IMAGES_DIR, image_filename)
-            with open(image_path, "wb") as f:
-                f.write(image_data)
-        except Exception as e:
+            image_path, face_embedding = await ingest_face(user.face_image)
+        except ImageIngestError as e:
             raise HTTPException(status_code=400, detail=f"Invalid face image data: {str(e)}")
 
     new_user = DBUser(
@@ -55,86 +54,150 @@ async def admin_create_user(user: UserCreate, admin_id: int, db: Session = Depen
         face_image_path=image_path
     )
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    await db.commit()
+    await db.refresh(new_user)
+    if face_embedding is not None:
+        await run_in_threadpool(enroll_embedding, new_user.id, face_embedding)
     return new_user
 
-@router.get("/appointments/all", response_model=List[Appointment])
-async def get_all_appointments(db: Session = Depends(get_db)):
-    appts = db.query(DBAppointment).all()
-    results = []
-    for appt in appts:
-        res = Appointment.from_orm(appt)
-        if appt.visitor:
-            res.visitor_name = appt.visitor.full_name
-            res.visitor_phone = appt.visitor.phone_number
-        results.append(res)
-    return results
+@router.get("/appointments/all", response_model=Page[Appointment])
+async def get_all_appointments(
+    status: Optional[List[AppointmentStatus]] = Query(None),
+    page: PageParams = Depends(page_params),
+    admin: Principal = Depends(require_admin),
+    db: AsyncSession = Depends(get_async_db)
+):
+    query = appointment_listing_query()
+    if status:
+        query = query.where(DBAppointment.status.in_(status))
+    appts, next_cursor = await fetch_page(
+        db, query, page, id_col=DBAppointment.id, sort_col=DBAppointment.scheduled_time
+    )
+    return {"items": to_appointments(appts), "next_cursor": next_cursor}
 
 @router.get("/users/employees")
-async def list_employees(db: Session = Depends(get_db)):
-    users = db.query(DBUser).filter(DBUser.role == UserRole.EMPLOYEE).all()
+async def list_employees(principal: Principal = Depends(get_current_principal), db: AsyncSession = Depends(get_async_db)):
+    """Host directory for the booking form, so any signed-in user may read it."""
+    users = (await db.scalars(select(DBUser).where(DBUser.role == UserRole.EMPLOYEE))).all()
     return [{"id": u.id, "full_name": u.full_name, "phone_number": u.phone_number, "email": u.email} for u in users]
 
 @router.get("/users/security")
-async def list_security(db: Session = Depends(get_db)):
-    users = db.query(DBUser).filter(DBUser.role == UserRole.SECURITY).all()
+async def list_security(admin: Principal = Depends(require_admin), db: AsyncSession = Depends(get_async_db)):
+    users = (await db.scalars(select(DBUser).where(DBUser.role == UserRole.SECURITY))).all()
     return [{"id": u.id, "full_name": u.full_name, "phone_number": u.phone_number, "email": u.email} for u in users]
 
 @router.get("/reports/stats")
-async def get_system_stats(admin_id: int, db: Session = Depends(get_db)):
-    admin = db.query(DBUser).filter(DBUser.id == admin_id).first()
-    if not admin or admin.role != UserRole.ADMIN:
-        raise HTTPException(status_code=403, detail="Unauthorized")
-
-    total_visitors = db.query(DBUser).filter(DBUser.role == UserRole.VISITOR).count()
-    total_employees = db.query(DBUser).filter(DBUser.role == UserRole.EMPLOYEE).count()
-    pending_appts = db.query(DBAppointment).filter(DBAppointment.status == "pending").count()
-    completed_appts = db.query(DBAppointment).filter(DBAppointment.status == "completed").count()
+async def get_system_stats(admin: Principal = Depends(require_admin), db: AsyncSession = Depends(get_async_db)):
+    role_counts = dict((await db.execute(
+        select(DBUser.role, func.count()).group_by(DBUser.role)
+    )).all())
+    status_counts = dict((await db.execute(
+        select(DBAppointmentRollup.status, func.sum(DBAppointmentRollup.appointment_count))
+        .group_by(DBAppointmentRollup.status)
+    )).all())
 
     return {
-        "total_visitors": total_visitors,
-        "total_employees": total_employees,
-        "pending_appointments": pending_appts,
-        "completed_appointments": completed_appts,
-        "total_appointments": db.query(DBAppointment).count()
+        "total_visitors": role_counts.get(UserRole.VISITOR.value, 0),
+        "total_employees": role_counts.get(UserRole.EMPLOYEE.value, 0),
+        "pending_appointments": status_counts.get(AppointmentStatus.PENDING.value) or 0,
+        "completed_appointments": status_counts.get(AppointmentStatus.COMPLETED.value) or 0,
+        "total_appointments": sum(count or 0 for count in status_counts.values())
     }
 
+@router.get("/reports/visits")
+async def get_visit_series(
+    granularity: str = Query("day", pattern="^(hour|day)$"),
+    host_id: Optional[int] = None,
+    host_name: Optional[str] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    admin: Principal = Depends(require_admin),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Visits (checked in or completed) and average visit duration per hour or facility-local day.
+
+    Filter by `host_id`, or by `host_name` for the staff accounts currently using that name.
+    """
+
+    query = select(
+        DBAppointmentRollup.bucket_start,
+        func.sum(DBAppointmentRollup.appointment_count),
+        func.sum(DBAppointmentRollup.visit_count),
+        func.sum(DBAppointmentRollup.visit_seconds),
+    ).where(DBAppointmentRollup.status.in_([AppointmentStatus.CHECKED_IN.value, AppointmentStatus.COMPLETED.value]))
+    if host_id is not None:
+        query = query.where(DBAppointmentRollup.host_id == host_id)
+    if host_name:
+        query = query.where(DBAppointmentRollup.host_id.in_(
+            select(DBUser.id).where(DBUser.full_name == host_name, DBUser.role != UserRole.VISITOR)
+        ))
+    if date_from is not None:
+        query = query.where(DBAppointmentRollup.bucket_start >= to_naive(date_from))
+    if date_to is not None:
+        query = query.where(DBAppointmentRollup.bucket_start < to_naive(date_to))
+    rows = (await db.execute(
+        query.group_by(DBAppointmentRollup.bucket_start).order_by(DBAppointmentRollup.bucket_start)
+    )).all()
+
+    series = {}
+    for bucket_start, visits, timed_visits, visit_seconds in rows:
+        bucket = bucket_start if granularity == "hour" else facility_day(bucket_start)
+        entry = series.setdefault(bucket, [0, 0, 0])
+        entry[0] += visits or 0
+        entry[1] += timed_visits or 0
+        entry[2] += visit_seconds or 0
+
+    return [
+        {
+            "bucket": bucket,
+            "visits": visits,
+            "average_visit_minutes": round(visit_seconds / timed_visits / 60, 1) if timed_visits else None
+        }
+        for bucket, (visits, timed_visits, visit_seconds) in series.items()
+    ]
+
 @router.get("/reports/appointments/csv")
-async def export_appointments_csv(admin_id: int, db: Session = Depends(get_db)):
-    admin = db.query(DBUser).filter(DBUser.id == admin_id).first()
-    if not admin or admin.role != UserRole.ADMIN:
-        raise HTTPException(status_code=403, detail="Unauthorized")
-
-    output = io.StringIO()
-    writer = csv.writer(output)
-    writer.writerow(["ID", "Visitor ID", "Host Name", "Purpose", "Type", "Scheduled Time", "Duration (mins)", "Status", "Created At"])
-    
-    appts = db.query(DBAppointment).all()
-    for appt in appts:
-        writer.writerow([
-            appt.id,
-            appt.visitor_id,
-            appt.host_name,
-            appt.purpose,
-            appt.appointment_type,
-            appt.scheduled_time,
-            appt.duration_minutes,
-            appt.status,
-            appt.created_at
-        ])
-    
-    output.seek(0)
+async def export_appointments_csv(
+    status: Optional[List[AppointmentStatus]] = Query(None),
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    admin: Principal = Depends(require_admin)
+):
+    return await export_appointments("csv", status, date_from, date_to, admin)
+
+@router.get("/reports/appointments/export")
+async def export_appointments(
+    format: str = Query("csv", pattern="^(csv|ndjson)$"),
+    status: Optional[List[AppointmentStatus]] = Query(None),
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    admin: Principal = Depends(require_admin)
+):
+    date_from, date_to = to_naive(date_from), to_naive(date_to)
+    if format == "ndjson":
+        return StreamingResponse(
+            stream_appointments_ndjson(date_from, date_to, status),
+            media_type="application/x-ndjson",
+            headers={"Content-Disposition": "attachment; filename=appointments_report.ndjson"}
+        )
     return StreamingResponse(
-        io.BytesIO(output.getvalue().encode('utf-8')),
+        stream_appointments_csv(date_from, date_to, status),
         media_type="text/csv",
         headers={"Content-Disposition": "attachment; filename=appointments_report.csv"}
     )
 
 @router.get("/users/all-staff")
-async def list_all_staff(db: Session = Depends(get_db)):
-    users = db.query(DBUser).filter(DBUser.role != UserRole.VISITOR).all()
-    return [
+async def list_all_staff(
+    role: Optional[UserRole] = None,
+    page: PageParams = Depends(page_params),
+    admin: Principal = Depends(require_admin),
+    db: AsyncSession = Depends(get_async_db)
+):
+    query = select(DBUser).where(DBUser.role != UserRole.VISITOR)
+    if role:
+        query = query.where(DBUser.role == role)
+    users, next_cursor = await fetch_page(db, query, page, id_col=DBUser.id, date_col=DBUser.created_at)
+    items = [
         {
             "id": u.id, 
             "full_name": u.full_name, 
@@ -145,17 +208,16 @@ async def list_all_staff(db: Session = Depends(get_db)):
         }
         for u in users
     ]
+    return {"items": items, "next_cursor": next_cursor}
 
 @router.patch("/users/{user_id}", response_model=User)
-async def update_user(user_id: int, update_data: UserUpdate, admin_id: int, db: Session = Depends(get_db)):
-    admin = db.query(DBUser).filter(DBUser.id == admin_id).first()
-    if not admin or admin.role != UserRole.ADMIN:
-        raise HTTPException(status_code=403, detail="Unauthorized")
-
-    user = db.query(DBUser).filter(DBUser.id == user_id).first()
+async def update_user(user_id: int, update_data: UserUpdate, admin: Principal = Depends(require_admin), db: AsyncSession = Depends(get_async_db)):
+    user = await db.scalar(select(DBUser).where(DBUser.id == user_id))
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
+    previous_phone = user.phone_number
 
+    face_embedding = None
     update_dict = update_data.dict(exclude_unset=True)
     for key, value in update_dict.items():
         if key == "address":
@@ -167,28 +229,34 @@ async def update_user(user_id: int, update_data: UserUpdate, admin_id: int, db:
                 user.address = value
         elif key == "face_image":
             try:
-                header, encoded = value.split(",", 1)
-                image_data = base64.b64decode(encoded)
-                image_filename = f"staff_{user.phone_number}_{random.randint(1000, 9999)}.jpg"
-                image_path = os.path.join(FACE_IMAGES_DIR, image_filename)
-                with open(image_path, "wb") as f:
-                    f.write(image_data)
-                user.face_image_path = image_path
-            except Exception as e:
+                user.face_image_path, face_embedding = await ingest_face(value)
+            except ImageIngestError as e:
                 raise HTTPException(status_code=400, detail=f"Invalid face image data: {str(e)}")
         else:
             setattr(user, key, value)
 
-    db.commit()
-    db.refresh(user)
+    await db.commit()
+    await db.refresh(user)
+    # Tokens carry the phone number as subject; drop cached roles/names for the old and new one
+    invalidate_principal(previous_phone, user.phone_number)
+    if face_embedding is not None:
+        await run_in_threadpool(enroll_embedding, user.id, face_embedding)
     return user
 
 
 @router.get("/users/visitors")
-async def list_visitors(db: Session = Depends(get_db)):
-    """Return a lightweight list of registered visitors for admin/security consoles."""
-    users = db.query(DBUser).filter(DBUser.role == UserRole.VISITOR).all()
-    return [
+async def list_visitors(
+    is_verified: Optional[bool] = None,
+    page: PageParams = Depends(page_params),
+    staff: Principal = Depends(require_staff),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Return a page of registered visitors for admin/security consoles."""
+    query = select(DBUser).where(DBUser.role == UserRole.VISITOR)
+    if is_verified is not None:
+        query = query.where(DBUser.is_verified == is_verified)
+    users, next_cursor = await fetch_page(db, query, page, id_col=DBUser.id, date_col=DBUser.created_at)
+    items = [
         {
             "id": u.id,
             "full_name": u.full_name,
@@ -200,9 +268,35 @@ async def list_visitors(db: Session = Depends(get_db)):
         }
         for u in users
     ]
+    return {"items": items, "next_cursor": next_cursor}
 
 @router.get("/proxy-image")
-async def proxy_image(path: str):
-    if not os.path.exists(path):
+async def proxy_image(
+    path: str,
+    request: Request,
+    size: Optional[int] = None,
+    staff: Principal = Depends(require_staff_query_token)
+):
+    """Serve a stored face image; <img> tags pass the access token as `?token=`."""
+    real_path = os.path.realpath(path)
+    if not real_path.startswith(os.path.realpath(FACE_IMAGES_DIR) + os.sep) or not os.path.isfile(real_path):
         raise HTTPException(status_code=404, detail="Image not found")
-    return FileResponse(path)
+
+    digest = blob_digest(real_path)
+    if size is not None:
+        if size not in THUMBNAIL_SIZES:
+            raise HTTPException(status_code=400, detail=f"Thumbnail size must be one of {list(THUMBNAIL_SIZES)}")
+        if digest and os.path.exists(thumbnail_path(digest, size)):
+            real_path = thumbnail_path(digest, size)
+        else:
+            size = None  # Legacy image without thumbnails: serve the original
+
+    etag = await run_in_threadpool(image_etag, real_path, size)
+    headers = {
+        "ETag": etag,
+        # Content-addressed blobs never change; legacy paths may be overwritten
+        "Cache-Control": "private, max-age=31536000, immutable" if digest else "private, no-cache",
+    }
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return FileResponse(real_path, headers=headers)
@@ -1,18 +1,28 @@
-from fastapi import APIRouter, HTTPException, status, Depends
-from sqlalchemy.orm import Session
-from datetime import timedelta, datetime
-import random
-import os
+from fastapi import APIRouter, HTTPException, status, Depends, Request
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import timedelta
+import math
 import base64
-from typing import Dict, List
+from typing import Dict, List, Optional
 
 from ..models.user import User, UserCreate, Token, UserRole, OTPVerify, LoginRequest, LoginVerify, FaceLoginRequest, StaffLoginRequest, PasswordReset
-from ..core.database import get_db
-from ..db.models import DBUser, DBOTP
+from ..core.database import get_async_db
+from ..db.models import DBUser
+from ..core.faces import (
+    embed_face, enroll_face, ingest_face, enroll_embedding, get_store, DEFAULT_FACE_EMBEDDER, FACE_EMBEDDER,
+    FACE_MATCH_THRESHOLD,
+)
+from ..core.images import ImageIngestError
+from ..core.otp import OTP_TTL_SECONDS, OTPRateLimited, issue_otp, verify_otp
+from ..db.notifications import notify_otp, wake_notifier
 from ..core.security import (
     create_access_token, 
-    verify_password,
-    get_password_hash,
+    check_password,
+    hash_password,
+    needs_rehash,
+    PasswordHashBusy,
     VISITOR_SESSION_MINUTES, 
     EMPLOYEE_SESSION_HOURS, 
     SECURITY_SESSION_HOURS,
@@ -21,9 +31,6 @@ from ..core.security import (
 
 router = APIRouter()
 
-FACE_IMAGES_DIR = "storage/faces"
-os.makedirs(FACE_IMAGES_DIR, exist_ok=True)
-
 def get_session_duration(role: str) -> timedelta:
     if role == UserRole.VISITOR:
         return timedelta(minutes=VISITOR_SESSION_MINUTES)
@@ -35,38 +42,55 @@ def get_session_duration(role: str) -> timedelta:
         return timedelta(hours=ADMIN_SESSION_HOURS)
     return timedelta(minutes=15)
 
+def _client_ip(request: Request) -> Optional[str]:
+    return request.client.host if request.client else None
+
+def _too_many_requests(e: OTPRateLimited) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail="Too many OTP requests, please try again later",
+        headers={"Retry-After": str(math.ceil(e.retry_after))}
+    )
+
 @router.post("/send-otp")
-async def send_otp(phone_number: str, db: Session = Depends(get_db)):
-    otp = str(random.randint(1000, 9999))
+async def send_otp(phone_number: str, request: Request, db: AsyncSession = Depends(get_async_db)):
+    try:
+        otp = await issue_otp(phone_number, _client_ip(request))
+    except OTPRateLimited as e:
+        raise _too_many_requests(e)
     
-    otp_entry = db.query(DBOTP).filter(DBOTP.phone_number == phone_number).first()
-    if otp_entry:
-        otp_entry.otp = otp
-        otp_entry.created_at = datetime.utcnow()
-    else:
-        otp_entry = DBOTP(phone_number=phone_number, otp=otp)
-        db.add(otp_entry)
-    
-    db.commit()
-    print(f"DEBUG: OTP for {phone_number} is {otp}")
-    return {"message": "OTP sent successfully (Check console for mock OTP)"}
+    await notify_otp(db, phone_number, otp, timedelta(seconds=OTP_TTL_SECONDS))
+    await db.commit()
+    wake_notifier()
+    return {"message": "OTP sent successfully"}
+
+@router.post("/verify-otp")
+async def verify_phone_otp(data: OTPVerify, request: Request, db: AsyncSession = Depends(get_async_db)):
+    try:
+        valid = await verify_otp(data.phone_number, data.otp, _client_ip(request))
+    except OTPRateLimited as e:
+        raise _too_many_requests(e)
+    if not valid:
+        raise HTTPException(status_code=400, detail="Invalid OTP")
+
+    user = await db.scalar(select(DBUser).where(DBUser.phone_number == data.phone_number))
+    if user and not user.is_verified:
+        user.is_verified = True
+        await db.commit()
+    return {"message": "Phone number verified", "is_verified": True}
 
 @router.post("/signup", response_model=User)
-async def signup(user: UserCreate, db: Session = Depends(get_db)):
-    db_user = db.query(DBUser).filter(DBUser.phone_number == user.phone_number).first()
+async def signup(user: UserCreate, db: AsyncSession = Depends(get_async_db)):
+    db_user = await db.scalar(select(DBUser).where(DBUser.phone_number == user.phone_number))
     if db_user:
         raise HTTPException(status_code=400, detail="Phone number already registered")
 
     image_path = None
+    face_embedding = None
     if user.face_image:
         try:
-            header, encoded = user.face_image.split(",", 1)
-            image_data = base64.b64decode(encoded)
-            image_filename = f"{user.phone_number}_{random.randint(1000, 9999)}.jpg"
-            image_path = os.path.join(FACE_IMAGES_DIR, image_filename)
-            with open(image_path, "wb") as f:
-                f.write(image_data)
-        except Exception as e:
+            image_path, face_embedding = await ingest_face(user.face_image)
+        except ImageIngestError as e:
             raise HTTPException(status_code=400, detail=f"Invalid face image data: {str(e)}")
 
     new_user = DBUser(
@@ -79,40 +103,39 @@ async def signup(user: UserCreate, db: Session = Depends(get_db)):
         face_image_path=image_path
     )
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    await db.commit()
+    await db.refresh(new_user)
+    if face_embedding is not None:
+        await run_in_threadpool(enroll_embedding, new_user.id, face_embedding)
     return new_user
 
 @router.post("/login/request", status_code=status.HTTP_200_OK)
-async def login_request(data: LoginRequest, db: Session = Depends(get_db)):
-    user = db.query(DBUser).filter(DBUser.phone_number == data.phone_number).first()
+async def login_request(data: LoginRequest, request: Request, db: AsyncSession = Depends(get_async_db)):
+    user = await db.scalar(select(DBUser).where(DBUser.phone_number == data.phone_number))
     if not user:
         raise HTTPException(status_code=404, detail="User not registered")
     
-    otp = str(random.randint(1000, 9999))
-    otp_entry = db.query(DBOTP).filter(DBOTP.phone_number == data.phone_number).first()
-    if otp_entry:
-        otp_entry.otp = otp
-        otp_entry.created_at = datetime.utcnow()
-    else:
-        otp_entry = DBOTP(phone_number=data.phone_number, otp=otp)
-        db.add(otp_entry)
-        
-    db.commit()
-    print(f"DEBUG: Login OTP for {data.phone_number} is {otp}")
+    try:
+        otp = await issue_otp(data.phone_number, _client_ip(request))
+    except OTPRateLimited as e:
+        raise _too_many_requests(e)
+
+    await notify_otp(db, data.phone_number, otp, timedelta(seconds=OTP_TTL_SECONDS))
+    await db.commit()
+    wake_notifier()
     return {"message": "OTP sent successfully"}
 
 @router.post("/login/verify", response_model=Token)
-async def login_verify(data: LoginVerify, db: Session = Depends(get_db)):
-    otp_entry = db.query(DBOTP).filter(DBOTP.phone_number == data.phone_number, DBOTP.otp == data.otp).first()
-    if otp_entry:
-        user = db.query(DBUser).filter(DBUser.phone_number == data.phone_number).first()
+async def login_verify(data: LoginVerify, request: Request, db: AsyncSession = Depends(get_async_db)):
+    try:
+        valid = await verify_otp(data.phone_number, data.otp, _client_ip(request))
+    except OTPRateLimited as e:
+        raise _too_many_requests(e)
+    if valid:
+        user = await db.scalar(select(DBUser).where(DBUser.phone_number == data.phone_number))
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
         
-        db.delete(otp_entry)
-        db.commit()
-        
         access_token_expires = get_session_duration(user.role)
         access_token = create_access_token(
             data={"sub": user.phone_number, "role": user.role},
@@ -129,13 +152,21 @@ async def login_verify(data: LoginVerify, db: Session = Depends(get_db)):
     raise HTTPException(status_code=400, detail="Invalid OTP")
 
 @router.post("/login/staff", response_model=Token)
-async def login_staff(data: StaffLoginRequest, db: Session = Depends(get_db)):
-    user = db.query(DBUser).filter(DBUser.email == data.email).first()
+async def login_staff(data: StaffLoginRequest, db: AsyncSession = Depends(get_async_db)):
+    user = await db.scalar(select(DBUser).where(DBUser.email == data.email))
     if not user or user.role not in [UserRole.ADMIN, UserRole.EMPLOYEE, UserRole.SECURITY]:
         raise HTTPException(status_code=401, detail="Invalid credentials or unauthorized role")
     
-    if not verify_password(data.password, user.hashed_password):
-        raise HTTPException(status_code=401, detail="Invalid credentials")
+    try:
+        if not await check_password(data.password, user.hashed_password, account=user.email):
+            raise HTTPException(status_code=401, detail="Invalid credentials")
+
+        # Transparently upgrade hashes created with a lower bcrypt cost
+        if needs_rehash(user.hashed_password):
+            user.hashed_password = await hash_password(data.password, account=user.email)
+            await db.commit()
+    except PasswordHashBusy:
+        raise HTTPException(status_code=429, detail="Too many login attempts for this account, try again shortly")
     
     access_token_expires = get_session_duration(user.role)
     access_token = create_access_token(
@@ -152,21 +183,28 @@ async def login_staff(data: StaffLoginRequest, db: Session = Depends(get_db)):
     }
 
 @router.post("/reset-password")
-async def reset_password(data: PasswordReset, db: Session = Depends(get_db)):
-    user = db.query(DBUser).filter(DBUser.email == data.email).first()
+async def reset_password(data: PasswordReset, db: AsyncSession = Depends(get_async_db)):
+    user = await db.scalar(select(DBUser).where(DBUser.email == data.email))
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
-    user.hashed_password = get_password_hash(data.new_password)
+    try:
+        user.hashed_password = await hash_password(data.new_password, account=user.email)
+    except PasswordHashBusy:
+        raise HTTPException(status_code=429, detail="Too many requests for this account, try again shortly")
     user.password_reset_required = False
-    db.commit()
+    await db.commit()
     return {"message": "Password updated successfully"}
 
 @router.post("/login/face", response_model=Token)
-async def login_face(data: FaceLoginRequest, db: Session = Depends(get_db)):
-    user = db.query(DBUser).filter(DBUser.phone_number == data.phone_number).first()
+async def login_face(data: FaceLoginRequest, db: AsyncSession = Depends(get_async_db)):
+    user = await db.scalar(select(DBUser).where(DBUser.phone_number == data.phone_number))
     if not user:
         raise HTTPException(status_code=404, detail="User not registered")
+
+    # The default embedder can be fooled with a photo, so it must never open a staff session
+    if user.role != UserRole.VISITOR and FACE_EMBEDDER == DEFAULT_FACE_EMBEDDER:
+        raise HTTPException(status_code=403, detail="Face login is only available to visitors. Please log in with your password.")
     
     if not user.face_image_path:
         raise HTTPException(status_code=400, detail="Face identity not enrolled. Please login with OTP and update your profile.")
@@ -174,10 +212,24 @@ async def login_face(data: FaceLoginRequest, db: Session = Depends(get_db)):
     if not data.face_image:
         raise HTTPException(status_code=400, detail="Face image capture required")
 
-    # In a production app, we would use a library like face_recognition 
-    # to compare data.face_image with the image at user.face_image_path.
-    # For now, we simulate a successful match if an image is sent.
-    
+    try:
+        probe = base64.b64decode(data.face_image.split(",", 1)[-1])
+        probe_embedding = await run_in_threadpool(embed_face, probe)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid face image data")
+
+    store = get_store()
+    if not store.has(user.id):
+        # Users enrolled before embeddings existed: embed their stored image once
+        try:
+            await run_in_threadpool(enroll_face, user.id, user.face_image_path)
+        except OSError:
+            raise HTTPException(status_code=400, detail="Face identity not enrolled. Please login with OTP and update your profile.")
+
+    score = store.verify(user.id, probe_embedding)
+    if score is None or score < FACE_MATCH_THRESHOLD:
+        raise HTTPException(status_code=401, detail="Face does not match the enrolled identity")
+
     access_token_expires = get_session_duration(user.role)
     access_token = create_access_token(
         data={"sub": user.phone_number, "role": user.role},
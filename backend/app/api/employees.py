@@ -1,18 +1,30 @@
-from fastapi import APIRouter, HTTPException, status, Depends
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, HTTPException, status, Depends, Request, UploadFile, File
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select, delete
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 from datetime import datetime
-from ..models.appointment import Appointment, AppointmentCreate, AppointmentStatus, AppointmentType
-from ..core.database import get_db
-from ..db.models import DBAppointment, DBUser
+from ..models.appointment import Appointment, AppointmentCreate, AppointmentStatus, AppointmentType, BulkResult, BulkStatusUpdate
+from ..core.database import get_async_db
+from ..db.models import DBAppointment, DBCalendarFeed, DBUser
+from ..db.calendars import sync_calendar
+from ..db.notifications import notify_appointment_status, wake_notifier
+from ..db.queries import host_schedule_query, resolve_host, to_appointments
+from ..db.pagination import PageParams, page_params, fetch_page, to_naive
+from ..db.manifest import invalidate_manifest
+from ..db.rollups import record_appointment_created, record_status_change
+from ..db.scheduling import INACTIVE_STATUSES, reserve_slot
+from ..db.transitions import bulk_transition
+from ..db.imports import import_appointments, parse_records
+from ..models.imports import ImportFormat, ImportSummary
 from ..models.user import UserRole
+from ..core.faces import ingest_face, enroll_embedding
+from ..core.images import ImageIngestError
+from ..core.events import publish_appointment
+from ..core.passes import reinstate_passes, revoke_passes
+from ..core.auth import Principal, require_staff
+from ..core.calendar import CALENDAR_MAX_BYTES, CalendarError
 from pydantic import BaseModel
-import base64
-import os
-import random
-
-FACE_IMAGES_DIR = "storage/faces"
-os.makedirs(FACE_IMAGES_DIR, exist_ok=True)
 
 router = APIRouter()
 
@@ -23,7 +35,7 @@ class DurationUpdate(BaseModel):
     duration_minutes: int
 
 @router.post("/book-for-visitor", response_model=Appointment)
-async def employee_book_appointment(appointment: AppointmentCreate, employee_id: int, db: Session = Depends(get_db)):
+async def employee_book_appointment(appointment: AppointmentCreate, principal: Principal = Depends(require_staff), db: AsyncSession = Depends(get_async_db)):
     # Ensure naive comparison for safety with offset-aware inputs
     now = datetime.utcnow()
     scheduled_time = appointment.scheduled_time
@@ -39,20 +51,16 @@ async def employee_book_appointment(appointment: AppointmentCreate, employee_id:
     visitor_id = appointment.visitor_id
     
     if not visitor_id and appointment.visitor_info:
-        existing_visitor = db.query(DBUser).filter(DBUser.phone_number == appointment.visitor_info.phone_number).first()
+        existing_visitor = await db.scalar(select(DBUser).where(DBUser.phone_number == appointment.visitor_info.phone_number))
         if existing_visitor:
             visitor_id = existing_visitor.id
         else:
             image_path = None
+            face_embedding = None
             if appointment.visitor_info.face_image:
                 try:
-                    header, encoded = appointment.visitor_info.face_image.split(",", 1)
-                    image_data = base64.b64decode(encoded)
-                    image_filename = f"visitor_{appointment.visitor_info.phone_number}_{random.randint(1000, 9999)}.jpg"
-                    image_path = os.path.join(FACE_IMAGES_DIR, image_filename)
-                    with open(image_path, "wb") as f:
-                        f.write(image_data)
-                except Exception as e:
+                    image_path, face_embedding = await ingest_face(appointment.visitor_info.face_image)
+                except ImageIngestError as e:
                     print(f"Error saving visitor face image: {e}")
 
             new_visitor = DBUser(
@@ -65,16 +73,20 @@ async def employee_book_appointment(appointment: AppointmentCreate, employee_id:
                 face_image_path=image_path
             )
             db.add(new_visitor)
-            db.commit()
-            db.refresh(new_visitor)
+            await db.commit()
+            await db.refresh(new_visitor)
             visitor_id = new_visitor.id
+            if face_embedding is not None:
+                await run_in_threadpool(enroll_embedding, visitor_id, face_embedding)
     
     if not visitor_id:
         raise HTTPException(status_code=400, detail="Visitor identification required")
 
+    host_id, host_name = await resolve_host(db, appointment.host_name, appointment.host_id)
     new_appt = DBAppointment(
         visitor_id=visitor_id,
-        host_name=appointment.host_name,
+        host_id=host_id,
+        host_name=host_name,
         purpose=appointment.purpose,
         appointment_type=appointment.appointment_type,
         scheduled_time=appointment.scheduled_time,
@@ -82,65 +94,98 @@ async def employee_book_appointment(appointment: AppointmentCreate, employee_id:
         status=AppointmentStatus.ACCEPTED,
         created_at=datetime.utcnow()
     )
-    db.add(new_appt)
-    db.commit()
-    db.refresh(new_appt)
+    await reserve_slot(db, new_appt)
+    await record_appointment_created(db, new_appt)
+    await db.commit()
+    await db.refresh(new_appt)
+    invalidate_manifest(new_appt.scheduled_time)
+    publish_appointment("appointment.created", new_appt)
     
     # Populate visitor info for response
-    visitor = db.query(DBUser).filter(DBUser.id == visitor_id).first()
+    visitor = await db.scalar(select(DBUser).where(DBUser.id == visitor_id))
     res = Appointment.from_orm(new_appt)
     if visitor:
         res.visitor_name = visitor.full_name
         res.visitor_phone = visitor.phone_number
     return res
 
+@router.post("/import", response_model=ImportSummary)
+async def import_visitor_appointments(
+    request: Request,
+    format: ImportFormat = ImportFormat.CSV,
+    principal: Principal = Depends(require_staff),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Book many visitors at once from a CSV or NDJSON request body, read as it streams in.
+
+    Columns / keys: full_name, phone_number, email, street, city, state, pincode, host_name
+    (or host_id; defaults to the caller), purpose, scheduled_time, duration_minutes,
+    appointment_type. Invalid rows are reported by line and skipped.
+    """
+    return await import_appointments(db, parse_records(format, request.stream()), principal)
+
 @router.get("/my-schedule", response_model=List[Appointment])
-async def get_employee_schedule(employee_id: int, db: Session = Depends(get_db)):
-    employee = db.query(DBUser).filter(DBUser.id == employee_id).first()
-    if not employee:
-        raise HTTPException(status_code=404, detail="Employee not found")
-    
-    appts = db.query(DBAppointment).filter(DBAppointment.host_name == employee.full_name).all()
-    results = []
-    for appt in appts:
-        res = Appointment.from_orm(appt)
-        if appt.visitor:
-            res.visitor_name = appt.visitor.full_name
-            res.visitor_phone = appt.visitor.phone_number
-        results.append(res)
-    return results
+async def get_employee_schedule(
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    principal: Principal = Depends(require_staff),
+    db: AsyncSession = Depends(get_async_db)
+):
+    appts = (await db.scalars(
+        host_schedule_query(principal.id, date_from=to_naive(date_from), date_to=to_naive(date_to))
+    )).all()
+    return to_appointments(appts)
+
+@router.patch("/appointments/status", response_model=List[BulkResult])
+async def bulk_update_appointment_status(update: BulkStatusUpdate, principal: Principal = Depends(require_staff), db: AsyncSession = Depends(get_async_db)):
+    """Move many appointments to one status in a single transaction; one result per id."""
+    return await bulk_transition(db, update.appointment_ids, update.status)
 
 @router.patch("/appointments/{appointment_id}/status", response_model=Appointment)
-async def update_appointment_status(appointment_id: int, update: StatusUpdate, employee_id: int, db: Session = Depends(get_db)):
-    appt = db.query(DBAppointment).filter(DBAppointment.id == appointment_id).first()
+async def update_appointment_status(appointment_id: int, update: StatusUpdate, principal: Principal = Depends(require_staff), db: AsyncSession = Depends(get_async_db)):
+    appt = await db.scalar(select(DBAppointment).where(DBAppointment.id == appointment_id))
     if not appt:
         raise HTTPException(status_code=404, detail="Appointment not found")
     
+    old_status = appt.status
     appt.status = update.status
-    db.commit()
-    db.refresh(appt)
+    if old_status in INACTIVE_STATUSES and update.status not in INACTIVE_STATUSES:
+        # Reactivating a cancelled or rejected booking needs its slot back
+        await reserve_slot(db, appt)
+    await record_status_change(db, appt, old_status, appt.check_in_time, appt.check_out_time)
+    if old_status != update.status:
+        await notify_appointment_status(db, appt)
+    await db.commit()
+    await db.refresh(appt)
+    invalidate_manifest(appt.scheduled_time)
+    if update.status in INACTIVE_STATUSES:
+        revoke_passes([appt.id])
+    elif old_status in INACTIVE_STATUSES:
+        reinstate_passes([appt.id])
+    publish_appointment("appointment.status_changed", appt)
+    wake_notifier()
     return appt
 
 @router.patch("/appointments/{appointment_id}/duration", response_model=Appointment)
-async def update_appointment_duration(appointment_id: int, update: DurationUpdate, employee_id: int, db: Session = Depends(get_db)):
-    appt = db.query(DBAppointment).filter(DBAppointment.id == appointment_id).first()
+async def update_appointment_duration(appointment_id: int, update: DurationUpdate, principal: Principal = Depends(require_staff), db: AsyncSession = Depends(get_async_db)):
+    appt = await db.scalar(select(DBAppointment).where(DBAppointment.id == appointment_id))
     if not appt:
         raise HTTPException(status_code=404, detail="Appointment not found")
     
     appt.duration_minutes = update.duration_minutes
-    db.commit()
-    db.refresh(appt)
+    if appt.status not in INACTIVE_STATUSES:
+        await reserve_slot(db, appt)
+    await db.commit()
+    await db.refresh(appt)
+    invalidate_manifest(appt.scheduled_time)
     return appt
 
 @router.post("/schedule/block", response_model=Appointment)
-async def block_schedule(appointment: AppointmentCreate, employee_id: int, db: Session = Depends(get_db)):
-    employee = db.query(DBUser).filter(DBUser.id == employee_id).first()
-    if not employee:
-        raise HTTPException(status_code=404, detail="Employee not found")
-
+async def block_schedule(appointment: AppointmentCreate, principal: Principal = Depends(require_staff), db: AsyncSession = Depends(get_async_db)):
     new_appt = DBAppointment(
         visitor_id=None,
-        host_name=employee.full_name,
+        host_id=principal.id,
+        host_name=principal.full_name,
         purpose=appointment.purpose or "Blocked Slot",
         appointment_type=AppointmentType.PRE_PLANNED,
         scheduled_time=appointment.scheduled_time,
@@ -148,25 +193,63 @@ async def block_schedule(appointment: AppointmentCreate, employee_id: int, db: S
         status=AppointmentStatus.BLOCKED,
         created_at=datetime.utcnow()
     )
-    db.add(new_appt)
-    db.commit()
-    db.refresh(new_appt)
+    await reserve_slot(db, new_appt)
+    await record_appointment_created(db, new_appt)
+    await db.commit()
+    await db.refresh(new_appt)
     return new_appt
 
+class CalendarSyncRequest(BaseModel):
+    calendar_url: Optional[str] = None
+
 @router.post("/sync-calendar")
-async def sync_employee_calendar(employee_id: int, calendar_url: Optional[str] = None, db: Session = Depends(get_db)):
-    employee = db.query(DBUser).filter(DBUser.id == employee_id).first()
+async def sync_employee_calendar(
+    calendar_url: Optional[str] = None,
+    body: Optional[CalendarSyncRequest] = None,
+    principal: Principal = Depends(require_staff),
+    db: AsyncSession = Depends(get_async_db)
+):
+    employee = await db.get(DBUser, principal.id)
     if not employee:
         raise HTTPException(status_code=404, detail="Employee not found")
     
-    employee.calendar_synced = True
-    if calendar_url:
+    calendar_url = calendar_url or (body.calendar_url if body else None)
+    if calendar_url and calendar_url != employee.calendar_url:
+        # A different feed starts from scratch
+        await db.execute(delete(DBCalendarFeed).where(DBCalendarFeed.employee_id == employee.id))
         employee.calendar_url = calendar_url
-    
-    db.commit()
-    return {"message": "Calendar synced successfully", "calendar_synced": True}
+    if not employee.calendar_url:
+        raise HTTPException(status_code=400, detail="calendar_url is required")
+
+    try:
+        result = await sync_calendar(db, employee)
+    except CalendarError as e:
+        raise HTTPException(status_code=502, detail=str(e))
+    return {"message": "Calendar synced successfully", "calendar_synced": True, **result}
+
+@router.post("/calendar/upload")
+async def upload_employee_calendar(file: UploadFile = File(...), principal: Principal = Depends(require_staff), db: AsyncSession = Depends(get_async_db)):
+    """Import busy time from an exported .ics file instead of a feed URL."""
+    employee = await db.get(DBUser, principal.id)
+    if not employee:
+        raise HTTPException(status_code=404, detail="Employee not found")
+
+    data = await file.read(CALENDAR_MAX_BYTES + 1)
+    if len(data) > CALENDAR_MAX_BYTES:
+        raise HTTPException(status_code=413, detail=f"Calendar file exceeds {CALENDAR_MAX_BYTES} bytes")
+    try:
+        result = await sync_calendar(db, employee, data=data)
+    except CalendarError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"message": "Calendar imported successfully", "calendar_synced": True, **result}
 
 @router.get("/visitor-list")
-async def list_visitors(db: Session = Depends(get_db)):
-    visitors = db.query(DBUser).filter(DBUser.role == UserRole.VISITOR).all()
-    return [{"id": u.id, "full_name": u.full_name, "phone_number": u.phone_number} for u in visitors]
+async def list_visitors(page: PageParams = Depends(page_params), principal: Principal = Depends(require_staff), db: AsyncSession = Depends(get_async_db)):
+    visitors, next_cursor = await fetch_page(
+        db, select(DBUser).where(DBUser.role == UserRole.VISITOR), page,
+        id_col=DBUser.id, date_col=DBUser.created_at
+    )
+    return {
+        "items": [{"id": u.id, "full_name": u.full_name, "phone_number": u.phone_number} for u in visitors],
+        "next_cursor": next_cursor
+    }
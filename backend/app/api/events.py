@@ -0,0 +1,57 @@
+from fastapi import APIRouter, Depends, Request, Header
+from fastapi.responses import StreamingResponse
+from typing import Optional
+import asyncio
+
+from ..core.auth import Principal, require_staff_query_token
+from ..core.events import event_bus
+
+router = APIRouter()
+
+KEEPALIVE_SECONDS = 15
+
+@router.get("/stream")
+async def stream_events(
+    request: Request,
+    host_name: Optional[str] = None,
+    last_event_id: Optional[str] = Header(None),
+    after: Optional[str] = None,
+    staff: Principal = Depends(require_staff_query_token)
+):
+    """Server-Sent Events feed of appointment changes.
+
+    Pass `host_name` for one host's events, or nothing for the whole facility.
+    Reconnecting clients resume from the `Last-Event-ID` header (EventSource
+    sends it automatically) or the `after` query parameter. A `resync` event
+    means the gap could not be replayed and the client should reload its lists.
+    EventSource cannot send headers, so the access token may be passed as `token`.
+    """
+    sub, replay, resync = event_bus.subscribe(host_name=host_name, last_event_id=last_event_id or after)
+
+    async def event_source():
+        try:
+            yield "retry: 3000\n\n"
+            if resync:
+                yield "event: resync\ndata: {}\n\n"
+            for event in replay:
+                yield event.to_sse()
+            while True:
+                if sub.overflowed:
+                    yield "event: resync\ndata: {}\n\n"
+                    return
+                try:
+                    event = await asyncio.wait_for(sub.queue.get(), timeout=KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        return
+                    yield ": keepalive\n\n"
+                    continue
+                yield event.to_sse()
+        finally:
+            event_bus.unsubscribe(sub)
+
+    return StreamingResponse(
+        event_source(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
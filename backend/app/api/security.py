@@ -1,43 +1,73 @@
-from fastapi import APIRouter, HTTPException, Depends
-from sqlalchemy.orm import Session
-from typing import List
-from datetime import datetime
-from ..models.appointment import Appointment, AppointmentStatus
-from ..core.database import get_db
-from ..db.models import DBAppointment, DBUser
+from fastapi import APIRouter, HTTPException, Depends, Query
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
+from datetime import date, datetime
+import base64
+from ..models.appointment import Appointment, AppointmentStatus, BulkAppointmentIds, BulkResult
+from ..models.user import FaceIdentifyRequest
+from ..core.database import get_async_db
+from ..db.models import DBAppointment, DBUser, DBVisitorStats
+from ..db.queries import appointment_listing_query, to_appointments
+from ..db.pagination import Page, PageParams, fetch_page, page_params, slice_page, decode_offset, encode_offset, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from ..db.search import search
+from ..db.manifest import get_manifest, invalidate_manifest, facility_today
+from ..db.rollups import record_status_change
+from ..db.transitions import bulk_transition
+from ..db.passes import check_in_with_pass
+from ..core.faces import identify_face, FACE_MATCH_THRESHOLD
+from ..core.events import publish_appointment
+from ..db.notifications import notify_host_check_in, wake_notifier
+from ..models.search import SearchKind, SearchResult
+from ..models.passes import PassCheckIn, PassScan
+from ..models.visitor import VisitorProfile, VisitorProfileSummary, VisitorStats
+from ..core.auth import Principal, require_staff
 
 router = APIRouter()
 
-@router.get("/daily-appointments", response_model=List[Appointment])
-async def get_daily_appointments(db: Session = Depends(get_db)):
-    appts = db.query(DBAppointment).filter(DBAppointment.status.in_([AppointmentStatus.ACCEPTED, AppointmentStatus.CHECKED_IN, AppointmentStatus.COMPLETED])).all()
-    results = []
-    for appt in appts:
-        res = Appointment.from_orm(appt)
-        if appt.visitor:
-            res.visitor_name = appt.visitor.full_name
-            res.visitor_phone = appt.visitor.phone_number
-        results.append(res)
-    return results
+@router.get("/daily-appointments", response_model=Page[Appointment])
+async def get_daily_appointments(
+    day: Optional[date] = None,
+    status: Optional[List[AppointmentStatus]] = Query(None),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Desk manifest for one facility-local day (defaults to today)."""
+    manifest = await get_manifest(db, day or facility_today())
+    if status:
+        manifest = [appt for appt in manifest if appt.status in status]
+    items, next_cursor = slice_page(manifest, PageParams(limit=limit, cursor=cursor), sort_attr="scheduled_time")
+    return {"items": items, "next_cursor": next_cursor}
 
 @router.get("/recent-activity", response_model=List[Appointment])
-async def get_recent_activity(db: Session = Depends(get_db)):
-    appts = db.query(DBAppointment).filter(
-        DBAppointment.status.in_([AppointmentStatus.CHECKED_IN, AppointmentStatus.COMPLETED, AppointmentStatus.REJECTED])
-    ).order_by(DBAppointment.id.desc()).limit(10).all()
-    
-    results = []
-    for appt in appts:
-        res = Appointment.from_orm(appt)
-        if appt.visitor:
-            res.visitor_name = appt.visitor.full_name
-            res.visitor_phone = appt.visitor.phone_number
-        results.append(res)
-    return results
+async def get_recent_activity(db: AsyncSession = Depends(get_async_db)):
+    appts = (await db.scalars(
+        appointment_listing_query(
+            DBAppointment.status.in_([AppointmentStatus.CHECKED_IN, AppointmentStatus.COMPLETED, AppointmentStatus.REJECTED])
+        ).order_by(DBAppointment.id.desc()).limit(10)
+    )).all()
+    return to_appointments(appts)
+
+@router.post("/check-in/batch", response_model=List[BulkResult])
+async def security_bulk_check_in(batch: BulkAppointmentIds, principal: Principal = Depends(require_staff), db: AsyncSession = Depends(get_async_db)):
+    """Check in a group of accepted appointments in one transaction; one result per id."""
+    return await bulk_transition(db, batch.appointment_ids, AppointmentStatus.CHECKED_IN)
+
+@router.post("/check-out/batch", response_model=List[BulkResult])
+async def security_bulk_check_out(batch: BulkAppointmentIds, principal: Principal = Depends(require_staff), db: AsyncSession = Depends(get_async_db)):
+    """Check out a group of checked-in visitors in one transaction; one result per id."""
+    return await bulk_transition(db, batch.appointment_ids, AppointmentStatus.COMPLETED)
+
+@router.post("/scan", response_model=PassCheckIn)
+async def security_scan_pass(scan: PassScan, principal: Principal = Depends(require_staff), db: AsyncSession = Depends(get_async_db)):
+    """Check a visitor in with the signed pass from their QR code."""
+    return await check_in_with_pass(db, scan.token)
 
 @router.post("/check-in/{appointment_id}")
-async def security_check_in(appointment_id: int, db: Session = Depends(get_db)):
-    appt = db.query(DBAppointment).filter(DBAppointment.id == appointment_id).first()
+async def security_check_in(appointment_id: int, db: AsyncSession = Depends(get_async_db)):
+    appt = await db.scalar(select(DBAppointment).where(DBAppointment.id == appointment_id))
     if not appt:
         raise HTTPException(status_code=404, detail="Appointment not found")
     
@@ -46,12 +76,17 @@ async def security_check_in(appointment_id: int, db: Session = Depends(get_db)):
     
     appt.status = AppointmentStatus.CHECKED_IN
     appt.check_in_time = datetime.utcnow()
-    db.commit()
+    await record_status_change(db, appt, AppointmentStatus.ACCEPTED)
+    await notify_host_check_in(db, appt)
+    await db.commit()
+    invalidate_manifest(appt.scheduled_time)
+    publish_appointment("appointment.checked_in", appt)
+    wake_notifier()
     return {"message": "Visitor checked in successfully"}
 
 @router.post("/check-out/{appointment_id}")
-async def security_check_out(appointment_id: int, db: Session = Depends(get_db)):
-    appt = db.query(DBAppointment).filter(DBAppointment.id == appointment_id).first()
+async def security_check_out(appointment_id: int, db: AsyncSession = Depends(get_async_db)):
+    appt = await db.scalar(select(DBAppointment).where(DBAppointment.id == appointment_id))
     if not appt:
         raise HTTPException(status_code=404, detail="Appointment not found")
     
@@ -60,38 +95,73 @@ async def security_check_out(appointment_id: int, db: Session = Depends(get_db))
     
     appt.status = AppointmentStatus.COMPLETED
     appt.check_out_time = datetime.utcnow()
-    db.commit()
+    await record_status_change(db, appt, AppointmentStatus.CHECKED_IN, appt.check_in_time)
+    await db.commit()
+    invalidate_manifest(appt.scheduled_time)
+    publish_appointment("appointment.checked_out", appt)
     return {"message": "Visitor checked out successfully"}
 
-@router.get("/visitor-profile/{phone_number}")
-async def get_visitor_profile(phone_number: str, db: Session = Depends(get_db)):
-    user = db.query(DBUser).filter(DBUser.phone_number == phone_number).first()
-    if not user:
+@router.get("/search", response_model=Page[SearchResult])
+async def search_visitors_and_appointments(
+    q: str = Query(..., min_length=1, max_length=200),
+    kind: Optional[SearchKind] = None,
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    principal: Principal = Depends(require_staff),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Ranked prefix and typo-tolerant search by name, phone, email, purpose or host."""
+    offset = decode_offset(cursor)
+    items, has_more = await search(db, q, kind, limit, offset)
+    return {"items": items, "next_cursor": encode_offset(offset + limit) if has_more else None}
+
+@router.get("/visitor-profile/{phone_number}", response_model=VisitorProfile)
+async def get_visitor_profile(phone_number: str, db: AsyncSession = Depends(get_async_db)):
+    """Identity and visit counts of one visitor; their appointments are paged by the history endpoint."""
+    row = (await db.execute(
+        select(DBUser, DBVisitorStats)
+        .outerjoin(DBVisitorStats, DBVisitorStats.visitor_id == DBUser.id)
+        .where(DBUser.phone_number == phone_number)
+    )).first()
+    if not row:
         raise HTTPException(status_code=404, detail="Visitor not found")
-    
-    history = db.query(DBAppointment).filter(DBAppointment.visitor_id == user.id).all()
-    history_res = []
-    for appt in history:
-        res = Appointment.from_orm(appt)
-        res.visitor_name = user.full_name
-        res.visitor_phone = user.phone_number
-        history_res.append(res)
-    
-    return {
-        "profile": {
-            "full_name": user.full_name,
-            "phone_number": user.phone_number,
-            "email": user.email,
-            "is_verified": user.is_verified,
-            "address": user.address,
-            "role": user.role
-        },
-        "appointment_history": history_res
-    }
+
+    user, stats = row
+    return VisitorProfile(
+        profile=VisitorProfileSummary(
+            id=user.id,
+            full_name=user.full_name,
+            phone_number=user.phone_number,
+            email=user.email,
+            is_verified=bool(user.is_verified),
+            has_face_id=user.face_image_path is not None,
+            address=user.address,
+            role=user.role,
+        ),
+        stats=VisitorStats(
+            appointment_count=stats.appointment_count,
+            open_count=stats.open_count,
+            visit_count=stats.visit_count,
+            checked_in=stats.checked_in_count > 0,
+            last_visit_at=stats.last_visit_at,
+        ) if stats else VisitorStats(),
+    )
+
+@router.get("/visitor-profile/{phone_number}/history", response_model=Page[Appointment])
+async def get_visitor_history(phone_number: str, page: PageParams = Depends(page_params), db: AsyncSession = Depends(get_async_db)):
+    """A visitor's appointments, latest scheduled first."""
+    visitor_id = await db.scalar(select(DBUser.id).where(DBUser.phone_number == phone_number))
+    if visitor_id is None:
+        raise HTTPException(status_code=404, detail="Visitor not found")
+    appts, next_cursor = await fetch_page(
+        db, appointment_listing_query(DBAppointment.visitor_id == visitor_id), page,
+        id_col=DBAppointment.id, sort_col=DBAppointment.scheduled_time, descending=True,
+    )
+    return {"items": to_appointments(appts), "next_cursor": next_cursor}
 
 @router.post("/verify-identity")
-async def verify_visitor_identity(phone_number: str, db: Session = Depends(get_db)):
-    user = db.query(DBUser).filter(DBUser.phone_number == phone_number).first()
+async def verify_visitor_identity(phone_number: str, db: AsyncSession = Depends(get_async_db)):
+    user = await db.scalar(select(DBUser).where(DBUser.phone_number == phone_number))
     if not user:
         raise HTTPException(status_code=404, detail="Visitor not found in system")
     
@@ -100,3 +170,29 @@ async def verify_visitor_identity(phone_number: str, db: Session = Depends(get_d
         "is_verified": user.is_verified,
         "has_face_id": user.face_image_path is not None
     }
+
+@router.post("/identify-face")
+async def identify_visitor_face(data: FaceIdentifyRequest, principal: Principal = Depends(require_staff), db: AsyncSession = Depends(get_async_db)):
+    """1:N lookup of a captured face against every enrolled visitor and staff member."""
+    try:
+        probe = base64.b64decode(data.face_image.split(",", 1)[-1])
+        matches = await run_in_threadpool(identify_face, probe, max(1, min(data.top_k, 10)))
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid face image data")
+
+    matches = [(user_id, score) for user_id, score in matches if score >= FACE_MATCH_THRESHOLD]
+    if not matches:
+        raise HTTPException(status_code=404, detail="No enrolled identity matches this face")
+
+    users = {u.id: u for u in (await db.scalars(select(DBUser).where(DBUser.id.in_([m[0] for m in matches])))).all()}
+    return [
+        {
+            "user_id": user_id,
+            "full_name": users[user_id].full_name,
+            "phone_number": users[user_id].phone_number,
+            "role": users[user_id].role,
+            "is_verified": users[user_id].is_verified,
+            "score": round(score, 4)
+        }
+        for user_id, score in matches if user_id in users
+    ]
@@ -0,0 +1,32 @@
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List
+from ..core.auth import Principal, require_staff
+from ..core.database import get_async_db
+from ..db.sync import apply_offline_batch, get_changes, SYNC_MAX_PAGE_SIZE, SYNC_PAGE_SIZE
+from ..models.sync import ChangeSet, OfflineBatch, OfflineResult
+
+router = APIRouter()
+
+@router.get("/changes", response_model=ChangeSet)
+async def get_sync_changes(
+    cursor: int = Query(0, ge=0),
+    limit: int = Query(SYNC_PAGE_SIZE, ge=1, le=SYNC_MAX_PAGE_SIZE),
+    principal: Principal = Depends(require_staff),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Users, appointments and deletions changed since `cursor` (0 for a full download), oldest first.
+
+    Keep calling with `next_cursor` while `has_more`; 410 means the cursor is too old and the
+    replica must be rebuilt from 0.
+    """
+    return await get_changes(db, cursor, limit)
+
+@router.post("/check-ins", response_model=List[OfflineResult])
+async def upload_offline_check_ins(
+    batch: OfflineBatch,
+    principal: Principal = Depends(require_staff),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Apply check-ins / check-outs queued on a kiosk while offline. Safe to re-send."""
+    return await apply_offline_batch(db, principal, batch)
@@ -0,0 +1,23 @@
+from fastapi import APIRouter, HTTPException, Request, UploadFile, File
+import math
+
+from ..core.images import ImageIngestError, UploadRejected, stage_upload, UPLOAD_REF_PREFIX
+
+router = APIRouter()
+
+@router.post("/faces")
+async def upload_face_image(request: Request, file: UploadFile = File(...)):
+    """Stage a face image sent as multipart/form-data.
+
+    The returned reference can be used anywhere a base64 `face_image` is
+    accepted (signup, staff creation, user updates, booking for a visitor).
+    No login is needed, since signup uploads before the account exists;
+    staging is rate limited per client IP and capped instead.
+    """
+    try:
+        upload_id = await stage_upload(file, request.client.host if request.client else None)
+    except UploadRejected as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(math.ceil(e.retry_after))})
+    except ImageIngestError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid face image data: {str(e)}")
+    return {"upload_id": upload_id, "face_image": f"{UPLOAD_REF_PREFIX}{upload_id}"}
@@ -1,15 +1,30 @@
-from fastapi import APIRouter, HTTPException, status, Depends
-from sqlalchemy.orm import Session
-from typing import List
-from datetime import datetime
-from ..models.appointment import Appointment, AppointmentCreate, AppointmentStatus
-from ..core.database import get_db
+from fastapi import APIRouter, HTTPException, status, Depends, Query, Response
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
+from datetime import date, datetime
+from ..models.appointment import Appointment, AppointmentCreate, AppointmentStatus, TimeSlot
+from ..core.database import get_async_db
 from ..db.models import DBAppointment
+from ..db.queries import appointment_listing_query, host_schedule_query, resolve_host, to_appointments
+from ..db.pagination import to_naive
+from ..db.rollups import record_appointment_created
+from ..db.scheduling import FREE_SLOTS_MAX_DAYS, free_slots, reserve_slot
+from ..db.manifest import facility_today
+from ..db.passes import get_visitor_pass
+from ..core.events import publish_appointment
+from ..core.auth import Principal, get_current_principal
+from ..core.passes import PassError, render_pass_qr, verify_pass
+from ..models.passes import VisitorPass
 
 router = APIRouter()
 
 @router.post("/appointments", response_model=Appointment)
-async def create_my_appointment(appointment: AppointmentCreate, visitor_id: int, db: Session = Depends(get_db)):
+async def create_my_appointment(
+    appointment: AppointmentCreate,
+    principal: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_async_db)
+):
     # Ensure naive comparison for safety with offset-aware inputs
     now = datetime.utcnow()
     scheduled_time = appointment.scheduled_time
@@ -22,9 +37,11 @@ async def create_my_appointment(appointment: AppointmentCreate, visitor_id: int,
             detail="Appointments can only be booked for future dates"
         )
     
+    host_id, host_name = await resolve_host(db, appointment.host_name, appointment.host_id)
     new_appt = DBAppointment(
-        visitor_id=visitor_id,
-        host_name=appointment.host_name,
+        visitor_id=principal.id,
+        host_id=host_id,
+        host_name=host_name,
         purpose=appointment.purpose,
         appointment_type=appointment.appointment_type,
         scheduled_time=appointment.scheduled_time,
@@ -32,26 +49,73 @@ async def create_my_appointment(appointment: AppointmentCreate, visitor_id: int,
         status=AppointmentStatus.PENDING,
         created_at=datetime.utcnow()
     )
-    db.add(new_appt)
-    db.commit()
-    db.refresh(new_appt)
+    await reserve_slot(db, new_appt)
+    await record_appointment_created(db, new_appt)
+    await db.commit()
+    await db.refresh(new_appt)
+    publish_appointment("appointment.created", new_appt)
     return new_appt
 
 @router.get("/appointments", response_model=List[Appointment])
-async def get_my_appointments(visitor_id: int, db: Session = Depends(get_db)):
-    appts = db.query(DBAppointment).filter(DBAppointment.visitor_id == visitor_id).all()
-    results = []
-    for appt in appts:
-        res = Appointment.from_orm(appt)
-        if appt.visitor:
-            res.visitor_name = appt.visitor.full_name
-            res.visitor_phone = appt.visitor.phone_number
-        results.append(res)
-    return results
+async def get_my_appointments(principal: Principal = Depends(get_current_principal), db: AsyncSession = Depends(get_async_db)):
+    appts = (await db.scalars(
+        appointment_listing_query(DBAppointment.visitor_id == principal.id)
+    )).all()
+    return to_appointments(appts)
+
+@router.get("/appointments/{appointment_id}/pass", response_model=VisitorPass)
+async def get_appointment_pass(appointment_id: int, principal: Principal = Depends(get_current_principal), db: AsyncSession = Depends(get_async_db)):
+    """Signed gate pass for an accepted appointment, to show as a QR code at the gate."""
+    visitor_pass = await get_visitor_pass(db, appointment_id, principal)
+    # Rendered now so the image request that follows is served from the cache
+    await run_in_threadpool(render_pass_qr, visitor_pass.token)
+    return visitor_pass
+
+@router.get("/passes/{token}.png")
+async def get_pass_qr(token: str):
+    """QR image of a pass. The token is its own credential, so no login is needed to fetch it."""
+    try:
+        claims = verify_pass(token)
+    except PassError:
+        raise HTTPException(status_code=404, detail="Pass not found")
+    png = await run_in_threadpool(render_pass_qr, token)
+    max_age = max(0, int((claims.valid_until - datetime.utcnow()).total_seconds()))
+    return Response(content=png, media_type="image/png", headers={"Cache-Control": f"private, max-age={max_age}"})
 
 @router.get("/host-schedule", response_model=List[Appointment])
-async def get_host_schedule(host_name: str, db: Session = Depends(get_db)):
-    return db.query(DBAppointment).filter(
-        DBAppointment.host_name == host_name,
-        DBAppointment.status.notin_([AppointmentStatus.CANCELLED, AppointmentStatus.REJECTED])
-    ).all()
+async def get_host_schedule(
+    host_name: Optional[str] = None,
+    host_id: Optional[int] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    db: AsyncSession = Depends(get_async_db)
+):
+    if host_id is None and not host_name:
+        raise HTTPException(status_code=400, detail="host_id or host_name is required")
+    host_id, host_name = await resolve_host(db, host_name, host_id)
+    appts = (await db.scalars(
+        host_schedule_query(
+            host_id, host_name, to_naive(date_from), to_naive(date_to),
+            DBAppointment.status.notin_([AppointmentStatus.CANCELLED, AppointmentStatus.REJECTED])
+        )
+    )).all()
+    return to_appointments(appts)
+
+@router.get("/free-slots", response_model=List[TimeSlot])
+async def get_free_slots(
+    host_name: Optional[str] = None,
+    host_id: Optional[int] = None,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    min_minutes: int = Query(15, ge=1),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Open windows in the host's working hours, for facility-local days date_from..date_to (inclusive)."""
+    if host_id is None and not host_name:
+        raise HTTPException(status_code=400, detail="host_id or host_name is required")
+    date_from = date_from or facility_today()
+    date_to = date_to or date_from
+    if date_to < date_from or (date_to - date_from).days >= FREE_SLOTS_MAX_DAYS:
+        raise HTTPException(status_code=400, detail=f"Date range must cover 1 to {FREE_SLOTS_MAX_DAYS} days")
+    host_id, host_name = await resolve_host(db, host_name, host_id)
+    return await free_slots(db, host_id, host_name, date_from, date_to, min_minutes)
@@ -0,0 +1,123 @@
+"""Bearer-token authentication for API routes.
+
+`get_current_principal` verifies the JWT issued at login (signature and
+expiry) and resolves its subject (the user's phone number) to a Principal.
+Principals are cached in-process for PRINCIPAL_CACHE_TTL_SECONDS, so an
+authenticated request normally costs one signature check and a dict lookup.
+Role or phone-number changes must call invalidate_principal; other workers
+pick the change up when their cached entry expires.
+
+Browsers cannot attach headers to EventSource or <img> requests, so routes
+built with `require_roles(..., query_token=True)` also accept the token as a
+`token` query parameter.
+"""
+from collections import OrderedDict
+from dataclasses import dataclass
+from fastapi import Depends, HTTPException, Query, status
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+from jose import JWTError, jwt
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Dict, Optional, Tuple
+import os
+import time
+
+from .database import get_async_db
+from .security import ALGORITHM, SECRET_KEY
+from ..db.models import DBUser
+from ..models.user import UserRole
+
+PRINCIPAL_CACHE_TTL_SECONDS = int(os.getenv("PRINCIPAL_CACHE_TTL_SECONDS", "60"))
+PRINCIPAL_CACHE_SIZE = 1024
+
+STAFF_ROLES = (UserRole.ADMIN, UserRole.EMPLOYEE, UserRole.SECURITY)
+
+@dataclass(frozen=True)
+class Principal:
+    id: int
+    phone_number: str
+    full_name: str
+    role: str
+
+# sub -> (cached at monotonic seconds, principal); least recently used first
+_principals: "OrderedDict[str, Tuple[float, Principal]]" = OrderedDict()
+
+_bearer = HTTPBearer(auto_error=False)
+
+def _unauthorized(detail: str) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail=detail,
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+def invalidate_principal(*subjects: Optional[str]):
+    for sub in subjects:
+        if sub:
+            _principals.pop(sub, None)
+
+def _cached(sub: str) -> Optional[Principal]:
+    entry = _principals.get(sub)
+    if entry is None:
+        return None
+    if time.monotonic() - entry[0] >= PRINCIPAL_CACHE_TTL_SECONDS:
+        del _principals[sub]
+        return None
+    _principals.move_to_end(sub)
+    return entry[1]
+
+async def _load(db: AsyncSession, sub: str) -> Optional[Principal]:
+    row = (await db.execute(
+        select(DBUser.id, DBUser.phone_number, DBUser.full_name, DBUser.role).where(DBUser.phone_number == sub)
+    )).first()
+    if row is None:
+        return None
+    principal = Principal(row.id, row.phone_number, row.full_name, row.role)
+    _principals[sub] = (time.monotonic(), principal)
+    if len(_principals) > PRINCIPAL_CACHE_SIZE:
+        _principals.popitem(last=False)
+    return principal
+
+async def _resolve(db: AsyncSession, token: Optional[str]) -> Principal:
+    if not token:
+        raise _unauthorized("Not authenticated")
+    try:
+        claims: Dict = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        raise _unauthorized("Invalid or expired token")
+    sub = claims.get("sub")
+    if not sub:
+        raise _unauthorized("Invalid or expired token")
+
+    principal = _cached(sub) or await _load(db, sub)
+    if principal is None:
+        raise _unauthorized("User no longer exists")
+    return principal
+
+async def get_current_principal(
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(_bearer),
+    db: AsyncSession = Depends(get_async_db),
+) -> Principal:
+    return await _resolve(db, credentials.credentials if credentials else None)
+
+async def get_principal_with_query_token(
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(_bearer),
+    token: Optional[str] = Query(None),
+    db: AsyncSession = Depends(get_async_db),
+) -> Principal:
+    return await _resolve(db, credentials.credentials if credentials else token)
+
+def require_roles(*roles: UserRole, query_token: bool = False):
+    """Dependency that returns the principal if it has one of `roles`, else 403."""
+    allowed = {UserRole(role).value for role in roles}
+    authenticate = get_principal_with_query_token if query_token else get_current_principal
+
+    async def dependency(principal: Principal = Depends(authenticate)) -> Principal:
+        if UserRole(principal.role).value not in allowed:
+            raise HTTPException(status_code=403, detail="Unauthorized")
+        return principal
+    return dependency
+
+require_admin = require_roles(UserRole.ADMIN)
+require_staff = require_roles(*STAFF_ROLES)
+require_staff_query_token = require_roles(*STAFF_ROLES, query_token=True)
@@ -0,0 +1,191 @@
+"""iCalendar feed fetching, parsing and expansion.
+
+Feeds are fetched with conditional requests (If-None-Match / If-Modified-Since),
+so an unchanged feed costs a single 304. Events are grouped by UID and each
+group gets a version built from SEQUENCE and LAST-MODIFIED, which lets a
+re-sync expand only the events that actually changed. Recurring events are
+expanded (RRULE, RDATE, EXDATE and RECURRENCE-ID overrides) only within a
+bounded horizon.
+
+Only http(s) feeds on public addresses are fetched: the host is resolved and
+rejected if any address is private, loopback, link-local or otherwise not
+routable, and redirects are followed by hand so every hop is checked again.
+
+Busy time is returned as naive UTC intervals, cut into pieces of at most
+BUSY_SEGMENT so that overlap queries need only a bounded lookback.
+"""
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+from zoneinfo import ZoneInfo
+import asyncio
+import ipaddress
+import os
+import socket
+
+import httpx
+import recurring_ical_events
+from icalendar import Calendar
+
+from .config import FACILITY_TIMEZONE
+
+CALENDAR_SYNC_HORIZON_DAYS = int(os.getenv("CALENDAR_SYNC_HORIZON_DAYS", "90"))
+CALENDAR_MAX_BYTES = int(os.getenv("CALENDAR_MAX_BYTES", str(5 * 1024 * 1024)))
+CALENDAR_FETCH_TIMEOUT_SECONDS = 20
+CALENDAR_MAX_REDIRECTS = 5
+BUSY_SEGMENT = timedelta(days=1)
+
+_facility_tz = ZoneInfo(FACILITY_TIMEZONE)
+
+Interval = Tuple[datetime, datetime]
+
+class CalendarError(ValueError):
+    pass
+
+@dataclass
+class FeedResponse:
+    not_modified: bool
+    body: Optional[bytes] = None
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+
+def _is_public(address: str) -> bool:
+    ip = ipaddress.ip_address(address.split("%", 1)[0])
+    if ip.version == 6 and ip.ipv4_mapped:
+        ip = ip.ipv4_mapped
+    return not (ip.is_private or ip.is_loopback or ip.is_link_local or ip.is_multicast
+                or ip.is_reserved or ip.is_unspecified)
+
+async def check_feed_url(url: httpx.URL):
+    """Raise CalendarError unless `url` is http(s) and its host resolves only to public addresses."""
+    if url.scheme not in ("http", "https"):
+        raise CalendarError("Calendar URL must use http or https")
+    if not url.host:
+        raise CalendarError("Calendar URL has no host")
+    port = url.port or (443 if url.scheme == "https" else 80)
+    try:
+        addresses = await asyncio.get_running_loop().getaddrinfo(url.host, port, type=socket.SOCK_STREAM)
+    except socket.gaierror as e:
+        raise CalendarError(f"Could not resolve calendar host {url.host}: {e}")
+    if not addresses or not all(_is_public(info[4][0]) for info in addresses):
+        raise CalendarError(f"Calendar host {url.host} is not a public address")
+
+async def fetch_feed(url: str, etag: Optional[str] = None, last_modified: Optional[str] = None,
+                     client: Optional[httpx.AsyncClient] = None) -> FeedResponse:
+    """GET a feed, conditionally when validators from the previous fetch are given."""
+    if url.startswith("webcal://"):
+        url = "https://" + url[len("webcal://"):]
+    try:
+        target = httpx.URL(url)
+    except httpx.InvalidURL as e:
+        raise CalendarError(f"Invalid calendar URL: {e}")
+    headers = {}
+    if etag:
+        headers["If-None-Match"] = etag
+    if last_modified:
+        headers["If-Modified-Since"] = last_modified
+
+    owns_client = client is None
+    client = client or httpx.AsyncClient(timeout=CALENDAR_FETCH_TIMEOUT_SECONDS)
+    try:
+        for _ in range(CALENDAR_MAX_REDIRECTS + 1):
+            await check_feed_url(target)
+            async with client.stream("GET", target, headers=headers, follow_redirects=False) as response:
+                if response.has_redirect_location:
+                    target = response.url.join(response.headers["Location"])
+                    continue
+                if response.status_code == 304:
+                    return FeedResponse(not_modified=True, etag=etag, last_modified=last_modified)
+                if response.status_code != 200:
+                    raise CalendarError(f"Calendar feed returned HTTP {response.status_code}")
+                body = bytearray()
+                async for chunk in response.aiter_bytes():
+                    body += chunk
+                    if len(body) > CALENDAR_MAX_BYTES:
+                        raise CalendarError(f"Calendar feed exceeds {CALENDAR_MAX_BYTES} bytes")
+                return FeedResponse(
+                    not_modified=False,
+                    body=bytes(body),
+                    etag=response.headers.get("ETag"),
+                    last_modified=response.headers.get("Last-Modified"),
+                )
+        raise CalendarError(f"Calendar feed redirected more than {CALENDAR_MAX_REDIRECTS} times")
+    except (httpx.HTTPError, httpx.InvalidURL) as e:
+        raise CalendarError(f"Could not fetch calendar feed: {e}")
+    finally:
+        if owns_client:
+            await client.aclose()
+
+def parse_calendar(data: bytes) -> Tuple[Calendar, Dict[str, str]]:
+    """Parse iCalendar data. Returns the calendar and a {uid: version} map of its events."""
+    try:
+        calendar = Calendar.from_ical(data)
+    except ValueError as e:
+        raise CalendarError(f"Invalid iCalendar data: {e}")
+
+    parts: Dict[str, List[str]] = {}
+    for event in calendar.walk("VEVENT"):
+        uid = str(event.get("UID", ""))
+        if not uid:
+            continue
+        modified = event.get("LAST-MODIFIED")
+        recurrence_id = event.get("RECURRENCE-ID")
+        parts.setdefault(uid, []).append(":".join([
+            str(int(event.get("SEQUENCE", 0))),
+            modified.dt.isoformat() if modified else "",
+            recurrence_id.to_ical().decode() if recurrence_id else "",
+        ]))
+    # Overrides share their master's UID, so a change to any of them re-expands the whole group
+    return calendar, {uid: "|".join(sorted(items)) for uid, items in parts.items()}
+
+def sync_horizon(now: Optional[datetime] = None) -> Interval:
+    """Naive UTC window that recurring events are expanded within."""
+    now = now or datetime.utcnow()
+    return now - timedelta(days=1), now + timedelta(days=CALENDAR_SYNC_HORIZON_DAYS)
+
+def _to_utc(value) -> datetime:
+    # All-day dates and floating times are facility-local
+    if not isinstance(value, datetime):
+        value = datetime.combine(value, datetime.min.time())
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=_facility_tz)
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+def _segments(start: datetime, end: datetime) -> Iterable[Interval]:
+    while start < end:
+        piece_end = min(start + BUSY_SEGMENT, end)
+        yield start, piece_end
+        start = piece_end
+
+def expand_busy(calendar: Calendar, uids: Iterable[str], start: datetime, end: datetime) -> Dict[str, List[Interval]]:
+    """Busy intervals within [start, end) for the events with the given UIDs. CPU bound."""
+    wanted = set(uids)
+    subset = Calendar()
+    for component in calendar.subcomponents:
+        if component.name == "VTIMEZONE" or (component.name == "VEVENT" and str(component.get("UID", "")) in wanted):
+            subset.add_component(component)
+    for name, value in calendar.property_items(recursive=False):
+        if name == "X-WR-TIMEZONE":
+            subset.add(name, value)
+
+    busy: Dict[str, List[Interval]] = {uid: [] for uid in wanted}
+    try:
+        occurrences = recurring_ical_events.of(subset, skip_bad_series=True).between(start, end)
+    except Exception as e:
+        raise CalendarError(f"Could not expand calendar events: {e}")
+    for event in occurrences:
+        if str(event.get("STATUS", "")).upper() == "CANCELLED" or str(event.get("TRANSP", "")).upper() == "TRANSPARENT":
+            continue
+        occ_start = event.get("DTSTART")
+        if occ_start is None:
+            continue
+        occ_start = occ_start.dt
+        try:
+            occ_end = event.end
+        except Exception:
+            occ_end = None
+        if occ_end is None:
+            occ_end = occ_start + timedelta(days=1) if not isinstance(occ_start, datetime) else occ_start
+        busy_start, busy_end = _to_utc(occ_start), _to_utc(occ_end)
+        busy[str(event.get("UID"))].extend(_segments(max(busy_start, start), min(busy_end, end)))
+    return busy
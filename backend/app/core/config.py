@@ -0,0 +1,20 @@
+import os
+
+# Facility-local timezone used to decide which calendar day an appointment falls on
+FACILITY_TIMEZONE = os.getenv("FACILITY_TIMEZONE", "UTC")
+
+# Seconds a cached daily manifest may be served before it is rebuilt, even without
+# an invalidating write (covers writes made by other worker processes)
+MANIFEST_CACHE_TTL_SECONDS = int(os.getenv("MANIFEST_CACHE_TTL_SECONDS", "60"))
+
+# Longest bookable appointment; bounds the index range scanned for overlapping bookings
+MAX_APPOINTMENT_MINUTES = int(os.getenv("MAX_APPOINTMENT_MINUTES", str(12 * 60)))
+
+# Facility-local working hours searched for free slots
+WORKDAY_START_HOUR = int(os.getenv("WORKDAY_START_HOUR", "9"))
+WORKDAY_END_HOUR = int(os.getenv("WORKDAY_END_HOUR", "18"))
+
+# Minutes between background refreshes of employees' calendar feeds (0 disables the refresher)
+CALENDAR_REFRESH_MINUTES = int(os.getenv("CALENDAR_REFRESH_MINUTES", "15"))
+# Feeds fetched at the same time by the refresher
+CALENDAR_SYNC_CONCURRENCY = int(os.getenv("CALENDAR_SYNC_CONCURRENCY", "4"))
@@ -1,17 +1,125 @@
-from sqlalchemy import create_engine
+"""Engine and session setup.
+
+DATABASE_URL selects the database (default: SQLite file vms.db in the backend
+directory). Plain URLs get the right driver for each engine:
+
+- sqlite:///path.db      -> pysqlite (sync) and aiosqlite (async)
+- postgresql://...       -> psycopg2 (sync) and asyncpg (async)
+
+SQLite connections are put in WAL mode on connect, so readers never block the
+writer and commits fsync only at checkpoints (synchronous=NORMAL). Writers
+still take turns; busy_timeout makes them wait for the lock instead of failing
+with "database is locked".
+"""
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import URL, make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from typing import Dict, Optional
 
 import os
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-DB_PATH = os.path.join(BASE_DIR, "vms.db")
-SQLALCHEMY_DATABASE_URL = f"sqlite:///{DB_PATH}"
+DATABASE_URL = os.getenv("DATABASE_URL", f"sqlite:///{os.path.join(BASE_DIR, 'vms.db')}")
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
-)
+# SQLite has a single writer: a few connections per process keep waiting requests queued in
+# the pool (FIFO) instead of polling in SQLite's busy handler while holding a pool slot
+SQLITE_POOL_SIZE, SQLITE_MAX_OVERFLOW = 5, 0
+SERVER_POOL_SIZE, SERVER_MAX_OVERFLOW = 10, 10
+DB_POOL_SIZE = os.getenv("DB_POOL_SIZE")
+DB_MAX_OVERFLOW = os.getenv("DB_MAX_OVERFLOW")
+DB_POOL_TIMEOUT_SECONDS = int(os.getenv("DB_POOL_TIMEOUT_SECONDS", "30"))
+DB_POOL_RECYCLE_SECONDS = 1800
+
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "15000"))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", "65536"))
+
+SYNC_DRIVERS = {"sqlite": "sqlite", "postgresql": "postgresql+psycopg2"}
+ASYNC_DRIVERS = {"sqlite": "sqlite+aiosqlite", "postgresql": "postgresql+asyncpg"}
+
+def _with_driver(url: URL, drivers: Dict[str, str]) -> URL:
+    backend = "postgresql" if url.get_backend_name() in ("postgres", "postgresql") else url.get_backend_name()
+    if backend not in drivers:
+        raise ValueError(f"Unsupported DATABASE_URL backend {backend!r}")
+    return url.set(drivername=drivers[backend])
+
+def _sqlite_path(url: URL) -> Optional[str]:
+    if url.get_backend_name() != "sqlite" or url.database in (None, "", ":memory:"):
+        return None
+    return os.path.abspath(url.database)
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+    # Negative cache_size is in KiB rather than pages
+    cursor.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.close()
+
+def _engine_options(url: URL) -> dict:
+    if url.get_backend_name() == "sqlite" and _sqlite_path(url) is None:
+        # In-memory databases live in a single connection
+        return {"connect_args": {"check_same_thread": False}}
+    is_sqlite = url.get_backend_name() == "sqlite"
+    options = {
+        "pool_size": int(DB_POOL_SIZE or (SQLITE_POOL_SIZE if is_sqlite else SERVER_POOL_SIZE)),
+        "max_overflow": int(DB_MAX_OVERFLOW or (SQLITE_MAX_OVERFLOW if is_sqlite else SERVER_MAX_OVERFLOW)),
+        "pool_timeout": DB_POOL_TIMEOUT_SECONDS,
+    }
+    if is_sqlite:
+        # The busy_timeout pragma does the waiting; pysqlite's own timeout is in seconds
+        options["connect_args"] = {"check_same_thread": False, "timeout": SQLITE_BUSY_TIMEOUT_MS / 1000}
+    else:
+        options["pool_pre_ping"] = True
+        options["pool_recycle"] = DB_POOL_RECYCLE_SECONDS
+    return options
+
+def _begin_immediate(conn):
+    conn.exec_driver_sql("BEGIN IMMEDIATE")
+
+def _disable_pysqlite_transactions(dbapi_connection, connection_record):
+    # pysqlite only opens transactions before DML; let SQLAlchemy emit BEGIN itself
+    dbapi_connection.isolation_level = None
+
+def create_sync_engine(database_url: str = DATABASE_URL, transactional_ddl: bool = False):
+    """Sync engine for one database URL.
+
+    With transactional_ddl, SQLite transactions start with BEGIN IMMEDIATE and
+    cover DDL too (PostgreSQL DDL is always transactional). The migration runner
+    uses this so a failed migration rolls back completely.
+    """
+    url = make_url(database_url)
+    sync_engine = create_engine(_with_driver(url, SYNC_DRIVERS), **_engine_options(url))
+    if url.get_backend_name() == "sqlite":
+        event.listen(sync_engine, "connect", _set_sqlite_pragmas)
+        if transactional_ddl:
+            event.listen(sync_engine, "connect", _disable_pysqlite_transactions)
+            event.listen(sync_engine, "begin", _begin_immediate)
+    return sync_engine
+
+def create_engines(database_url: str = DATABASE_URL):
+    """Build the (sync, async) engine pair for one database URL."""
+    url = make_url(database_url)
+    async_engine = create_async_engine(_with_driver(url, ASYNC_DRIVERS), **_engine_options(url))
+    if url.get_backend_name() == "sqlite":
+        event.listen(async_engine.sync_engine, "connect", _set_sqlite_pragmas)
+    return create_sync_engine(database_url), async_engine
+
+# Path of the SQLite file, None for other databases
+DB_PATH = _sqlite_path(make_url(DATABASE_URL))
+
+# Synchronous engine for scripts and startup tasks; async engine for the API
+# routers so queries never block the event loop
+engine, async_engine = create_engines()
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+AsyncSessionLocal = async_sessionmaker(
+    async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
+)
 
 Base = declarative_base()
 
@@ -21,3 +129,7 @@ def get_db():
         yield db
     finally:
         db.close()
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
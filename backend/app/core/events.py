@@ -0,0 +1,103 @@
+"""In-process pub/sub bus for pushing appointment changes to consoles.
+
+Writers publish after committing; subscribers (one per open Server-Sent
+Events connection) get events through a bounded queue, optionally filtered by
+host. Recent events are kept in a ring buffer so a reconnecting client can
+resume from its Last-Event-ID instead of reloading everything. An idle
+subscriber costs one small queue and one parked coroutine.
+"""
+from dataclasses import dataclass, field
+from collections import deque
+from datetime import datetime
+from typing import Any, Deque, Dict, List, Optional, Set
+import asyncio
+import json
+import uuid
+
+EVENT_HISTORY_SIZE = 1000
+SUBSCRIBER_QUEUE_SIZE = 100
+
+@dataclass
+class Event:
+    id: str
+    type: str
+    host_name: Optional[str]
+    data: Dict[str, Any]
+
+    def to_sse(self) -> str:
+        return f"id: {self.id}\nevent: {self.type}\ndata: {json.dumps(self.data, default=str)}\n\n"
+
+@dataclass(eq=False)
+class Subscription:
+    host_name: Optional[str] = None
+    queue: asyncio.Queue = field(default_factory=lambda: asyncio.Queue(SUBSCRIBER_QUEUE_SIZE))
+    # Set when the subscriber fell too far behind; the client must resync
+    overflowed: bool = False
+
+    def wants(self, event: Event) -> bool:
+        return self.host_name is None or event.host_name == self.host_name
+
+class EventBus:
+    def __init__(self, history_size: int = EVENT_HISTORY_SIZE):
+        # Event ids are "<epoch>-<seq>"; a new epoch per process tells clients ids from a previous run are void
+        self.epoch = uuid.uuid4().hex[:8]
+        self._seq = 0
+        self._history: Deque[Event] = deque(maxlen=history_size)
+        self._subscribers: Set[Subscription] = set()
+
+    def __len__(self) -> int:
+        return len(self._subscribers)
+
+    def publish(self, event_type: str, data: Dict[str, Any], host_name: Optional[str] = None) -> Event:
+        self._seq += 1
+        event = Event(id=f"{self.epoch}-{self._seq}", type=event_type, host_name=host_name, data=data)
+        self._history.append(event)
+        for sub in self._subscribers:
+            if sub.overflowed or not sub.wants(event):
+                continue
+            try:
+                sub.queue.put_nowait(event)
+            except asyncio.QueueFull:
+                sub.overflowed = True
+        return event
+
+    def subscribe(self, host_name: Optional[str] = None, last_event_id: Optional[str] = None):
+        """Register a subscriber. Returns (subscription, events to replay, resync_needed)."""
+        sub = Subscription(host_name=host_name)
+        self._subscribers.add(sub)
+
+        replay: List[Event] = []
+        resync = False
+        if last_event_id:
+            epoch, _, seq = last_event_id.partition("-")
+            oldest = int(self._history[0].id.partition("-")[2]) if self._history else self._seq + 1
+            if epoch != self.epoch or not seq.isdigit() or int(seq) < oldest - 1:
+                resync = True
+            else:
+                replay = [
+                    event for event in self._history
+                    if int(event.id.partition("-")[2]) > int(seq) and sub.wants(event)
+                ]
+        return sub, replay, resync
+
+    def unsubscribe(self, sub: Subscription):
+        self._subscribers.discard(sub)
+
+event_bus = EventBus()
+
+def publish_appointment(event_type: str, appt) -> Event:
+    """Publish the current state of a DBAppointment."""
+    def iso(value: Optional[datetime]):
+        return value.isoformat() if value else None
+
+    return event_bus.publish(event_type, {
+        "id": appt.id,
+        "visitor_id": appt.visitor_id,
+        "host_name": appt.host_name,
+        "purpose": appt.purpose,
+        "status": getattr(appt.status, "value", appt.status),
+        "scheduled_time": iso(appt.scheduled_time),
+        "duration_minutes": appt.duration_minutes,
+        "check_in_time": iso(appt.check_in_time),
+        "check_out_time": iso(appt.check_out_time),
+    }, host_name=appt.host_name)
@@ -0,0 +1,238 @@
+"""Face embeddings and matching.
+
+Images are turned into fixed-length, L2-normalised vectors by a pluggable
+extractor, once at enrollment. Vectors live in a memory-mapped float32 matrix
+on disk, so 1:1 verification is a single dot product and 1:N identification
+is one matrix-vector product over every enrolled identity.
+
+The default extractor is a CPU-only appearance descriptor (a normalised,
+downsampled grayscale face crop). Deployments that need real face
+recognition can point FACE_EMBEDDER at any class with the same interface.
+The default descriptor matches appearance, not identity, so a photo of an
+enrolled user passes it; face login is limited to visitors until a real
+extractor is configured.
+"""
+from contextlib import contextmanager
+from fastapi.concurrency import run_in_threadpool
+from typing import Dict, List, Optional, Protocol, Tuple, Union
+import fcntl
+import importlib
+import io
+import os
+import tempfile
+import threading
+
+import numpy as np
+from PIL import Image, ImageOps
+
+from .images import ImageIngestError, ingest_image
+
+# Raw image bytes or a path to an image file
+ImageSource = Union[bytes, str]
+
+FACE_EMBEDDINGS_DIR = os.getenv("FACE_EMBEDDINGS_DIR", "storage/embeddings")
+# "module:Class" of the extractor to use
+DEFAULT_FACE_EMBEDDER = "app.core.faces:ThumbnailEmbedder"
+FACE_EMBEDDER = os.getenv("FACE_EMBEDDER", DEFAULT_FACE_EMBEDDER)
+# Minimum cosine similarity for two embeddings to count as the same person
+FACE_MATCH_THRESHOLD = float(os.getenv("FACE_MATCH_THRESHOLD", "0.85"))
+
+class FaceEmbedder(Protocol):
+    dim: int
+
+    def embed(self, image: ImageSource) -> np.ndarray:
+        """Return a float32 vector of length `dim` with unit L2 norm."""
+
+class ThumbnailEmbedder:
+    """Central crop, equalised, downsampled to side x side and standardised."""
+
+    def __init__(self, side: int = 12):
+        self.side = side
+        self.dim = side * side
+
+    def embed(self, image: ImageSource) -> np.ndarray:
+        image = Image.open(io.BytesIO(image) if isinstance(image, bytes) else image)
+        image = ImageOps.exif_transpose(image).convert("L")
+        image = ImageOps.equalize(ImageOps.fit(image, (self.side * 4, self.side * 4), centering=(0.5, 0.4)))
+        pixels = np.asarray(image.resize((self.side, self.side), Image.BILINEAR), dtype=np.float32).ravel()
+        pixels -= pixels.mean()
+        norm = np.linalg.norm(pixels)
+        return pixels / norm if norm else pixels
+
+def load_embedder(path: str = FACE_EMBEDDER) -> FaceEmbedder:
+    module_name, class_name = path.split(":", 1)
+    return getattr(importlib.import_module(module_name), class_name)()
+
+class EmbeddingStore:
+    """Memory-mapped matrix of enrolled embeddings, one row per user id.
+
+    Layout in `directory`: `embeddings.f32` (capacity x dim float32 rows) and
+    `ids.npy` (user id per row, -1 for free rows). The file grows by doubling.
+
+    Every worker process opens the same directory. Writers take an exclusive
+    flock on `ids.lock`, pick up the current ids.npy, and publish the new one
+    by writing a temporary file and renaming it into place; readers reload
+    the id map whenever ids.npy has been replaced since they last read it.
+    """
+
+    def __init__(self, directory: str, dim: int, initial_capacity: int = 1024):
+        self.directory = directory
+        self.dim = dim
+        self._lock = threading.Lock()
+        self._matrix_path = os.path.join(directory, "embeddings.f32")
+        self._ids_path = os.path.join(directory, "ids.npy")
+        self._lock_path = os.path.join(directory, "ids.lock")
+        os.makedirs(directory, exist_ok=True)
+
+        self._ids = np.full(initial_capacity, -1, dtype=np.int64)
+        self._ids_version: Optional[Tuple[int, int, int]] = None
+        self._matrix: Optional[np.memmap] = None
+        self._rows: Dict[int, int] = {}
+        self._size = 0
+        with self._lock, self._exclusive():
+            self._refresh()
+
+    @contextmanager
+    def _exclusive(self):
+        """Hold the cross-process write lock; it is released when the file is closed."""
+        with open(self._lock_path, "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            yield
+
+    def _stat_ids(self) -> Optional[Tuple[int, int, int]]:
+        try:
+            st = os.stat(self._ids_path)
+        except FileNotFoundError:
+            return None
+        return st.st_ino, st.st_mtime_ns, st.st_size
+
+    def _refresh(self) -> None:
+        """Reload the id map if another process replaced ids.npy. Caller holds self._lock."""
+        version = self._stat_ids()
+        if version is not None and version != self._ids_version:
+            self._ids = np.load(self._ids_path)
+            self._rows = {int(uid): row for row, uid in enumerate(self._ids) if uid >= 0}
+            self._size = max(self._rows.values(), default=-1) + 1
+        self._ids_version = version
+        # Writers grow the matrix before publishing ids for the new rows
+        if self._matrix is None or len(self._matrix) < len(self._ids):
+            self._matrix = self._open_matrix(len(self._ids))
+
+    def _save_ids(self) -> None:
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.save(f, self._ids)
+            os.replace(tmp_path, self._ids_path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        self._ids_version = self._stat_ids()
+
+    def _open_matrix(self, capacity: int) -> np.memmap:
+        mode = "r+" if os.path.exists(self._matrix_path) else "w+"
+        if mode == "r+" and os.path.getsize(self._matrix_path) < capacity * self.dim * 4:
+            with open(self._matrix_path, "r+b") as f:
+                f.truncate(capacity * self.dim * 4)
+        return np.memmap(self._matrix_path, dtype=np.float32, mode=mode, shape=(capacity, self.dim))
+
+    def _current(self) -> None:
+        with self._lock:
+            self._refresh()
+
+    def __len__(self) -> int:
+        self._current()
+        return len(self._rows)
+
+    def enroll(self, user_id: int, embedding: np.ndarray) -> None:
+        with self._lock, self._exclusive():
+            self._refresh()
+            row = self._rows.get(user_id)
+            if row is None:
+                if self._size == len(self._ids):
+                    self._matrix.flush()
+                    capacity = len(self._ids) * 2
+                    self._ids = np.concatenate([self._ids, np.full(capacity - len(self._ids), -1, dtype=np.int64)])
+                    self._matrix = self._open_matrix(capacity)
+                row = self._size
+                self._size += 1
+                self._rows[user_id] = row
+                self._ids[row] = user_id
+            self._matrix[row] = embedding
+            self._matrix.flush()
+            self._save_ids()
+
+    def remove(self, user_id: int) -> None:
+        with self._lock, self._exclusive():
+            self._refresh()
+            row = self._rows.pop(user_id, None)
+            if row is not None:
+                self._ids[row] = -1
+                self._matrix[row] = 0
+                self._matrix.flush()
+                self._save_ids()
+
+    def has(self, user_id: int) -> bool:
+        self._current()
+        return user_id in self._rows
+
+    def verify(self, user_id: int, embedding: np.ndarray) -> Optional[float]:
+        """Cosine similarity against one enrolled user, or None if not enrolled."""
+        self._current()
+        row = self._rows.get(user_id)
+        if row is None:
+            return None
+        return float(self._matrix[row] @ embedding)
+
+    def identify(self, embedding: np.ndarray, top_k: int = 1) -> List[Tuple[int, float]]:
+        """Best (user_id, similarity) matches across every enrolled identity."""
+        self._current()
+        if not self._rows:
+            return []
+        # Free rows are zero vectors and score 0, below any useful threshold
+        scores = self._matrix[:self._size] @ embedding
+        k = min(top_k, self._size)
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best])]
+        return [(int(self._ids[row]), float(scores[row])) for row in best if self._ids[row] >= 0]
+
+_embedder: Optional[FaceEmbedder] = None
+_store: Optional[EmbeddingStore] = None
+
+def get_embedder() -> FaceEmbedder:
+    global _embedder
+    if _embedder is None:
+        _embedder = load_embedder()
+    return _embedder
+
+def get_store() -> EmbeddingStore:
+    global _store
+    if _store is None:
+        _store = EmbeddingStore(FACE_EMBEDDINGS_DIR, get_embedder().dim)
+    return _store
+
+def embed_face(image: ImageSource) -> np.ndarray:
+    """Compute an embedding. CPU bound; call via run_in_threadpool from async code."""
+    return get_embedder().embed(image)
+
+def enroll_embedding(user_id: int, embedding: np.ndarray) -> None:
+    get_store().enroll(user_id, embedding)
+
+def enroll_face(user_id: int, image: ImageSource) -> None:
+    """Embed and enroll in one step. Blocking; call via run_in_threadpool from async code."""
+    enroll_embedding(user_id, embed_face(image))
+
+def verify_face(user_id: int, image: ImageSource) -> Optional[float]:
+    return get_store().verify(user_id, embed_face(image))
+
+def identify_face(image: ImageSource, top_k: int = 1) -> List[Tuple[int, float]]:
+    return get_store().identify(embed_face(image), top_k)
+
+async def ingest_face(value: str) -> Tuple[str, np.ndarray]:
+    """Store a face image (upload reference or base64) and compute its embedding."""
+    path = await ingest_image(value)
+    try:
+        return path, await run_in_threadpool(embed_face, path)
+    except Exception as e:
+        # The blob may be shared with other users; unreferenced blobs are left to collect_garbage
+        raise ImageIngestError(f"Unreadable image: {e}")
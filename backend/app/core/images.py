@@ -0,0 +1,296 @@
+"""Shared face-image ingest and content-addressed blob store.
+
+Images arrive either as multipart uploads (staged via /uploads/faces and then
+referenced as "upload:<id>") or, for older clients, as base64 data URLs inside
+JSON bodies. Both paths validate type and size incrementally, hold at most one
+chunk in memory, write off the event loop and publish the final file with an
+atomic rename, so readers never see a partially written image.
+
+Stored images are keyed by the SHA-256 of their bytes
+(storage/faces/<2 hex>/<sha256>.<ext>), so identical uploads share one blob,
+names never collide and the digest doubles as a strong ETag. Thumbnails for
+THUMBNAIL_SIZES are generated when a blob is first stored. Blobs no longer
+referenced by any user are removed by collect_garbage, which the app runs on
+a schedule (app/db/images.py) and gc_face_images.py runs on demand.
+
+Staging is open to anonymous clients (signup uploads a face before the
+account exists), so it is rate limited per client IP and capped at
+MAX_STAGED_UPLOADS files waiting to be used or collected.
+"""
+from fastapi import UploadFile
+from fastapi.concurrency import run_in_threadpool
+from typing import Dict, Iterable, Optional, Tuple
+import base64
+import binascii
+import hashlib
+import os
+import re
+import time
+import uuid
+
+from PIL import Image, ImageOps
+
+from .otp import RateLimiter
+
+FACE_IMAGES_DIR = "storage/faces"
+THUMBNAILS_DIR = os.path.join(FACE_IMAGES_DIR, "thumbs")
+UPLOAD_STAGING_DIR = "storage/uploads"
+os.makedirs(FACE_IMAGES_DIR, exist_ok=True)
+os.makedirs(UPLOAD_STAGING_DIR, exist_ok=True)
+
+MAX_FACE_IMAGE_BYTES = int(os.getenv("MAX_FACE_IMAGE_BYTES", str(5 * 1024 * 1024)))
+INGEST_CHUNK_SIZE = 64 * 1024
+UPLOAD_REF_PREFIX = "upload:"
+# Square thumbnail edge lengths generated for every stored image
+THUMBNAIL_SIZES = (64, 256)
+# Files younger than this are never garbage collected (their user row may not be committed yet)
+GC_GRACE_SECONDS = 3600
+MAX_STAGED_UPLOADS = int(os.getenv("MAX_STAGED_UPLOADS", "500"))
+# Token bucket per client IP: (capacity, seconds per refilled token)
+UPLOAD_LIMIT_PER_IP = (10, 30.0)
+
+_UPLOAD_ID = re.compile(r"^[0-9a-f]{32}$")
+_DIGEST_NAME = re.compile(r"^([0-9a-f]{64})\.(jpg|png|webp)$")
+
+class ImageIngestError(ValueError):
+    pass
+
+class UploadRejected(Exception):
+    """Staging refused for now; the client may retry after `retry_after` seconds."""
+
+    def __init__(self, detail: str, retry_after: float):
+        super().__init__(detail)
+        self.retry_after = retry_after
+
+_uploads_per_ip = RateLimiter(*UPLOAD_LIMIT_PER_IP)
+
+def sweep_upload_limits():
+    _uploads_per_ip.sweep()
+
+def _sniff_extension(head: bytes) -> str:
+    if head.startswith(b"\xff\xd8\xff"):
+        return "jpg"
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "png"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "webp"
+    raise ImageIngestError("Unsupported image type (expected JPEG, PNG or WebP)")
+
+def blob_path(digest: str, extension: str) -> str:
+    return os.path.join(FACE_IMAGES_DIR, digest[:2], f"{digest}.{extension}")
+
+def thumbnail_path(digest: str, size: int) -> str:
+    return os.path.join(THUMBNAILS_DIR, str(size), f"{digest}.jpg")
+
+def blob_digest(path: str) -> Optional[str]:
+    """SHA-256 of a content-addressed blob, read from its name; None for legacy files."""
+    match = _DIGEST_NAME.match(os.path.basename(path))
+    return match.group(1) if match else None
+
+class _ImageWriter:
+    """Streams chunks to a temp file, checking type on the first bytes and size as it goes."""
+
+    def __init__(self, directory: str):
+        self.tmp_path = os.path.join(directory, f".{uuid.uuid4().hex}.part")
+        self.extension: Optional[str] = None
+        self.size = 0
+        self.sha256 = hashlib.sha256()
+        self._file = None
+        self._head = b""
+
+    async def write(self, chunk: bytes):
+        if not chunk:
+            return
+        self.size += len(chunk)
+        if self.size > MAX_FACE_IMAGE_BYTES:
+            raise ImageIngestError(f"Image exceeds {MAX_FACE_IMAGE_BYTES} bytes")
+        if self.extension is None:
+            self._head += chunk[:12]
+            if len(self._head) >= 12:
+                self.extension = _sniff_extension(self._head)
+        self.sha256.update(chunk)
+        if self._file is None:
+            self._file = await run_in_threadpool(open, self.tmp_path, "wb")
+        await run_in_threadpool(self._file.write, chunk)
+
+    async def close(self):
+        if self.size == 0:
+            raise ImageIngestError("Empty image data")
+        if self.extension is None:
+            self.extension = _sniff_extension(self._head)
+        await run_in_threadpool(self._file.close)
+
+    async def abort(self):
+        if self._file is not None:
+            await run_in_threadpool(self._file.close)
+        if os.path.exists(self.tmp_path):
+            await run_in_threadpool(os.remove, self.tmp_path)
+
+def _make_thumbnails(path: str, digest: str):
+    with Image.open(path) as image:
+        image = ImageOps.exif_transpose(image).convert("RGB")
+        for size in THUMBNAIL_SIZES:
+            target = thumbnail_path(digest, size)
+            if os.path.exists(target):
+                continue
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            tmp = f"{target}.{uuid.uuid4().hex}.part"
+            ImageOps.fit(image, (size, size), centering=(0.5, 0.4)).save(tmp, "JPEG", quality=85)
+            os.replace(tmp, target)
+
+def _publish_blob(tmp_path: str, digest: str, extension: str) -> Tuple[str, bool]:
+    """Move a fully written temp file to its content address. Returns (path, newly_created)."""
+    final_path = blob_path(digest, extension)
+    try:
+        # Reusing a blob makes it as young as a new one, so collect_garbage's grace period
+        # covers the window before the referencing user row is committed
+        os.utime(final_path)
+    except FileNotFoundError:
+        pass
+    else:
+        for size in THUMBNAIL_SIZES:
+            try:
+                os.utime(thumbnail_path(digest, size))
+            except FileNotFoundError:
+                pass
+        os.remove(tmp_path)
+        return final_path, False
+    os.makedirs(os.path.dirname(final_path), exist_ok=True)
+    os.replace(tmp_path, final_path)
+    return final_path, True
+
+async def _store(tmp_path: str, digest: str, extension: str) -> str:
+    path, created = await run_in_threadpool(_publish_blob, tmp_path, digest, extension)
+    try:
+        await run_in_threadpool(_make_thumbnails, path, digest)
+    except Exception as e:
+        if created:
+            await run_in_threadpool(os.remove, path)
+        raise ImageIngestError(f"Unreadable image: {e}")
+    return path
+
+def _staged_count() -> int:
+    with os.scandir(UPLOAD_STAGING_DIR) as entries:
+        return sum(1 for _ in entries)
+
+async def stage_upload(upload: UploadFile, client_ip: Optional[str] = None) -> str:
+    """Stream a multipart upload into the staging area and return its upload id."""
+    if client_ip:
+        wait = _uploads_per_ip.take(client_ip)
+        if wait:
+            raise UploadRejected("Too many uploads, please try again later", wait)
+    if await run_in_threadpool(_staged_count) >= MAX_STAGED_UPLOADS:
+        raise UploadRejected("Too many pending uploads, please try again later", GC_GRACE_SECONDS)
+    upload_id = uuid.uuid4().hex
+    writer = _ImageWriter(UPLOAD_STAGING_DIR)
+    try:
+        while chunk := await upload.read(INGEST_CHUNK_SIZE):
+            await writer.write(chunk)
+        await writer.close()
+        staged = os.path.join(UPLOAD_STAGING_DIR, f"{upload_id}.{writer.sha256.hexdigest()}.{writer.extension}")
+        await run_in_threadpool(os.replace, writer.tmp_path, staged)
+    except BaseException:
+        await writer.abort()
+        raise
+    return upload_id
+
+def _find_staged(upload_id: str) -> str:
+    if not _UPLOAD_ID.match(upload_id):
+        raise ImageIngestError("Invalid upload reference")
+    for name in os.listdir(UPLOAD_STAGING_DIR):
+        if name.startswith(f"{upload_id}."):
+            return os.path.join(UPLOAD_STAGING_DIR, name)
+    raise ImageIngestError("Upload not found or already used")
+
+async def ingest_image(value: str) -> str:
+    """Store a face image given as an upload reference or base64 data URL; returns its blob path."""
+    if value.startswith(UPLOAD_REF_PREFIX):
+        staged = await run_in_threadpool(_find_staged, value[len(UPLOAD_REF_PREFIX):])
+        _, digest, extension = os.path.basename(staged).split(".")
+        return await _store(staged, digest, extension)
+
+    encoded = value.split(",", 1)[1] if "," in value else value
+    # MIME-style payloads wrap lines; drop whitespace so the slices below stay 4-character aligned
+    encoded = "".join(encoded.split())
+    writer = _ImageWriter(FACE_IMAGES_DIR)
+    # Decode in slices that are a multiple of 4 characters so each slice decodes on its own
+    step = INGEST_CHUNK_SIZE // 3 * 4
+    try:
+        for start in range(0, len(encoded), step):
+            try:
+                chunk = base64.b64decode(encoded[start:start + step], validate=True)
+            except binascii.Error as e:
+                raise ImageIngestError(f"Invalid base64 image data: {e}")
+            await writer.write(chunk)
+        await writer.close()
+    except BaseException:
+        await writer.abort()
+        raise
+    return await _store(writer.tmp_path, writer.sha256.hexdigest(), writer.extension)
+
+_legacy_etags: Dict[Tuple[str, int, int], str] = {}
+
+def image_etag(path: str, size: Optional[int] = None) -> str:
+    """Strong ETag for a stored image (or one of its thumbnails)."""
+    digest = blob_digest(path)
+    if digest is None:
+        # Legacy {phone}_{n}.jpg files: hash once per (path, mtime, size)
+        stat = os.stat(path)
+        key = (path, stat.st_mtime_ns, stat.st_size)
+        if key not in _legacy_etags:
+            sha256 = hashlib.sha256()
+            with open(path, "rb") as f:
+                while chunk := f.read(INGEST_CHUNK_SIZE):
+                    sha256.update(chunk)
+            _legacy_etags[key] = sha256.hexdigest()
+        digest = _legacy_etags[key]
+    return f'"{digest}-{size}"' if size else f'"{digest}"'
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or any(tag.removeprefix("W/") == etag for tag in candidates)
+
+def collect_garbage(referenced_paths: Iterable[str], dry_run: bool = False) -> Dict[str, int]:
+    """Delete stored images, thumbnails and stale uploads that no user references."""
+    referenced = {os.path.realpath(path) for path in referenced_paths if path}
+    referenced_digests = {blob_digest(path) for path in referenced} - {None}
+    cutoff = time.time() - GC_GRACE_SECONDS
+    removed = {"images": 0, "thumbnails": 0, "uploads": 0}
+
+    def remove(path: str, kind: str):
+        if dry_run:
+            removed[kind] += 1
+            return
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            # Already collected by another worker process
+            return
+        removed[kind] += 1
+
+    for root, dirs, files in os.walk(FACE_IMAGES_DIR):
+        if os.path.realpath(root).startswith(os.path.realpath(THUMBNAILS_DIR)):
+            continue
+        for name in files:
+            path = os.path.join(root, name)
+            if name == ".gitkeep" or os.path.getmtime(path) > cutoff:
+                continue
+            if os.path.realpath(path) not in referenced:
+                remove(path, "images")
+
+    for root, dirs, files in os.walk(THUMBNAILS_DIR):
+        for name in files:
+            path = os.path.join(root, name)
+            if os.path.getmtime(path) > cutoff:
+                continue
+            if name.split(".", 1)[0] not in referenced_digests:
+                remove(path, "thumbnails")
+
+    for name in os.listdir(UPLOAD_STAGING_DIR):
+        path = os.path.join(UPLOAD_STAGING_DIR, name)
+        if os.path.getmtime(path) <= cutoff:
+            remove(path, "uploads")
+
+    return removed
@@ -0,0 +1,98 @@
+"""Outbound message transports.
+
+A transport delivers one batch of messages and reports, per message, whether
+it was sent. Queueing, retries and deduplication are handled by the
+notification queue (app/db/notifications.py); transports only talk to the
+outside world and are called off the event loop.
+
+- "console": print to stdout (default, matches the old OTP behaviour)
+- "file": append JSON lines to NOTIFICATION_FILE_PATH
+- "smtp": send through an SMTP server such as a local stand-in
+  (python -m aiosmtpd -n -l localhost:1025). SMS messages go to
+  <phone>@NOTIFICATION_SMS_GATEWAY_DOMAIN.
+"""
+from dataclasses import dataclass
+from email.message import EmailMessage
+from typing import List, Optional, Protocol
+import importlib
+import json
+import os
+import smtplib
+import threading
+
+NOTIFICATION_TRANSPORT = os.getenv("NOTIFICATION_TRANSPORT", "console")
+NOTIFICATION_FILE_PATH = os.getenv("NOTIFICATION_FILE_PATH", "storage/notifications.log")
+SMTP_HOST = os.getenv("SMTP_HOST", "localhost")
+SMTP_PORT = int(os.getenv("SMTP_PORT", "1025"))
+SMTP_SENDER = os.getenv("SMTP_SENDER", "vms@localhost")
+NOTIFICATION_SMS_GATEWAY_DOMAIN = os.getenv("NOTIFICATION_SMS_GATEWAY_DOMAIN", "sms.localhost")
+
+@dataclass
+class OutboundMessage:
+    id: int
+    channel: str  # "sms" or "email"
+    recipient: str
+    subject: Optional[str]
+    body: str
+
+class Transport(Protocol):
+    def send_batch(self, messages: List[OutboundMessage]) -> List[Optional[str]]:
+        """Deliver messages; returns None for each sent message or an error description."""
+
+class ConsoleTransport:
+    def send_batch(self, messages: List[OutboundMessage]) -> List[Optional[str]]:
+        for message in messages:
+            print(f"NOTIFY [{message.channel} -> {message.recipient}] {message.subject or ''} {message.body}".strip())
+        return [None] * len(messages)
+
+class FileTransport:
+    def __init__(self, path: str = NOTIFICATION_FILE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    def send_batch(self, messages: List[OutboundMessage]) -> List[Optional[str]]:
+        lines = "".join(json.dumps(message.__dict__) + "\n" for message in messages)
+        with self._lock, open(self.path, "a") as f:
+            f.write(lines)
+        return [None] * len(messages)
+
+class SMTPTransport:
+    def __init__(self, host: str = SMTP_HOST, port: int = SMTP_PORT, sender: str = SMTP_SENDER):
+        self.host = host
+        self.port = port
+        self.sender = sender
+
+    def _address(self, message: OutboundMessage) -> str:
+        if message.channel == "sms":
+            return f"{message.recipient.lstrip('+')}@{NOTIFICATION_SMS_GATEWAY_DOMAIN}"
+        return message.recipient
+
+    def send_batch(self, messages: List[OutboundMessage]) -> List[Optional[str]]:
+        # One connection per batch
+        try:
+            smtp = smtplib.SMTP(self.host, self.port, timeout=10)
+        except OSError as e:
+            return [f"SMTP connect failed: {e}"] * len(messages)
+        results: List[Optional[str]] = []
+        with smtp:
+            for message in messages:
+                email = EmailMessage()
+                email["From"] = self.sender
+                email["To"] = self._address(message)
+                email["Subject"] = message.subject or "Visitor Management System"
+                email.set_content(message.body)
+                try:
+                    smtp.send_message(email)
+                    results.append(None)
+                except smtplib.SMTPException as e:
+                    results.append(f"SMTP send failed: {e}")
+        return results
+
+def load_transport(name: str = NOTIFICATION_TRANSPORT) -> Transport:
+    builtin = {"console": ConsoleTransport, "file": FileTransport, "smtp": SMTPTransport}
+    if name in builtin:
+        return builtin[name]()
+    # "module:Class" of a custom transport
+    module_name, class_name = name.split(":", 1)
+    return getattr(importlib.import_module(module_name), class_name)()
@@ -0,0 +1,230 @@
+"""One-time passcodes for phone verification and login.
+
+Codes live in a pluggable backend, not in the application database:
+
+- "memory" (default): a dict in the worker process. Suitable for a single
+  worker; verification is a dict lookup.
+- "sqlite": a small dedicated SQLite file (OTP_SQLITE_PATH, WAL mode) shared by
+  every worker on the host.
+
+Only an HMAC of each code is stored. A code expires after OTP_TTL_SECONDS and
+is burnt after OTP_MAX_ATTEMPTS wrong guesses. Requests and guesses are also
+rate limited per phone number and per client IP with token buckets. The
+buckets are per process, so with N workers the effective limit is up to N
+times higher; the per-code attempt counter lives in the backend and is
+shared. A sweeper task drops expired codes and idle buckets.
+"""
+from dataclasses import dataclass
+from fastapi.concurrency import run_in_threadpool
+from typing import Dict, Optional, Protocol, Tuple
+import asyncio
+import hashlib
+import hmac
+import logging
+import os
+import secrets
+import sqlite3
+import threading
+import time
+
+from .security import SECRET_KEY
+
+OTP_BACKEND = os.getenv("OTP_BACKEND", "memory")
+OTP_SQLITE_PATH = os.getenv("OTP_SQLITE_PATH", "storage/otp.db")
+OTP_LENGTH = int(os.getenv("OTP_LENGTH", "4"))
+OTP_TTL_SECONDS = int(os.getenv("OTP_TTL_SECONDS", "300"))
+OTP_MAX_ATTEMPTS = int(os.getenv("OTP_MAX_ATTEMPTS", "5"))
+OTP_SWEEP_INTERVAL_SECONDS = 60
+
+logger = logging.getLogger(__name__)
+
+# Token buckets: (capacity, seconds per refilled token)
+SEND_LIMIT_PER_PHONE = (3, 60.0)
+SEND_LIMIT_PER_IP = (10, 30.0)
+VERIFY_LIMIT_PER_PHONE = (10, 30.0)
+VERIFY_LIMIT_PER_IP = (30, 10.0)
+
+class OTPRateLimited(Exception):
+    def __init__(self, retry_after: float):
+        super().__init__("Too many requests")
+        self.retry_after = retry_after
+
+@dataclass
+class OTPRecord:
+    code_hash: str
+    expires_at: float
+    attempts: int = 0
+
+def _hash_code(phone_number: str, code: str) -> str:
+    return hmac.new(SECRET_KEY.encode(), f"{phone_number}:{code}".encode(), hashlib.sha256).hexdigest()
+
+class OTPBackend(Protocol):
+    async def put(self, phone_number: str, record: OTPRecord) -> None: ...
+    async def get(self, phone_number: str) -> Optional[OTPRecord]: ...
+    async def record_failure(self, phone_number: str) -> int:
+        """Increment the attempt counter of the current code and return it."""
+    async def delete(self, phone_number: str) -> None: ...
+    async def sweep(self, now: float) -> int:
+        """Drop expired codes; returns how many were removed."""
+
+class MemoryOTPBackend:
+    def __init__(self):
+        self._records: Dict[str, OTPRecord] = {}
+
+    async def put(self, phone_number: str, record: OTPRecord) -> None:
+        self._records[phone_number] = record
+
+    async def get(self, phone_number: str) -> Optional[OTPRecord]:
+        return self._records.get(phone_number)
+
+    async def record_failure(self, phone_number: str) -> int:
+        record = self._records.get(phone_number)
+        if record is None:
+            return 0
+        record.attempts += 1
+        return record.attempts
+
+    async def delete(self, phone_number: str) -> None:
+        self._records.pop(phone_number, None)
+
+    async def sweep(self, now: float) -> int:
+        expired = [phone for phone, record in self._records.items() if record.expires_at <= now]
+        for phone in expired:
+            del self._records[phone]
+        return len(expired)
+
+class SQLiteOTPBackend:
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._local = threading.local()
+        self.path = path
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS otp_codes ("
+                "phone_number TEXT PRIMARY KEY, code_hash TEXT NOT NULL, expires_at REAL NOT NULL, attempts INTEGER NOT NULL DEFAULT 0)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_otp_codes_expires_at ON otp_codes (expires_at)")
+
+    def _connect(self) -> sqlite3.Connection:
+        # One connection per worker thread
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = sqlite3.connect(self.path, timeout=5)
+        return conn
+
+    def _execute(self, sql: str, params: Tuple = ()):
+        with self._connect() as conn:
+            return conn.execute(sql, params).fetchone()
+
+    async def put(self, phone_number: str, record: OTPRecord) -> None:
+        await run_in_threadpool(
+            self._execute,
+            "INSERT OR REPLACE INTO otp_codes (phone_number, code_hash, expires_at, attempts) VALUES (?, ?, ?, ?)",
+            (phone_number, record.code_hash, record.expires_at, record.attempts),
+        )
+
+    async def get(self, phone_number: str) -> Optional[OTPRecord]:
+        row = await run_in_threadpool(
+            self._execute, "SELECT code_hash, expires_at, attempts FROM otp_codes WHERE phone_number = ?", (phone_number,)
+        )
+        return OTPRecord(*row) if row else None
+
+    async def record_failure(self, phone_number: str) -> int:
+        row = await run_in_threadpool(
+            self._execute,
+            "UPDATE otp_codes SET attempts = attempts + 1 WHERE phone_number = ? RETURNING attempts",
+            (phone_number,),
+        )
+        return row[0] if row else 0
+
+    async def delete(self, phone_number: str) -> None:
+        await run_in_threadpool(self._execute, "DELETE FROM otp_codes WHERE phone_number = ?", (phone_number,))
+
+    async def sweep(self, now: float) -> int:
+        def _sweep():
+            with self._connect() as conn:
+                return conn.execute("DELETE FROM otp_codes WHERE expires_at <= ?", (now,)).rowcount
+        return await run_in_threadpool(_sweep)
+
+class RateLimiter:
+    """Token buckets keyed by arbitrary strings."""
+
+    def __init__(self, capacity: int, refill_seconds: float):
+        self.capacity = capacity
+        self.refill_seconds = refill_seconds
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+
+    def take(self, key: str, now: Optional[float] = None) -> float:
+        """Consume one token. Returns 0 when allowed, else seconds until a token is available."""
+        now = time.monotonic() if now is None else now
+        tokens, updated = self._buckets.get(key, (self.capacity, now))
+        tokens = min(self.capacity, tokens + (now - updated) / self.refill_seconds)
+        if tokens < 1:
+            self._buckets[key] = (tokens, now)
+            return (1 - tokens) * self.refill_seconds
+        self._buckets[key] = (tokens - 1, now)
+        return 0.0
+
+    def sweep(self, now: Optional[float] = None) -> None:
+        # A bucket idle long enough to be full again carries no state
+        now = time.monotonic() if now is None else now
+        full_after = self.capacity * self.refill_seconds
+        for key in [key for key, (_, updated) in self._buckets.items() if now - updated >= full_after]:
+            del self._buckets[key]
+
+def load_backend(name: str = OTP_BACKEND) -> OTPBackend:
+    if name == "sqlite":
+        return SQLiteOTPBackend(OTP_SQLITE_PATH)
+    if name == "memory":
+        return MemoryOTPBackend()
+    raise ValueError(f"Unknown OTP_BACKEND {name!r}")
+
+backend: OTPBackend = load_backend()
+_send_per_phone = RateLimiter(*SEND_LIMIT_PER_PHONE)
+_send_per_ip = RateLimiter(*SEND_LIMIT_PER_IP)
+_verify_per_phone = RateLimiter(*VERIFY_LIMIT_PER_PHONE)
+_verify_per_ip = RateLimiter(*VERIFY_LIMIT_PER_IP)
+
+def _limit(*checks: Tuple[RateLimiter, Optional[str]]):
+    for limiter, key in checks:
+        if key:
+            wait = limiter.take(key)
+            if wait:
+                raise OTPRateLimited(wait)
+
+async def issue_otp(phone_number: str, client_ip: Optional[str] = None) -> str:
+    """Create a new code for a phone number, replacing any previous one."""
+    _limit((_send_per_phone, phone_number), (_send_per_ip, client_ip))
+    code = "".join(secrets.choice("0123456789") for _ in range(OTP_LENGTH))
+    await backend.put(phone_number, OTPRecord(_hash_code(phone_number, code), time.time() + OTP_TTL_SECONDS))
+    return code
+
+async def verify_otp(phone_number: str, code: str, client_ip: Optional[str] = None) -> bool:
+    """Check and consume a code. Expired codes and codes with too many failed attempts never match."""
+    _limit((_verify_per_phone, phone_number), (_verify_per_ip, client_ip))
+    record = await backend.get(phone_number)
+    if record is None:
+        return False
+    if record.expires_at <= time.time() or record.attempts >= OTP_MAX_ATTEMPTS:
+        await backend.delete(phone_number)
+        return False
+    if hmac.compare_digest(record.code_hash, _hash_code(phone_number, code)):
+        await backend.delete(phone_number)
+        return True
+    if await backend.record_failure(phone_number) >= OTP_MAX_ATTEMPTS:
+        await backend.delete(phone_number)
+    return False
+
+async def sweep_otps() -> int:
+    for limiter in (_send_per_phone, _send_per_ip, _verify_per_phone, _verify_per_ip):
+        limiter.sweep()
+    return await backend.sweep(time.time())
+
+async def run_otp_sweeper(interval_seconds: int = OTP_SWEEP_INTERVAL_SECONDS):
+    while True:
+        await asyncio.sleep(interval_seconds)
+        try:
+            await sweep_otps()
+        except Exception:
+            logger.exception("OTP sweep failed")
@@ -0,0 +1,125 @@
+"""Signed visitor passes.
+
+A pass is a short token naming one appointment, its visitor and the window
+in which it may be used to enter, sealed with an HMAC keyed from SECRET_KEY.
+The gate verifies it without touching the database: signature, validity
+window and a revocation set of cancelled / rejected appointments are all
+checked in memory.
+
+Token layout (base64url, no padding): version byte, appointment id, visitor
+id, valid-from and valid-until as unsigned 32-bit big-endian integers (Unix
+seconds, UTC), then the first PASS_MAC_BYTES of the HMAC-SHA256 of all that.
+
+QR images are rendered once per token and kept in an LRU cache; a token
+never changes for the same appointment and window, so neither does its image.
+"""
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from typing import Iterable, Optional, Set
+import base64
+import binascii
+import hashlib
+import hmac
+import io
+import os
+import struct
+
+import segno
+
+from .security import SECRET_KEY
+
+# A pass opens this long before the appointment and closes when it is scheduled to end
+PASS_EARLY_ENTRY_MINUTES = int(os.getenv("PASS_EARLY_ENTRY_MINUTES", "60"))
+PASS_QR_CACHE_SIZE = int(os.getenv("PASS_QR_CACHE_SIZE", "1024"))
+PASS_QR_SCALE = 8
+PASS_MAC_BYTES = 16
+
+PASS_VERSION = 1
+_PAYLOAD = struct.Struct(">BIIII")
+# Separate key so a pass can never be mistaken for (or used to forge) any other signed value
+_PASS_KEY = hmac.new(SECRET_KEY.encode(), b"vms-visitor-pass", hashlib.sha256).digest()
+
+class PassError(Exception):
+    """The token is malformed or its signature does not match."""
+
+@dataclass(frozen=True)
+class PassClaims:
+    appointment_id: int
+    visitor_id: int
+    valid_from: datetime  # naive UTC, like stored timestamps
+    valid_until: datetime
+
+def _epoch(value: datetime) -> int:
+    return int(value.replace(tzinfo=timezone.utc).timestamp())
+
+def _from_epoch(seconds: int) -> datetime:
+    return datetime.fromtimestamp(seconds, timezone.utc).replace(tzinfo=None)
+
+def _mac(payload: bytes) -> bytes:
+    return hmac.new(_PASS_KEY, payload, hashlib.sha256).digest()[:PASS_MAC_BYTES]
+
+def pass_window(scheduled_time: datetime, duration_minutes: int):
+    """(valid_from, valid_until) of the pass for an appointment, to the second like the token."""
+    scheduled_time = scheduled_time.replace(microsecond=0)
+    return (
+        scheduled_time - timedelta(minutes=PASS_EARLY_ENTRY_MINUTES),
+        scheduled_time + timedelta(minutes=duration_minutes),
+    )
+
+def issue_pass(appointment_id: int, visitor_id: int, valid_from: datetime, valid_until: datetime) -> str:
+    payload = _PAYLOAD.pack(PASS_VERSION, appointment_id, visitor_id, _epoch(valid_from), _epoch(valid_until))
+    return base64.urlsafe_b64encode(payload + _mac(payload)).rstrip(b"=").decode()
+
+def verify_pass(token: str) -> PassClaims:
+    """Claims of a genuine token (raises PassError). Does not check the window or revocation."""
+    try:
+        raw = base64.urlsafe_b64decode(token.strip() + "=" * (-len(token.strip()) % 4))
+    except (binascii.Error, ValueError):
+        raise PassError("Pass is not readable")
+    if len(raw) != _PAYLOAD.size + PASS_MAC_BYTES:
+        raise PassError("Pass is not readable")
+    payload, mac = raw[:_PAYLOAD.size], raw[_PAYLOAD.size:]
+    if not hmac.compare_digest(mac, _mac(payload)):
+        raise PassError("Pass signature is invalid")
+    version, appointment_id, visitor_id, valid_from, valid_until = _PAYLOAD.unpack(payload)
+    if version != PASS_VERSION:
+        raise PassError("Pass version is not supported")
+    return PassClaims(appointment_id, visitor_id, _from_epoch(valid_from), _from_epoch(valid_until))
+
+@lru_cache(maxsize=PASS_QR_CACHE_SIZE)
+def render_pass_qr(token: str) -> bytes:
+    """PNG of the token's QR code."""
+    buffer = io.BytesIO()
+    segno.make(token, error="m").save(buffer, kind="png", scale=PASS_QR_SCALE, border=4)
+    return buffer.getvalue()
+
+# Appointment ids whose passes must not open the gate. Loaded from the database by
+# app/db/passes.py and kept current by this process's own status changes.
+_revoked: Set[int] = set()
+# Bumped on every local change; a reload is only stored if none happened while it ran
+_generation = 0
+
+def is_revoked(appointment_id: int) -> bool:
+    return appointment_id in _revoked
+
+def revoke_passes(appointment_ids: Iterable[int]):
+    global _generation
+    _revoked.update(appointment_ids)
+    _generation += 1
+
+def reinstate_passes(appointment_ids: Iterable[int]):
+    global _generation
+    _revoked.difference_update(appointment_ids)
+    _generation += 1
+
+def revocation_generation() -> int:
+    return _generation
+
+def replace_revocations(appointment_ids: Set[int], generation: Optional[int] = None) -> bool:
+    """Swap in a freshly loaded set unless a local change happened since `generation` was read."""
+    global _revoked
+    if generation is not None and generation != _generation:
+        return False
+    _revoked = appointment_ids
+    return True
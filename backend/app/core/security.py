@@ -1,6 +1,13 @@
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
 from datetime import datetime, timedelta
-from typing import Any, Union
+from typing import Any, Dict, Optional, Union
 from jose import jwt
+import asyncio
+import hashlib
+import os
+
+import bcrypt
 
 # Session durations as requested
 VISITOR_SESSION_MINUTES = 5
@@ -12,19 +19,72 @@ ADMIN_SESSION_HOURS = 8
 SECRET_KEY = "super-secret-key-change-me"
 ALGORITHM = "HS256"
 
-import hashlib
-import bcrypt
+# Password hashing: bcrypt cost and the worker pool it runs in
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "4"))
+# Max bcrypt jobs one account may have in flight; extra attempts are rejected, not queued
+PASSWORD_HASH_PER_ACCOUNT = int(os.getenv("PASSWORD_HASH_PER_ACCOUNT", "2"))
+
+DEFAULT_STAFF_PASSWORD = "admin123"
+
+_hash_pool = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="bcrypt")
+_account_inflight: Dict[str, int] = {}
+_default_password_hash: Optional[str] = None
+
+class PasswordHashBusy(Exception):
+    """Raised when an account already has its share of bcrypt workers busy."""
 
 def get_password_hash(password: str):
     # Pre-hash with SHA-256 to avoid bcrypt length limits
     sha256_hash = hashlib.sha256(password.encode()).hexdigest().encode()
-    salt = bcrypt.gensalt()
+    salt = bcrypt.gensalt(rounds=BCRYPT_ROUNDS)
     return bcrypt.hashpw(sha256_hash, salt).decode('utf-8')
 
 def verify_password(plain_password: str, hashed_password: str):
     sha256_hash = hashlib.sha256(plain_password.encode()).hexdigest().encode()
     return bcrypt.checkpw(sha256_hash, hashed_password.encode('utf-8'))
 
+def needs_rehash(hashed_password: str) -> bool:
+    # bcrypt hashes look like $2b$<cost>$<salt+digest>
+    try:
+        return int(hashed_password.split("$")[2]) < BCRYPT_ROUNDS
+    except (IndexError, ValueError):
+        return True
+
+@asynccontextmanager
+async def _account_slot(account: Optional[str]):
+    if account is None:
+        yield
+        return
+    if _account_inflight.get(account, 0) >= PASSWORD_HASH_PER_ACCOUNT:
+        raise PasswordHashBusy(account)
+    _account_inflight[account] = _account_inflight.get(account, 0) + 1
+    try:
+        yield
+    finally:
+        _account_inflight[account] -= 1
+        if not _account_inflight[account]:
+            del _account_inflight[account]
+
+async def hash_password(password: str, account: Optional[str] = None) -> str:
+    """get_password_hash on the bcrypt worker pool, so the event loop keeps serving requests."""
+    async with _account_slot(account):
+        return await asyncio.get_running_loop().run_in_executor(_hash_pool, get_password_hash, password)
+
+async def check_password(plain_password: str, hashed_password: str, account: Optional[str] = None) -> bool:
+    """verify_password on the bcrypt worker pool."""
+    async with _account_slot(account):
+        return await asyncio.get_running_loop().run_in_executor(
+            _hash_pool, verify_password, plain_password, hashed_password
+        )
+
+async def default_password_hash() -> str:
+    """Hash of the default staff password, computed once per process."""
+    global _default_password_hash
+    if _default_password_hash is None or needs_rehash(_default_password_hash):
+        _default_password_hash = await hash_password(DEFAULT_STAFF_PASSWORD)
+    return _default_password_hash
+
 def create_access_token(data: dict, expires_delta: Union[timedelta, None] = None):
     to_encode = data.copy()
     if expires_delta:
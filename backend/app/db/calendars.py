@@ -0,0 +1,172 @@
+"""Incremental import of employees' external calendars as busy time.
+
+A sync fetches the feed conditionally, parses it and compares each event UID's
+version with the one stored from the previous sync. Only new or changed UIDs
+are re-expanded; UIDs that disappeared from the feed lose their busy time. The
+whole feed is re-expanded when the rolling horizon has moved on by more than a
+day since the last full expansion, so recurring events keep covering it.
+
+The busy intervals are read by scheduling.find_conflict and free_slots.
+
+Every worker process starts the refresher, but only the one holding an
+exclusive lock on CALENDAR_REFRESH_LOCK_PATH fetches feeds; the others keep
+trying to take the lock over in case that process exits. The lock is a local
+file, so deployments spread over several hosts should run it on one of them.
+"""
+from sqlalchemy import select, delete, insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi.concurrency import run_in_threadpool
+from datetime import datetime, timedelta
+from typing import IO, Dict, List, Optional
+import asyncio
+import fcntl
+import logging
+import os
+
+import httpx
+
+from .models import DBCalendarBusy, DBCalendarEvent, DBCalendarFeed, DBUser
+from ..core.calendar import (
+    CALENDAR_FETCH_TIMEOUT_SECONDS, CalendarError, expand_busy, fetch_feed, parse_calendar, sync_horizon
+)
+from ..core.config import CALENDAR_SYNC_CONCURRENCY
+from ..core.database import AsyncSessionLocal
+
+HORIZON_REFRESH = timedelta(days=1)
+CALENDAR_REFRESH_LOCK_PATH = os.getenv("CALENDAR_REFRESH_LOCK_PATH", "storage/calendar-refresh.lock")
+
+logger = logging.getLogger(__name__)
+
+async def sync_calendar(db: AsyncSession, employee: DBUser, data: Optional[bytes] = None,
+                        client: Optional[httpx.AsyncClient] = None) -> Dict:
+    """Import an employee's calendar from `data` (an uploaded file) or from their calendar_url."""
+    feed = await db.get(DBCalendarFeed, employee.id)
+    if feed is None:
+        feed = DBCalendarFeed(employee_id=employee.id)
+        db.add(feed)
+
+    horizon_start, horizon_end = sync_horizon()
+    full = feed.expanded_until is None or horizon_end - feed.expanded_until > HORIZON_REFRESH
+    try:
+        if data is None:
+            if not employee.calendar_url:
+                raise CalendarError("No calendar URL configured")
+            # A full re-expansion needs the body even if the feed itself is unchanged
+            response = await fetch_feed(
+                employee.calendar_url,
+                etag=None if full else feed.etag,
+                last_modified=None if full else feed.last_modified,
+                client=client,
+            )
+            if response.not_modified:
+                feed.last_synced_at = datetime.utcnow()
+                feed.last_error = None
+                await db.commit()
+                return {"not_modified": True, "events": None, "changed": 0, "removed": 0, "busy_intervals": 0}
+            data = response.body
+            feed.etag, feed.last_modified = response.etag, response.last_modified
+        else:
+            # Uploaded files have no validators; the next URL fetch must not be conditional
+            feed.etag = feed.last_modified = None
+
+        calendar, versions = await run_in_threadpool(parse_calendar, data)
+    except CalendarError as e:
+        feed.last_error = str(e)
+        await db.commit()
+        raise
+
+    stored = dict((await db.execute(
+        select(DBCalendarEvent.uid, DBCalendarEvent.version).where(DBCalendarEvent.employee_id == employee.id)
+    )).all())
+    changed = [uid for uid, version in versions.items() if full or stored.get(uid) != version]
+    removed = [uid for uid in stored if uid not in versions]
+    busy = await run_in_threadpool(expand_busy, calendar, changed, horizon_start, horizon_end) if changed else {}
+
+    stale = changed + removed
+    if full:
+        await db.execute(delete(DBCalendarBusy).where(DBCalendarBusy.employee_id == employee.id))
+    elif stale:
+        await db.execute(delete(DBCalendarBusy).where(
+            DBCalendarBusy.employee_id == employee.id, DBCalendarBusy.uid.in_(stale)
+        ))
+    if stale:
+        await db.execute(delete(DBCalendarEvent).where(
+            DBCalendarEvent.employee_id == employee.id, DBCalendarEvent.uid.in_(stale)
+        ))
+    if changed:
+        await db.execute(insert(DBCalendarEvent), [
+            {"employee_id": employee.id, "uid": uid, "version": versions[uid]} for uid in changed
+        ])
+    rows = [
+        {"employee_id": employee.id, "uid": uid, "start_time": start, "end_time": end}
+        for uid, intervals in busy.items() for start, end in intervals
+    ]
+    if rows:
+        await db.execute(insert(DBCalendarBusy), rows)
+
+    if full:
+        feed.expanded_until = horizon_end
+    feed.last_synced_at = datetime.utcnow()
+    feed.last_error = None
+    employee.calendar_synced = True
+    await db.commit()
+    return {"not_modified": False, "events": len(versions), "changed": len(changed), "removed": len(removed), "busy_intervals": len(rows)}
+
+async def _sync_one(employee_id: int, semaphore: asyncio.Semaphore, client: httpx.AsyncClient):
+    async with semaphore:
+        async with AsyncSessionLocal() as db:
+            employee = await db.get(DBUser, employee_id)
+            if employee is None or not employee.calendar_url:
+                return None
+            try:
+                return await sync_calendar(db, employee, client=client)
+            except CalendarError as e:
+                logger.warning("Calendar sync failed for employee %s: %s", employee_id, e)
+                return None
+
+async def refresh_all_calendars(client: Optional[httpx.AsyncClient] = None) -> List[Optional[Dict]]:
+    """Sync every configured feed, at most CALENDAR_SYNC_CONCURRENCY at a time."""
+    async with AsyncSessionLocal() as db:
+        employee_ids = (await db.scalars(select(DBUser.id).where(DBUser.calendar_url.is_not(None)))).all()
+    semaphore = asyncio.Semaphore(CALENDAR_SYNC_CONCURRENCY)
+    shared = client or httpx.AsyncClient(timeout=CALENDAR_FETCH_TIMEOUT_SECONDS)
+    try:
+        results = await asyncio.gather(
+            *[_sync_one(employee_id, semaphore, shared) for employee_id in employee_ids], return_exceptions=True
+        )
+    finally:
+        if client is None:
+            await shared.aclose()
+    # One failing feed must not hide the others' results or leave their syncs unobserved
+    for employee_id, result in zip(employee_ids, results):
+        if isinstance(result, Exception):
+            logger.error("Calendar sync failed for employee %s", employee_id, exc_info=result)
+    return [None if isinstance(result, Exception) else result for result in results]
+
+def _try_refresh_lock(path: str) -> Optional[IO]:
+    """Open and exclusively lock `path`, or None if another process holds it."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    lock_file = open(path, "a")
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        lock_file.close()
+        return None
+    return lock_file
+
+async def run_calendar_refresher(interval_seconds: int):
+    """Background loop started by the app; refreshes only in the process holding the lock."""
+    lock_file = None
+    try:
+        while True:
+            if lock_file is None:
+                lock_file = _try_refresh_lock(CALENDAR_REFRESH_LOCK_PATH)
+            if lock_file is not None:
+                try:
+                    await refresh_all_calendars()
+                except Exception:
+                    logger.exception("Calendar refresh failed")
+            await asyncio.sleep(interval_seconds)
+    finally:
+        if lock_file is not None:
+            lock_file.close()
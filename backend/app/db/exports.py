@@ -0,0 +1,82 @@
+"""Streaming appointment report exports.
+
+Rows are read through a server-side cursor in fixed-size partitions and
+serialised partition by partition, so memory stays flat regardless of how many
+appointments are exported.
+"""
+from sqlalchemy import select
+from datetime import datetime
+from typing import AsyncIterator, List, Optional
+import csv
+import io
+import json
+
+from .models import DBAppointment, DBUser
+from ..core.database import AsyncSessionLocal
+from ..models.appointment import AppointmentStatus
+
+EXPORT_BATCH_SIZE = 1000
+
+CSV_HEADER = [
+    "ID", "Visitor ID", "Visitor Name", "Visitor Phone", "Host Name", "Purpose", "Type",
+    "Scheduled Time", "Duration (mins)", "Status", "Created At", "Check In", "Check Out"
+]
+
+_EXPORT_COLUMNS = [
+    DBAppointment.id,
+    DBAppointment.visitor_id,
+    DBUser.full_name.label("visitor_name"),
+    DBUser.phone_number.label("visitor_phone"),
+    DBAppointment.host_name,
+    DBAppointment.purpose,
+    DBAppointment.appointment_type,
+    DBAppointment.scheduled_time,
+    DBAppointment.duration_minutes,
+    DBAppointment.status,
+    DBAppointment.created_at,
+    DBAppointment.check_in_time,
+    DBAppointment.check_out_time,
+]
+
+def _export_query(date_from: Optional[datetime], date_to: Optional[datetime], status: Optional[List[AppointmentStatus]]):
+    query = select(*_EXPORT_COLUMNS).outerjoin(DBUser, DBAppointment.visitor_id == DBUser.id)
+    if date_from is not None:
+        query = query.where(DBAppointment.scheduled_time >= date_from)
+    if date_to is not None:
+        query = query.where(DBAppointment.scheduled_time < date_to)
+    if status:
+        query = query.where(DBAppointment.status.in_(status))
+    return query.order_by(DBAppointment.id).execution_options(yield_per=EXPORT_BATCH_SIZE)
+
+async def _stream_rows(query):
+    async with AsyncSessionLocal() as db:
+        result = await db.stream(query)
+        async for partition in result.partitions():
+            yield partition
+
+async def stream_appointments_csv(
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    status: Optional[List[AppointmentStatus]] = None,
+) -> AsyncIterator[str]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_HEADER)
+    yield buffer.getvalue()
+
+    async for rows in _stream_rows(_export_query(date_from, date_to, status)):
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(rows)
+        yield buffer.getvalue()
+
+async def stream_appointments_ndjson(
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    status: Optional[List[AppointmentStatus]] = None,
+) -> AsyncIterator[str]:
+    async for rows in _stream_rows(_export_query(date_from, date_to, status)):
+        yield "".join(
+            json.dumps(row._asdict(), default=lambda v: v.isoformat()) + "\n"
+            for row in rows
+        )
@@ -0,0 +1,35 @@
+"""Scheduled garbage collection of stored face images.
+
+Every worker process runs the loop; collect_garbage tolerates files that
+another process removed first.
+"""
+from sqlalchemy import select
+from fastapi.concurrency import run_in_threadpool
+from typing import Dict
+import asyncio
+import logging
+import os
+
+from .models import DBUser
+from ..core.database import AsyncSessionLocal
+from ..core.images import collect_garbage, sweep_upload_limits
+
+FACE_IMAGE_GC_INTERVAL_SECONDS = int(os.getenv("FACE_IMAGE_GC_INTERVAL_SECONDS", "3600"))
+
+logger = logging.getLogger(__name__)
+
+async def collect_face_images() -> Dict[str, int]:
+    """Remove images, thumbnails and stale uploads that no user references."""
+    async with AsyncSessionLocal() as db:
+        referenced = (await db.scalars(select(DBUser.face_image_path).where(DBUser.face_image_path.is_not(None)))).all()
+    sweep_upload_limits()
+    return await run_in_threadpool(collect_garbage, referenced)
+
+async def run_face_image_gc():
+    """Background loop started by the app."""
+    while True:
+        await asyncio.sleep(FACE_IMAGE_GC_INTERVAL_SECONDS)
+        try:
+            await collect_face_images()
+        except Exception:
+            logger.exception("Face image GC error")
@@ -0,0 +1,277 @@
+"""Bulk import of visitors and their appointments from CSV or NDJSON.
+
+The upload is parsed as it streams in and processed IMPORT_CHUNK_SIZE rows
+at a time, one transaction per chunk:
+
+1. Each row is validated with the booking rules (VisitorInfo, UserAddress,
+   a future scheduled_time, a bookable duration); phone numbers are
+   normalised to E.164 so "98765 43210" matches "+919876543210".
+2. Visitors are matched by phone, and new visitors' emails checked, with one
+   IN query each; hosts are resolved the same way.
+3. New visitors and all appointments are written with bulk INSERTs and the
+   rollups with one upsert.
+
+A bad row is reported with its line number and skipped; the rest of the file
+is still imported. Chunks that committed stay committed if a later one fails.
+
+Imported appointments are event registrations: they are ACCEPTED straight
+away and not checked against the host's other bookings, since a large event
+books many guests with one host at the same time. No per-appointment events
+are published; consoles pick the new bookings up from the manifest.
+"""
+from pydantic import ValidationError
+from sqlalchemy import insert, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import datetime
+from functools import lru_cache
+from typing import AsyncIterator, Dict, List, NamedTuple, Optional, Tuple
+import codecs
+import csv
+import json
+import re
+
+from .models import DBAppointment, DBUser
+from .manifest import invalidate_manifest
+from .pagination import to_naive
+from .queries import resolve_hosts
+from .rollups import record_appointments_created
+from ..core.auth import Principal
+from ..core.config import MAX_APPOINTMENT_MINUTES
+from ..models.appointment import AppointmentStatus
+from ..models.imports import ImportFormat, ImportRow, ImportRowError, ImportSummary
+from ..models.user import UserBase, UserRole
+
+IMPORT_CHUNK_SIZE = 1000
+IMPORT_MAX_REPORTED_ERRORS = 1000
+
+ADDRESS_FIELDS = ["street", "city", "state", "pincode"]
+VISITOR_FIELDS = ["full_name", "phone_number", "email"]
+ROW_FIELDS = set(ImportRow.model_fields)
+
+# Indian mobile numbers, the common case, are normalised without the (slow) full phonenumbers parse
+_PHONE_FORMATTING = re.compile(r"[\s().-]")
+_INDIAN_MOBILE = re.compile(r"(?:\+?91|0)?([6-9]\d{9})")
+
+class _NewAppointment(NamedTuple):
+    visitor_id: int
+    scheduled_time: datetime
+    host_id: Optional[int]
+    status: AppointmentStatus
+    check_in_time: Optional[datetime] = None
+    check_out_time: Optional[datetime] = None
+
+async def _lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    pending = ""
+    async for chunk in chunks:
+        pending += decoder.decode(chunk)
+        *complete, pending = pending.split("\n")
+        for line in complete:
+            yield line + "\n"
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending
+
+async def csv_records(chunks: AsyncIterator[bytes]) -> AsyncIterator[Tuple[int, dict]]:
+    """(line number, row dict) per CSV record; the first record is the header."""
+    header = None
+    record: List[str] = []
+    start = line_number = 0
+    async for line in _lines(chunks):
+        line_number += 1
+        if not record:
+            start = line_number
+        record.append(line)
+        # A quoted field may span lines; the record is complete once its quotes balance
+        if sum(part.count('"') for part in record) % 2:
+            continue
+        values = next(csv.reader(record), [])
+        record = []
+        if header is None:
+            header = [name.strip().lower() for name in values]
+        elif any(value.strip() for value in values):
+            yield start, dict(zip(header, values))
+    if record:
+        yield start, {"__error__": "Unterminated quoted field"}
+
+async def ndjson_records(chunks: AsyncIterator[bytes]) -> AsyncIterator[Tuple[int, dict]]:
+    line_number = 0
+    async for line in _lines(chunks):
+        line_number += 1
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            record = {"__error__": f"Invalid JSON: {e}"}
+        yield line_number, record if isinstance(record, dict) else {"__error__": "Expected a JSON object"}
+
+def _blank_to_none(value):
+    return None if isinstance(value, str) and not value.strip() else value
+
+def _shape(record: dict) -> dict:
+    """Flat CSV-style columns (or NDJSON with the same keys) as an ImportRow payload."""
+    record = {key: _blank_to_none(value) for key, value in record.items()}
+    visitor = record.get("visitor_info")
+    if not isinstance(visitor, dict):
+        address = record.get("address")
+        if not isinstance(address, dict):
+            address = {name: record.get(name) for name in ADDRESS_FIELDS}
+        visitor = {name: record.get(name) for name in VISITOR_FIELDS}
+        visitor["address"] = address
+    if isinstance(visitor.get("address"), dict):
+        # Spreadsheets and JSON writers often turn pincodes into numbers
+        visitor["address"] = {k: str(v) if isinstance(v, int) else v for k, v in visitor["address"].items()}
+    shaped = {key: value for key, value in record.items() if key in ROW_FIELDS and value is not None}
+    shaped["visitor_info"] = visitor
+    return shaped
+
+@lru_cache(maxsize=65536)
+def normalize_phone(phone_number: str) -> str:
+    """E.164 form of a phone number, by the same rules as UserBase (raises ValueError)."""
+    mobile = _INDIAN_MOBILE.fullmatch(_PHONE_FORMATTING.sub("", phone_number))
+    if mobile:
+        return "+91" + mobile.group(1)
+    return UserBase.validate_phone(phone_number)
+
+def _validate(record: dict, principal: Principal, now: datetime) -> Tuple[Optional[ImportRow], List[str]]:
+    if "__error__" in record:
+        return None, [record["__error__"]]
+    try:
+        row = ImportRow.model_validate(_shape(record))
+    except ValidationError as e:
+        return None, [f"{'.'.join(str(p) for p in err['loc'])}: {err['msg']}" for err in e.errors()]
+
+    errors = []
+    try:
+        row.visitor_info.phone_number = normalize_phone(row.visitor_info.phone_number)
+    except ValueError as e:
+        errors.append(f"visitor_info.phone_number: {e}")
+    row.scheduled_time = to_naive(row.scheduled_time)
+    if row.scheduled_time < now:
+        errors.append("scheduled_time: Appointments can only be booked for future dates")
+    if not 0 < row.duration_minutes <= MAX_APPOINTMENT_MINUTES:
+        errors.append(f"duration_minutes: must be between 1 and {MAX_APPOINTMENT_MINUTES}")
+    if row.host_name is None and row.host_id is None:
+        row.host_id, row.host_name = principal.id, principal.full_name
+    return (None, errors) if errors else (row, [])
+
+async def _import_chunk(db: AsyncSession, rows: List[Tuple[int, ImportRow]]) -> Tuple[int, int, int, list]:
+    """Import one chunk in one transaction: (appointments, visitors created, visitors matched, row errors)."""
+    errors: List[Tuple[int, List[str]]] = []
+    phones = {row.visitor_info.phone_number for _, row in rows}
+    visitor_ids: Dict[str, int] = dict((await db.execute(
+        select(DBUser.phone_number, DBUser.id).where(DBUser.phone_number.in_(phones))
+    )).all())
+    matched = len(visitor_ids)
+
+    # The first row for an unknown phone creates the visitor; later rows reuse it
+    new_visitors: Dict[str, Tuple[int, ImportRow]] = {}
+    for line, row in rows:
+        if row.visitor_info.phone_number not in visitor_ids:
+            new_visitors.setdefault(row.visitor_info.phone_number, (line, row))
+    emails = {row.visitor_info.email for _, row in new_visitors.values() if row.visitor_info.email}
+    taken = set((await db.scalars(select(DBUser.email).where(DBUser.email.in_(emails))))) if emails else set()
+
+    rejected: Dict[str, int] = {}  # phone -> line of the row that failed to create the visitor
+    for phone, (line, row) in list(new_visitors.items()):
+        email = row.visitor_info.email
+        if email and email in taken:
+            errors.append((line, [f"visitor_info.email: {email} is already registered to another user"]))
+            rejected[phone] = line
+            del new_visitors[phone]
+        elif email:
+            taken.add(email)
+
+    if new_visitors:
+        created = (await db.execute(
+            # Core inserts: the ORM bulk path adds per-row bookkeeping these rows do not need
+            insert(DBUser.__table__).returning(DBUser.phone_number, DBUser.id),
+            [
+                {
+                    "full_name": row.visitor_info.full_name,
+                    "phone_number": phone,
+                    "email": row.visitor_info.email,
+                    "address": row.visitor_info.address.model_dump(),
+                    "role": UserRole.VISITOR.value,
+                    "is_verified": True,  # Verified by staff
+                }
+                for phone, (_, row) in new_visitors.items()
+            ],
+        )).all()
+        visitor_ids.update(dict(created))
+
+    hosts = await resolve_hosts(db, {(row.host_id, row.host_name) for _, row in rows})
+    now = datetime.utcnow()
+    appointments = []
+    for line, row in rows:
+        phone = row.visitor_info.phone_number
+        if phone in rejected:
+            if rejected[phone] != line:
+                errors.append((line, [f"visitor_info.phone_number: visitor {phone} could not be created (line {rejected[phone]})"]))
+            continue
+        host_id, host_name = hosts[(row.host_id, row.host_name)]
+        appointments.append({
+            "visitor_id": visitor_ids[phone],
+            "host_id": host_id,
+            "host_name": host_name,
+            "purpose": row.purpose,
+            "appointment_type": row.appointment_type.value,
+            "status": AppointmentStatus.ACCEPTED.value,
+            "scheduled_time": row.scheduled_time,
+            "duration_minutes": row.duration_minutes,
+            "created_at": now,
+        })
+    if appointments:
+        await db.execute(insert(DBAppointment.__table__), appointments)
+        await record_appointments_created(db, [
+            _NewAppointment(a["visitor_id"], a["scheduled_time"], a["host_id"], AppointmentStatus.ACCEPTED) for a in appointments
+        ])
+    await db.commit()
+
+    invalidate_manifest(*{a["scheduled_time"] for a in appointments})
+    return len(appointments), len(new_visitors), matched, errors
+
+async def import_appointments(db: AsyncSession, records: AsyncIterator[Tuple[int, dict]],
+                              principal: Principal) -> ImportSummary:
+    """Validate and import (line, record) pairs from csv_records / ndjson_records."""
+    summary = ImportSummary()
+
+    def report(line: int, errors: List[str]):
+        summary.error_count += 1
+        if len(summary.errors) < IMPORT_MAX_REPORTED_ERRORS:
+            summary.errors.append(ImportRowError(line=line, errors=errors))
+
+    async def flush(chunk: List[Tuple[int, ImportRow]]):
+        try:
+            result = await _import_chunk(db, chunk)
+        except IntegrityError:
+            # A visitor with one of these phones or emails registered concurrently; the retry sees it
+            await db.rollback()
+            result = await _import_chunk(db, chunk)
+        appointments, created, matched, errors = result
+        summary.appointments_created += appointments
+        summary.visitors_created += created
+        summary.visitors_matched += matched
+        for line, messages in errors:
+            report(line, messages)
+
+    now = datetime.utcnow()
+    chunk: List[Tuple[int, ImportRow]] = []
+    async for line, record in records:
+        summary.rows += 1
+        row, errors = _validate(record, principal, now)
+        if errors:
+            report(line, errors)
+            continue
+        chunk.append((line, row))
+        if len(chunk) >= IMPORT_CHUNK_SIZE:
+            await flush(chunk)
+            chunk = []
+    if chunk:
+        await flush(chunk)
+    return summary
+
+def parse_records(format: ImportFormat, chunks: AsyncIterator[bytes]) -> AsyncIterator[Tuple[int, dict]]:
+    return ndjson_records(chunks) if format == ImportFormat.NDJSON else csv_records(chunks)
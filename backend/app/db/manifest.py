@@ -0,0 +1,72 @@
+"""Daily security-desk manifest.
+
+A manifest is the list of ACCEPTED / CHECKED_IN / COMPLETED appointments whose
+scheduled_time falls on one facility-local calendar day. Manifests are cached
+per day in process and dropped whenever an appointment on that day is written,
+so guard consoles polling the desk hit the cache instead of the database.
+"""
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+from zoneinfo import ZoneInfo
+import time as _time
+
+from .models import DBAppointment
+from .queries import appointment_listing_query, to_appointments
+from ..core.config import FACILITY_TIMEZONE, MANIFEST_CACHE_TTL_SECONDS
+from ..models.appointment import Appointment, AppointmentStatus
+
+MANIFEST_STATUSES = [AppointmentStatus.ACCEPTED, AppointmentStatus.CHECKED_IN, AppointmentStatus.COMPLETED]
+
+_facility_tz = ZoneInfo(FACILITY_TIMEZONE)
+
+# day -> (built_at monotonic seconds, appointments ordered by (scheduled_time, id))
+_cache: Dict[date, Tuple[float, List[Appointment]]] = {}
+# day -> write counter; a rebuild is only stored if no write happened while it ran
+_generations: Dict[date, int] = {}
+
+def facility_today() -> date:
+    return datetime.now(_facility_tz).date()
+
+def facility_day(scheduled_time: datetime) -> date:
+    """Facility-local day of a stored (naive UTC) timestamp."""
+    return scheduled_time.replace(tzinfo=timezone.utc).astimezone(_facility_tz).date()
+
+def day_bounds(day: date) -> Tuple[datetime, datetime]:
+    """Naive UTC [start, end) range covering one facility-local day."""
+    start = datetime.combine(day, time.min, tzinfo=_facility_tz)
+    end = datetime.combine(day + timedelta(days=1), time.min, tzinfo=_facility_tz)
+    return (
+        start.astimezone(timezone.utc).replace(tzinfo=None),
+        end.astimezone(timezone.utc).replace(tzinfo=None),
+    )
+
+async def get_manifest(db: AsyncSession, day: date) -> List[Appointment]:
+    cached = _cache.get(day)
+    if cached and _time.monotonic() - cached[0] < MANIFEST_CACHE_TTL_SECONDS:
+        return cached[1]
+
+    generation = _generations.get(day, 0)
+    start, end = day_bounds(day)
+    appts = (await db.scalars(
+        appointment_listing_query(
+            DBAppointment.status.in_(MANIFEST_STATUSES),
+            DBAppointment.scheduled_time >= start,
+            DBAppointment.scheduled_time < end,
+        ).order_by(DBAppointment.scheduled_time, DBAppointment.id)
+    )).all()
+    manifest = to_appointments(appts)
+
+    if _generations.get(day, 0) == generation:
+        _cache[day] = (_time.monotonic(), manifest)
+    return manifest
+
+def invalidate_manifest(*scheduled_times: Optional[datetime]) -> None:
+    """Drop cached manifests for the days of the given appointment times."""
+    for scheduled_time in scheduled_times:
+        if scheduled_time is None:
+            continue
+        # SQLite keeps the wall-clock digits of offset-aware values, so mirror that here
+        day = facility_day(scheduled_time.replace(tzinfo=None))
+        _generations[day] = _generations.get(day, 0) + 1
+        _cache.pop(day, None)
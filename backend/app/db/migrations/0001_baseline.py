@@ -0,0 +1,116 @@
+"""Baseline schema, adopting databases created before versioned migrations.
+
+Fresh databases get every table. Databases created by create_all and the old
+migrate.py already have most of them; missing tables are created and the
+columns those scripts used to add by hand are added.
+"""
+from sqlalchemy import (
+    JSON, Boolean, Column, DateTime, ForeignKey, Integer, MetaData, String, Table, inspect, text,
+)
+from sqlalchemy.engine import Connection
+
+metadata = MetaData()
+
+Table(
+    "users", metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("full_name", String, index=True),
+    Column("phone_number", String, unique=True, index=True),
+    Column("email", String, unique=True, index=True, nullable=True),
+    Column("hashed_password", String, nullable=True),
+    Column("address", JSON),
+    Column("role", String),
+    Column("is_verified", Boolean),
+    Column("password_reset_required", Boolean),
+    Column("face_image_path", String, nullable=True),
+    Column("calendar_synced", Boolean),
+    Column("calendar_url", String, nullable=True),
+    Column("created_at", DateTime),
+)
+
+Table(
+    "appointments", metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("visitor_id", Integer, ForeignKey("users.id"), nullable=True),
+    Column("host_id", Integer, ForeignKey("users.id"), nullable=True),
+    Column("host_name", String),
+    Column("purpose", String),
+    Column("appointment_type", String),
+    Column("status", String),
+    Column("scheduled_time", DateTime),
+    Column("duration_minutes", Integer),
+    Column("created_at", DateTime),
+    Column("check_in_time", DateTime, nullable=True),
+    Column("check_out_time", DateTime, nullable=True),
+)
+
+Table(
+    "appointment_rollups", metadata,
+    Column("bucket_start", DateTime, primary_key=True),
+    Column("host_name", String, primary_key=True),
+    Column("status", String, primary_key=True),
+    Column("appointment_count", Integer, nullable=False),
+    Column("visit_count", Integer, nullable=False),
+    Column("visit_seconds", Integer, nullable=False),
+)
+
+Table(
+    "calendar_feeds", metadata,
+    Column("employee_id", Integer, ForeignKey("users.id"), primary_key=True),
+    Column("etag", String, nullable=True),
+    Column("last_modified", String, nullable=True),
+    Column("expanded_until", DateTime, nullable=True),
+    Column("last_synced_at", DateTime, nullable=True),
+    Column("last_error", String, nullable=True),
+)
+
+Table(
+    "calendar_events", metadata,
+    Column("employee_id", Integer, ForeignKey("users.id"), primary_key=True),
+    Column("uid", String, primary_key=True),
+    Column("version", String),
+)
+
+Table(
+    "calendar_busy", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("employee_id", Integer, ForeignKey("users.id"), nullable=False),
+    Column("uid", String, nullable=False),
+    Column("start_time", DateTime, nullable=False),
+    Column("end_time", DateTime, nullable=False),
+)
+
+Table(
+    "notifications", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("channel", String, nullable=False),
+    Column("recipient", String, nullable=False),
+    Column("subject", String, nullable=True),
+    Column("body", String, nullable=False),
+    Column("dedup_key", String, unique=True, nullable=True),
+    Column("status", String, nullable=False),
+    Column("attempts", Integer, nullable=False),
+    Column("next_attempt_at", DateTime, nullable=False),
+    Column("expires_at", DateTime, nullable=True),
+    Column("last_error", String, nullable=True),
+    Column("created_at", DateTime),
+    Column("sent_at", DateTime, nullable=True),
+)
+
+# (table, column, DDL) added by hand to early databases
+LEGACY_COLUMNS = [
+    ("users", "calendar_synced", "BOOLEAN DEFAULT FALSE"),
+    ("users", "calendar_url", "VARCHAR"),
+    ("appointments", "host_id", "INTEGER REFERENCES users (id)"),
+]
+
+def upgrade(conn: Connection):
+    metadata.create_all(conn)
+
+    inspector = inspect(conn)
+    for table, column, ddl in LEGACY_COLUMNS:
+        if column not in {c["name"] for c in inspector.get_columns(table)}:
+            conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+
+    # OTPs moved to app.core.otp; the old table only ever held transient codes
+    conn.execute(text("DROP TABLE IF EXISTS otps"))
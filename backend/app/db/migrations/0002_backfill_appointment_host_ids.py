@@ -0,0 +1,15 @@
+"""Link appointments booked by host name to the host's account."""
+from sqlalchemy.engine import Engine
+
+from . import backfill
+
+transactional = False
+
+def upgrade(engine: Engine):
+    # Only unambiguous staff names; the rest keep matching by host_name
+    backfill(
+        engine, "appointments",
+        "host_id = (SELECT u.id FROM users u WHERE u.full_name = appointments.host_name AND u.role != 'visitor')",
+        "host_id IS NULL AND (SELECT COUNT(*) FROM users u "
+        "WHERE u.full_name = appointments.host_name AND u.role != 'visitor') = 1",
+    )
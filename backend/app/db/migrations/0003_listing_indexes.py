@@ -0,0 +1,22 @@
+"""Composite indexes for appointment listings, calendar busy time and the notification queue."""
+from sqlalchemy.engine import Engine
+
+from . import create_index
+
+transactional = False
+
+INDEXES = [
+    # Keyset pagination order for appointment listings
+    ("ix_appointments_scheduled_time_id", "appointments", ["scheduled_time", "id"]),
+    # Daily manifest range scans
+    ("ix_appointments_status_scheduled_time", "appointments", ["status", "scheduled_time"]),
+    # Per-host schedule range scans
+    ("ix_appointments_host_id_scheduled_time", "appointments", ["host_id", "scheduled_time"]),
+    ("ix_calendar_busy_employee_start", "calendar_busy", ["employee_id", "start_time"]),
+    ("ix_calendar_busy_employee_uid", "calendar_busy", ["employee_id", "uid"]),
+    ("ix_notifications_status_next_attempt", "notifications", ["status", "next_attempt_at"]),
+]
+
+def upgrade(engine: Engine):
+    for name, table, columns in INDEXES:
+        create_index(engine, name, table, columns)
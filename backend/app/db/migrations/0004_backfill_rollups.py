@@ -0,0 +1,78 @@
+"""Backfill reporting rollups for databases that predate them.
+
+Buckets are facility-local hours, which SQLite cannot compute, so the
+appointments are read with a frozen SELECT and summed here rather than in a
+single INSERT ... SELECT.
+"""
+from datetime import datetime, timezone
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, select
+from sqlalchemy.engine import Engine
+from zoneinfo import ZoneInfo
+
+from ...core.config import FACILITY_TIMEZONE
+
+transactional = False
+
+BATCH_SIZE = 5000
+
+metadata = MetaData()
+
+appointments = Table(
+    "appointments", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("host_name", String),
+    Column("status", String),
+    Column("scheduled_time", DateTime),
+    Column("check_in_time", DateTime),
+    Column("check_out_time", DateTime),
+)
+
+appointment_rollups = Table(
+    "appointment_rollups", metadata,
+    Column("bucket_start", DateTime, primary_key=True),
+    Column("host_name", String, primary_key=True),
+    Column("status", String, primary_key=True),
+    Column("appointment_count", Integer, nullable=False),
+    Column("visit_count", Integer, nullable=False),
+    Column("visit_seconds", Integer, nullable=False),
+)
+
+_facility_tz = ZoneInfo(FACILITY_TIMEZONE)
+
+def _hour_bucket(scheduled_time: datetime) -> datetime:
+    local = scheduled_time.replace(tzinfo=timezone.utc).astimezone(_facility_tz)
+    return local.replace(minute=0, second=0, microsecond=0).astimezone(timezone.utc).replace(tzinfo=None)
+
+def upgrade(engine: Engine):
+    # Check and backfill together, so a re-run after a failure starts from an empty table
+    with engine.begin() as conn:
+        if conn.execute(select(appointment_rollups.c.status).limit(1)).first():
+            return
+
+        totals = {}
+        rows = conn.execute(
+            select(
+                appointments.c.scheduled_time, appointments.c.host_name, appointments.c.status,
+                appointments.c.check_in_time, appointments.c.check_out_time,
+            ).where(appointments.c.scheduled_time.is_not(None))
+            .execution_options(yield_per=BATCH_SIZE)
+        )
+        for scheduled_time, host_name, status, check_in_time, check_out_time in rows:
+            entry = totals.setdefault((_hour_bucket(scheduled_time), host_name or "", status), [0, 0, 0])
+            entry[0] += 1
+            if status == "completed" and check_in_time and check_out_time:
+                entry[1] += 1
+                entry[2] += max(int((check_out_time - check_in_time).total_seconds()), 0)
+
+        if totals:
+            conn.execute(appointment_rollups.insert(), [
+                {
+                    "bucket_start": bucket_start,
+                    "host_name": host_name,
+                    "status": status,
+                    "appointment_count": count,
+                    "visit_count": visits,
+                    "visit_seconds": seconds,
+                }
+                for (bucket_start, host_name, status), (count, visits, seconds) in totals.items()
+            ])
@@ -0,0 +1,81 @@
+"""Full-text search index over users and appointments.
+
+SQLite: a contentless FTS5 table kept in sync by triggers, so every writer
+(ORM, bulk inserts, scripts) updates it in the same transaction. Users are
+rowid 2*id and appointments 2*id + 1. PostgreSQL: pg_trgm indexes on the
+searched columns.
+"""
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+from . import create_index
+
+transactional = False
+
+# Phone numbers are indexed as their digits and without a 1-3 digit country code,
+# so a number can be found by any leading part of its national form
+PHONE_TERMS = (
+    "replace({r}.phone_number, '+', '') || ' ' || substr(replace({r}.phone_number, '+', ''), 2) || ' ' "
+    "|| substr(replace({r}.phone_number, '+', ''), 3) || ' ' || substr(replace({r}.phone_number, '+', ''), 4)"
+)
+
+def _user_values(r: str) -> str:
+    return f"{r}.id * 2, {r}.full_name, {PHONE_TERMS.format(r=r)}, {r}.email, NULL, NULL"
+
+def _appointment_values(r: str) -> str:
+    return f"{r}.id * 2 + 1, NULL, NULL, NULL, {r}.purpose, {r}.host_name"
+
+COLUMNS = "rowid, full_name, phone, email, purpose, host_name"
+DELETE_COLUMNS = "search_index, rowid, full_name, phone, email, purpose, host_name"
+
+SQLITE_STATEMENTS = [
+    "CREATE VIRTUAL TABLE search_index USING fts5("
+    "full_name, phone, email, purpose, host_name, "
+    "content='', tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+    # Vocabulary of indexed terms, used to correct misspelt query words
+    "CREATE VIRTUAL TABLE search_terms USING fts5vocab(search_index, 'row')",
+    # Column weights for ORDER BY rank: names first, then phone, email, purpose, host
+    "INSERT INTO search_index(search_index, rank) VALUES ('rank', 'bm25(10.0, 6.0, 4.0, 2.0, 2.0)')",
+
+    f"CREATE TRIGGER search_users_ai AFTER INSERT ON users BEGIN "
+    f"INSERT INTO search_index({COLUMNS}) VALUES ({_user_values('new')}); END",
+    f"CREATE TRIGGER search_users_ad AFTER DELETE ON users BEGIN "
+    f"INSERT INTO search_index({DELETE_COLUMNS}) VALUES ('delete', {_user_values('old')}); END",
+    f"CREATE TRIGGER search_users_au AFTER UPDATE OF full_name, phone_number, email ON users BEGIN "
+    f"INSERT INTO search_index({DELETE_COLUMNS}) VALUES ('delete', {_user_values('old')}); "
+    f"INSERT INTO search_index({COLUMNS}) VALUES ({_user_values('new')}); END",
+
+    f"CREATE TRIGGER search_appointments_ai AFTER INSERT ON appointments BEGIN "
+    f"INSERT INTO search_index({COLUMNS}) VALUES ({_appointment_values('new')}); END",
+    f"CREATE TRIGGER search_appointments_ad AFTER DELETE ON appointments BEGIN "
+    f"INSERT INTO search_index({DELETE_COLUMNS}) VALUES ('delete', {_appointment_values('old')}); END",
+    f"CREATE TRIGGER search_appointments_au AFTER UPDATE OF purpose, host_name ON appointments BEGIN "
+    f"INSERT INTO search_index({DELETE_COLUMNS}) VALUES ('delete', {_appointment_values('old')}); "
+    f"INSERT INTO search_index({COLUMNS}) VALUES ({_appointment_values('new')}); END",
+
+    f"INSERT INTO search_index({COLUMNS}) SELECT {_user_values('users')} FROM users",
+    f"INSERT INTO search_index({COLUMNS}) SELECT {_appointment_values('appointments')} FROM appointments",
+]
+
+PG_INDEXES = [
+    ("ix_users_full_name_trgm", "users", ["full_name gin_trgm_ops"]),
+    ("ix_users_phone_number_trgm", "users", ["phone_number gin_trgm_ops"]),
+    ("ix_users_email_trgm", "users", ["email gin_trgm_ops"]),
+    ("ix_appointments_purpose_trgm", "appointments", ["purpose gin_trgm_ops"]),
+    ("ix_appointments_host_name_trgm", "appointments", ["host_name gin_trgm_ops"]),
+]
+
+def upgrade(engine: Engine):
+    if engine.dialect.name == "postgresql":
+        with engine.begin() as conn:
+            conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+        for name, table, columns in PG_INDEXES:
+            create_index(engine, name, table, columns, using="gin")
+        return
+
+    # One transaction: the table, its triggers and the initial fill appear together
+    with engine.begin() as conn:
+        exists = conn.execute(text("SELECT 1 FROM sqlite_master WHERE name = 'search_index'")).first()
+        if not exists:
+            for statement in SQLITE_STATEMENTS:
+                conn.execute(text(statement))
@@ -0,0 +1,142 @@
+"""Revisions, tombstones and offline operation log for kiosk delta sync.
+
+Every write to users and appointments takes the next value of one global
+counter (sync_state) as the row's revision, and every delete leaves a
+tombstone with its own revision. Triggers do the bookkeeping, so ORM writes,
+set-based UPDATEs and scripts are all covered. The counter row is updated in
+the writer's transaction and stays locked until it commits, so revisions
+become visible in increasing order and a client reading "revision > cursor"
+never skips a row.
+
+Existing rows are backfilled with revisions below the counter's start
+(users 2*id, appointments 2*id + 1).
+"""
+from sqlalchemy import (
+    Column, DateTime, ForeignKey, Integer, MetaData, String, Table, inspect, text,
+)
+from sqlalchemy.engine import Engine
+
+from . import backfill, create_index
+
+transactional = False
+
+metadata = MetaData()
+
+# Referenced only; created by 0001
+users = Table("users", metadata, Column("id", Integer, primary_key=True))
+
+SYNC_TABLES = [Table(
+    "sync_state", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("revision", Integer, nullable=False),
+    Column("pruned_revision", Integer, nullable=False),
+), Table(
+    "sync_tombstones", metadata,
+    Column("kind", String, primary_key=True),
+    Column("entity_id", Integer, primary_key=True),
+    Column("revision", Integer, nullable=False, index=True),
+    Column("deleted_at", DateTime, nullable=False),
+), Table(
+    "sync_operations", metadata,
+    Column("op_id", String, primary_key=True),
+    Column("device_id", String, nullable=False),
+    Column("user_id", Integer, ForeignKey("users.id"), nullable=True),
+    Column("appointment_id", Integer, nullable=False),
+    Column("action", String, nullable=False),
+    Column("occurred_at", DateTime, nullable=False),
+    Column("outcome", String, nullable=False),
+    Column("detail", String, nullable=True),
+    Column("received_at", DateTime, nullable=False, index=True),
+)]
+
+# (table, tombstone kind, backfilled revision)
+TRACKED = [
+    ("users", "user", "id * 2"),
+    ("appointments", "appointment", "id * 2 + 1"),
+]
+
+NEXT_REVISION_SQLITE = "UPDATE sync_state SET revision = revision + 1 WHERE id = 1"
+CURRENT_REVISION_SQLITE = "(SELECT revision FROM sync_state WHERE id = 1)"
+
+def _sqlite_triggers(table: str, kind: str):
+    # AFTER triggers cannot assign NEW, so the row is stamped with a second UPDATE; that
+    # UPDATE changes revision, which keeps the update trigger from firing on it again
+    stamp = f"UPDATE {table} SET revision = {CURRENT_REVISION_SQLITE} WHERE id = new.id"
+    return [
+        f"CREATE TRIGGER IF NOT EXISTS sync_{table}_ai AFTER INSERT ON {table} BEGIN "
+        f"{NEXT_REVISION_SQLITE}; {stamp}; "
+        f"DELETE FROM sync_tombstones WHERE kind = '{kind}' AND entity_id = new.id; END",
+        f"CREATE TRIGGER IF NOT EXISTS sync_{table}_au AFTER UPDATE ON {table} "
+        f"WHEN new.revision IS old.revision BEGIN {NEXT_REVISION_SQLITE}; {stamp}; END",
+        f"CREATE TRIGGER IF NOT EXISTS sync_{table}_ad AFTER DELETE ON {table} BEGIN "
+        f"{NEXT_REVISION_SQLITE}; "
+        f"INSERT OR REPLACE INTO sync_tombstones(kind, entity_id, revision, deleted_at) "
+        f"VALUES ('{kind}', old.id, {CURRENT_REVISION_SQLITE}, CURRENT_TIMESTAMP); END",
+    ]
+
+PG_FUNCTIONS = [
+    """CREATE OR REPLACE FUNCTION sync_stamp_revision() RETURNS trigger AS $$
+    BEGIN
+        UPDATE sync_state SET revision = revision + 1 WHERE id = 1 RETURNING revision INTO NEW.revision;
+        IF TG_OP = 'INSERT' THEN
+            DELETE FROM sync_tombstones WHERE kind = TG_ARGV[0] AND entity_id = NEW.id;
+        END IF;
+        RETURN NEW;
+    END $$ LANGUAGE plpgsql""",
+    """CREATE OR REPLACE FUNCTION sync_record_tombstone() RETURNS trigger AS $$
+    DECLARE next_revision integer;
+    BEGIN
+        UPDATE sync_state SET revision = revision + 1 WHERE id = 1 RETURNING revision INTO next_revision;
+        INSERT INTO sync_tombstones(kind, entity_id, revision, deleted_at)
+        VALUES (TG_ARGV[0], OLD.id, next_revision, now() AT TIME ZONE 'UTC')
+        ON CONFLICT (kind, entity_id) DO UPDATE SET revision = EXCLUDED.revision, deleted_at = EXCLUDED.deleted_at;
+        RETURN OLD;
+    END $$ LANGUAGE plpgsql""",
+]
+
+def _pg_triggers(table: str, kind: str):
+    return [
+        f"DROP TRIGGER IF EXISTS sync_{table}_bi ON {table}",
+        f"CREATE TRIGGER sync_{table}_bi BEFORE INSERT ON {table} "
+        f"FOR EACH ROW EXECUTE FUNCTION sync_stamp_revision('{kind}')",
+        f"DROP TRIGGER IF EXISTS sync_{table}_bu ON {table}",
+        f"CREATE TRIGGER sync_{table}_bu BEFORE UPDATE ON {table} FOR EACH ROW "
+        f"WHEN (NEW.revision IS NOT DISTINCT FROM OLD.revision) EXECUTE FUNCTION sync_stamp_revision('{kind}')",
+        f"DROP TRIGGER IF EXISTS sync_{table}_ad ON {table}",
+        f"CREATE TRIGGER sync_{table}_ad AFTER DELETE ON {table} "
+        f"FOR EACH ROW EXECUTE FUNCTION sync_record_tombstone('{kind}')",
+    ]
+
+def upgrade(engine: Engine):
+    postgres = engine.dialect.name == "postgresql"
+
+    # Columns, tables, counter and triggers together; rows written from here on get live revisions
+    with engine.begin() as conn:
+        inspector = inspect(conn)
+        for table, _, _ in TRACKED:
+            columns = {c["name"] for c in inspector.get_columns(table)}
+            if "revision" not in columns:
+                conn.execute(text(f"ALTER TABLE {table} ADD COLUMN revision INTEGER"))
+            if "updated_at" not in columns:
+                conn.execute(text(f"ALTER TABLE {table} ADD COLUMN updated_at TIMESTAMP" if postgres
+                                  else f"ALTER TABLE {table} ADD COLUMN updated_at DATETIME"))
+        metadata.create_all(conn, tables=SYNC_TABLES)
+
+        if conn.execute(text("SELECT 1 FROM sync_state WHERE id = 1")).first() is None:
+            start = conn.execute(text(
+                "SELECT max(v) FROM (SELECT coalesce(max(id), 0) * 2 AS v FROM users "
+                "UNION ALL SELECT coalesce(max(id), 0) * 2 + 1 FROM appointments) AS m"
+            )).scalar()
+            conn.execute(text("INSERT INTO sync_state (id, revision, pruned_revision) VALUES (1, :start, 0)"),
+                         {"start": start})
+
+        statements = list(PG_FUNCTIONS) if postgres else []
+        for table, kind, _ in TRACKED:
+            statements += _pg_triggers(table, kind) if postgres else _sqlite_triggers(table, kind)
+        for statement in statements:
+            conn.execute(text(statement))
+
+    for table, _, initial in TRACKED:
+        backfill(engine, table, f"revision = {initial}, updated_at = coalesce(updated_at, created_at)",
+                 where="revision IS NULL")
+        create_index(engine, f"ix_{table}_revision", table, ["revision"])
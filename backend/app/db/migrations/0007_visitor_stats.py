@@ -0,0 +1,49 @@
+"""Per-visitor appointment stats and the index behind paged visitor history.
+
+visitor_stats is filled from the appointments table here and kept current
+on write by app/db/rollups.py from then on.
+"""
+from sqlalchemy import Column, DateTime, ForeignKey, Integer, MetaData, Table, inspect, text
+from sqlalchemy.engine import Engine
+
+from . import create_index
+
+transactional = False
+
+metadata = MetaData()
+
+# Referenced only; created by 0001
+users = Table("users", metadata, Column("id", Integer, primary_key=True))
+
+visitor_stats = Table(
+    "visitor_stats", metadata,
+    Column("visitor_id", Integer, ForeignKey("users.id"), primary_key=True),
+    Column("appointment_count", Integer, nullable=False),
+    Column("open_count", Integer, nullable=False),
+    Column("visit_count", Integer, nullable=False),
+    Column("checked_in_count", Integer, nullable=False),
+    Column("last_visit_at", DateTime, nullable=True),
+)
+
+BACKFILL = """
+INSERT INTO visitor_stats (visitor_id, appointment_count, open_count, visit_count, checked_in_count, last_visit_at)
+SELECT visitor_id,
+       count(*),
+       sum(CASE WHEN status IN ('pending', 'accepted') THEN 1 ELSE 0 END),
+       sum(CASE WHEN status IN ('checked_in', 'completed') THEN 1 ELSE 0 END),
+       sum(CASE WHEN status = 'checked_in' THEN 1 ELSE 0 END),
+       max(CASE WHEN status IN ('checked_in', 'completed') THEN check_in_time END)
+FROM appointments
+WHERE visitor_id IS NOT NULL
+GROUP BY visitor_id
+"""
+
+def upgrade(engine: Engine):
+    # Table and backfill together, so a re-run after a failure starts from an empty table
+    with engine.begin() as conn:
+        if not inspect(conn).has_table("visitor_stats"):
+            metadata.create_all(conn, tables=[visitor_stats])
+            conn.execute(text(BACKFILL))
+
+    create_index(engine, "ix_appointments_visitor_id_scheduled_time_id", "appointments",
+                 ["visitor_id", "scheduled_time", "id"])
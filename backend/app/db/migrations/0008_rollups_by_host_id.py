@@ -0,0 +1,85 @@
+"""Key appointment rollups on host_id instead of the host's display name.
+
+Rollups keyed by host_name split a host's series whenever they were renamed.
+The table is rebuilt from appointments under the new key; appointments not
+linked to a host account are counted under host_id 0.
+"""
+from datetime import datetime, timezone
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, inspect, select, text
+from sqlalchemy.engine import Engine
+from zoneinfo import ZoneInfo
+
+from ...core.config import FACILITY_TIMEZONE
+
+transactional = False
+
+BATCH_SIZE = 5000
+
+metadata = MetaData()
+
+appointments = Table(
+    "appointments", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("host_id", Integer),
+    Column("status", String),
+    Column("scheduled_time", DateTime),
+    Column("check_in_time", DateTime),
+    Column("check_out_time", DateTime),
+)
+
+# Built under a temporary name and renamed over the old table
+appointment_rollups = Table(
+    "appointment_rollups_by_host", metadata,
+    Column("bucket_start", DateTime, primary_key=True),
+    Column("host_id", Integer, primary_key=True),
+    Column("status", String, primary_key=True),
+    Column("appointment_count", Integer, nullable=False),
+    Column("visit_count", Integer, nullable=False),
+    Column("visit_seconds", Integer, nullable=False),
+)
+
+_facility_tz = ZoneInfo(FACILITY_TIMEZONE)
+
+def _hour_bucket(scheduled_time: datetime) -> datetime:
+    local = scheduled_time.replace(tzinfo=timezone.utc).astimezone(_facility_tz)
+    return local.replace(minute=0, second=0, microsecond=0).astimezone(timezone.utc).replace(tzinfo=None)
+
+def upgrade(engine: Engine):
+    # Build, backfill and swap in one transaction, so a re-run after a failure starts over
+    with engine.begin() as conn:
+        columns = {c["name"] for c in inspect(conn).get_columns("appointment_rollups")}
+        if "host_id" in columns:
+            return
+        appointment_rollups.drop(conn, checkfirst=True)
+        appointment_rollups.create(conn)
+
+        totals = {}
+        rows = conn.execute(
+            select(
+                appointments.c.scheduled_time, appointments.c.host_id, appointments.c.status,
+                appointments.c.check_in_time, appointments.c.check_out_time,
+            ).where(appointments.c.scheduled_time.is_not(None))
+            .execution_options(yield_per=BATCH_SIZE)
+        )
+        for scheduled_time, host_id, status, check_in_time, check_out_time in rows:
+            entry = totals.setdefault((_hour_bucket(scheduled_time), host_id or 0, status), [0, 0, 0])
+            entry[0] += 1
+            if status == "completed" and check_in_time and check_out_time:
+                entry[1] += 1
+                entry[2] += max(int((check_out_time - check_in_time).total_seconds()), 0)
+
+        if totals:
+            conn.execute(appointment_rollups.insert(), [
+                {
+                    "bucket_start": bucket_start,
+                    "host_id": host_id,
+                    "status": status,
+                    "appointment_count": count,
+                    "visit_count": visits,
+                    "visit_seconds": seconds,
+                }
+                for (bucket_start, host_id, status), (count, visits, seconds) in totals.items()
+            ])
+
+        conn.execute(text("DROP TABLE appointment_rollups"))
+        conn.execute(text("ALTER TABLE appointment_rollups_by_host RENAME TO appointment_rollups"))
@@ -0,0 +1,162 @@
+"""Versioned schema migrations.
+
+Each migration is a module in this package named NNNN_description.py with an
+`upgrade` function. Applied versions are recorded in `schema_migrations`, and
+`migrate.py` (run once by start.sh before the workers start) applies the
+pending ones in order.
+
+- Transactional migrations (the default) get a Connection. The DDL, data
+  changes and version row commit together or not at all; on SQLite the
+  transaction starts with BEGIN IMMEDIATE, which also keeps a second runner
+  out.
+- Migrations that set `transactional = False` get the Engine and manage their
+  own transactions, for work that must not hold one long lock: online index
+  builds (create_index) and batched backfills (backfill). They must be safe to
+  re-run, since a failure can leave them partly applied.
+
+Schema changes are frozen: they use SQL or their own Table definitions, never
+the current ORM models, so old migrations keep working as the models evolve.
+"""
+from dataclasses import dataclass
+from datetime import datetime
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, inspect, select, text
+from sqlalchemy.engine import Connection, Engine
+from types import ModuleType
+from typing import Callable, List, Optional, Sequence
+import importlib
+import pkgutil
+import re
+import time
+
+BACKFILL_BATCH_SIZE = 5000
+# Arbitrary key for the PostgreSQL advisory lock held while migrating
+PG_MIGRATION_LOCK_ID = 72_410_019
+
+_metadata = MetaData()
+schema_migrations = Table(
+    "schema_migrations", _metadata,
+    Column("version", Integer, primary_key=True),
+    Column("name", String, nullable=False),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+@dataclass
+class Migration:
+    version: int
+    name: str
+    module: ModuleType
+
+    @property
+    def transactional(self) -> bool:
+        return getattr(self.module, "transactional", True)
+
+    @property
+    def description(self) -> str:
+        return (self.module.__doc__ or self.name).strip().splitlines()[0]
+
+def discover() -> List[Migration]:
+    migrations = []
+    for info in pkgutil.iter_modules(__path__):
+        match = re.fullmatch(r"(\d{4})_(\w+)", info.name)
+        if match:
+            module = importlib.import_module(f"{__name__}.{info.name}")
+            migrations.append(Migration(int(match.group(1)), match.group(2), module))
+    migrations.sort(key=lambda m: m.version)
+    versions = [m.version for m in migrations]
+    if len(set(versions)) != len(versions):
+        raise RuntimeError(f"Duplicate migration versions in {versions}")
+    return migrations
+
+def applied_versions(conn: Connection) -> set:
+    if not inspect(conn).has_table(schema_migrations.name):
+        return set()
+    return set(conn.scalars(select(schema_migrations.c.version)))
+
+def pending_migrations(conn: Connection) -> List[Migration]:
+    applied = applied_versions(conn)
+    return [m for m in discover() if m.version not in applied]
+
+def _record(conn: Connection, migration: Migration):
+    conn.execute(schema_migrations.insert().values(
+        version=migration.version, name=migration.name, applied_at=datetime.utcnow()
+    ))
+
+def upgrade(engine: Engine, target: Optional[int] = None, log: Callable[[str], None] = print) -> List[Migration]:
+    """Apply pending migrations up to `target` (default: all). Returns the ones applied.
+
+    `engine` should be built with create_sync_engine(transactional_ddl=True).
+    """
+    with engine.begin() as conn:
+        schema_migrations.create(conn, checkfirst=True)
+        applied = applied_versions(conn)
+    todo = [m for m in discover() if m.version not in applied and (target is None or m.version <= target)]
+
+    lock = None
+    if engine.dialect.name == "postgresql" and todo:
+        lock = engine.connect()
+        lock.execute(text("SELECT pg_advisory_lock(:id)"), {"id": PG_MIGRATION_LOCK_ID})
+    try:
+        done = []
+        for migration in todo:
+            started = time.monotonic()
+            log(f"Migration {migration.version:04d}: {migration.description}")
+            if migration.transactional:
+                with engine.begin() as conn:
+                    # Re-checked inside the (locked) transaction in case another runner got here first
+                    if migration.version in applied_versions(conn):
+                        continue
+                    migration.module.upgrade(conn)
+                    _record(conn, migration)
+            else:
+                migration.module.upgrade(engine)
+                with engine.begin() as conn:
+                    if migration.version in applied_versions(conn):
+                        continue
+                    _record(conn, migration)
+            log(f"  done in {time.monotonic() - started:.2f}s")
+            done.append(migration)
+        return done
+    finally:
+        if lock is not None:
+            lock.execute(text("SELECT pg_advisory_unlock(:id)"), {"id": PG_MIGRATION_LOCK_ID})
+            lock.close()
+
+def create_index(engine: Engine, name: str, table: str, columns: Sequence[str], unique: bool = False,
+                 using: Optional[str] = None):
+    """Create an index if missing, without blocking writes for the whole build where possible.
+
+    PostgreSQL builds it CONCURRENTLY (outside a transaction); an invalid index
+    left by an interrupted build is dropped and rebuilt. SQLite has no online
+    build: the index is created in a transaction of its own, which blocks
+    writers (not WAL readers) only for the duration of the build.
+    """
+    unique_sql = "UNIQUE " if unique else ""
+    column_sql = (f"USING {using} (" if using else "(") + ", ".join(columns) + ")"
+    if engine.dialect.name == "postgresql":
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            invalid = conn.scalar(text(
+                "SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+                "WHERE c.relname = :name AND NOT i.indisvalid"
+            ), {"name": name})
+            if invalid:
+                conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+            conn.execute(text(f"CREATE {unique_sql}INDEX CONCURRENTLY IF NOT EXISTS {name} ON {table} {column_sql}"))
+    else:
+        with engine.begin() as conn:
+            conn.execute(text(f"CREATE {unique_sql}INDEX IF NOT EXISTS {name} ON {table} {column_sql}"))
+
+def backfill(engine: Engine, table: str, assignments: str, where: str = "1 = 1",
+             params: Optional[dict] = None, batch_size: int = BACKFILL_BATCH_SIZE) -> int:
+    """UPDATE `table` SET `assignments` WHERE `where`, one short transaction per id range.
+
+    Each batch locks at most `batch_size` rows, so the app keeps working while a
+    large table is backfilled. Returns the number of rows updated.
+    """
+    with engine.connect() as conn:
+        max_id = conn.scalar(text(f"SELECT MAX(id) FROM {table}")) or 0
+    statement = text(f"UPDATE {table} SET {assignments} WHERE id > :_lo AND id <= :_hi AND ({where})")
+    updated = 0
+    for low in range(0, max_id, batch_size):
+        with engine.begin() as conn:
+            updated += conn.execute(statement, {**(params or {}), "_lo": low, "_hi": low + batch_size}).rowcount
+    return updated
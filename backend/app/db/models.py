@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, Enum, ForeignKey, JSON
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, Enum, ForeignKey, JSON, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from ..core.database import Base
@@ -21,6 +21,8 @@ class DBUser(Base):
     calendar_synced = Column(Boolean, default=False)
     calendar_url = Column(String, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    revision = Column(Integer, index=True)  # assigned by database triggers on every write, see app/db/sync.py
 
     appointments = relationship("DBAppointment", back_populates="visitor", foreign_keys="DBAppointment.visitor_id")
 
@@ -29,7 +31,8 @@ class DBAppointment(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     visitor_id = Column(Integer, ForeignKey("users.id"), nullable=True)
-    host_name = Column(String)
+    host_id = Column(Integer, ForeignKey("users.id"), nullable=True)
+    host_name = Column(String)  # display name at booking time; schedules are keyed by host_id
     purpose = Column(String)
     appointment_type = Column(String, default=AppointmentType.PRE_PLANNED)
     status = Column(String, default=AppointmentStatus.PENDING)
@@ -38,11 +41,129 @@ class DBAppointment(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     check_in_time = Column(DateTime, nullable=True)
     check_out_time = Column(DateTime, nullable=True)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    revision = Column(Integer, index=True)  # assigned by database triggers on every write, see app/db/sync.py
 
     visitor = relationship("DBUser", back_populates="appointments", foreign_keys=[visitor_id])
 
-class DBOTP(Base):
-    __tablename__ = "otps"
-    phone_number = Column(String, primary_key=True)
-    otp = Column(String)
+    __table_args__ = (
+        # Keyset pagination order for appointment listings
+        Index("ix_appointments_scheduled_time_id", "scheduled_time", "id"),
+        # Daily manifest range scans
+        Index("ix_appointments_status_scheduled_time", "status", "scheduled_time"),
+        # Per-host schedule range scans
+        Index("ix_appointments_host_id_scheduled_time", "host_id", "scheduled_time"),
+        # Per-visitor history pages
+        Index("ix_appointments_visitor_id_scheduled_time_id", "visitor_id", "scheduled_time", "id"),
+    )
+
+# Appointment counts per facility-local hour, host and status, kept up to date on write
+class DBAppointmentRollup(Base):
+    __tablename__ = "appointment_rollups"
+
+    bucket_start = Column(DateTime, primary_key=True)  # naive UTC start of the scheduled hour
+    host_id = Column(Integer, primary_key=True)  # 0 for appointments not linked to a host account
+    status = Column(String, primary_key=True)
+    appointment_count = Column(Integer, default=0, nullable=False)
+    visit_count = Column(Integer, default=0, nullable=False)  # completed visits with check-in/out times
+    visit_seconds = Column(Integer, default=0, nullable=False)
+
+# Per-visitor appointment counts for the security-desk profile, kept up to date on write with the rollups
+class DBVisitorStats(Base):
+    __tablename__ = "visitor_stats"
+
+    visitor_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    appointment_count = Column(Integer, default=0, nullable=False)
+    open_count = Column(Integer, default=0, nullable=False)  # pending or accepted
+    visit_count = Column(Integer, default=0, nullable=False)  # checked_in or completed
+    checked_in_count = Column(Integer, default=0, nullable=False)
+    last_visit_at = Column(DateTime, nullable=True)  # latest check-in; only ever moves forward between rebuilds
+
+# One row per employee with an external calendar; HTTP validators and sync state of the feed
+class DBCalendarFeed(Base):
+    __tablename__ = "calendar_feeds"
+
+    employee_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    etag = Column(String, nullable=True)
+    last_modified = Column(String, nullable=True)
+    expanded_until = Column(DateTime, nullable=True)  # horizon end of the last full expansion
+    last_synced_at = Column(DateTime, nullable=True)
+    last_error = Column(String, nullable=True)
+
+# Version (SEQUENCE / LAST-MODIFIED) of each imported event UID, to skip unchanged events on re-sync
+class DBCalendarEvent(Base):
+    __tablename__ = "calendar_events"
+
+    employee_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    uid = Column(String, primary_key=True)
+    version = Column(String)
+
+# Busy time from external calendars, in naive UTC pieces of at most one day
+class DBCalendarBusy(Base):
+    __tablename__ = "calendar_busy"
+
+    id = Column(Integer, primary_key=True)
+    employee_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    uid = Column(String, nullable=False)
+    start_time = Column(DateTime, nullable=False)
+    end_time = Column(DateTime, nullable=False)
+
+    __table_args__ = (
+        Index("ix_calendar_busy_employee_start", "employee_id", "start_time"),
+        Index("ix_calendar_busy_employee_uid", "employee_id", "uid"),
+    )
+
+# Outbound SMS / email queue; rows are written in the caller's transaction and delivered by the notification worker
+class DBNotification(Base):
+    __tablename__ = "notifications"
+
+    id = Column(Integer, primary_key=True)
+    channel = Column(String, nullable=False)  # "sms" or "email"
+    recipient = Column(String, nullable=False)
+    subject = Column(String, nullable=True)
+    body = Column(String, nullable=False)
+    dedup_key = Column(String, unique=True, nullable=True)
+    status = Column(String, default="pending", nullable=False)  # pending, sending, sent, failed, expired
+    attempts = Column(Integer, default=0, nullable=False)
+    next_attempt_at = Column(DateTime, default=datetime.utcnow, nullable=False)  # for "sending": lease expiry
+    expires_at = Column(DateTime, nullable=True)  # undelivered messages are dropped after this (e.g. OTPs)
+    last_error = Column(String, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
+    sent_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        # Worker claim scan
+        Index("ix_notifications_status_next_attempt", "status", "next_attempt_at"),
+    )
+
+# Single-row counter behind users.revision / appointments.revision; pruned_revision is the newest dropped tombstone
+class DBSyncState(Base):
+    __tablename__ = "sync_state"
+
+    id = Column(Integer, primary_key=True)
+    revision = Column(Integer, nullable=False)
+    pruned_revision = Column(Integer, default=0, nullable=False)
+
+# Deleted users and appointments, so kiosk replicas can drop them on their next delta sync
+class DBSyncTombstone(Base):
+    __tablename__ = "sync_tombstones"
+
+    kind = Column(String, primary_key=True)  # "user" or "appointment"
+    entity_id = Column(Integer, primary_key=True)
+    revision = Column(Integer, nullable=False, index=True)
+    deleted_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+# Offline check-in / check-out operations already applied, keyed by the id the kiosk generated,
+# so a re-uploaded batch returns the original outcome instead of applying twice
+class DBSyncOperation(Base):
+    __tablename__ = "sync_operations"
+
+    op_id = Column(String, primary_key=True)
+    device_id = Column(String, nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=True)
+    appointment_id = Column(Integer, nullable=False)
+    action = Column(String, nullable=False)  # "check_in" or "check_out"
+    occurred_at = Column(DateTime, nullable=False)
+    outcome = Column(String, nullable=False)  # "applied", "conflict" or "not_found"
+    detail = Column(String, nullable=True)
+    received_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
@@ -0,0 +1,277 @@
+"""Durable outbound notification queue.
+
+Request handlers only enqueue: a row is inserted into `notifications` in the
+handler's own transaction, so a message is sent if and only if the change
+that caused it commits. Worker tasks started with the app claim due rows in
+batches, hand them to the configured transport (app/core/notifications.py)
+off the event loop, and retry failures with exponential backoff.
+
+- Deduplication: messages with a dedup_key are enqueued at most once.
+- Claiming: a claimed row gets a lease. If a worker dies mid-send, the row
+  becomes due again once the lease expires, so several workers (or
+  processes) can share the table.
+- Expiry: time-sensitive messages (OTPs) are dropped, not sent late. Their
+  rows are deleted as soon as they are sent, fail or expire, so a code never
+  sits in the table past its use.
+- Idle polling is a single read-only query; rows are only written when some
+  are due.
+"""
+from sqlalchemy import select, update, delete, or_
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi.concurrency import run_in_threadpool
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Sequence
+import asyncio
+import logging
+import os
+import random
+import time
+
+from .models import DBAppointment, DBNotification, DBUser
+from ..core.database import AsyncSessionLocal
+from ..core.notifications import OutboundMessage, Transport, load_transport
+from ..models.appointment import AppointmentStatus
+
+NOTIFICATION_WORKERS = int(os.getenv("NOTIFICATION_WORKERS", "1"))
+NOTIFICATION_BATCH_SIZE = 50
+NOTIFICATION_MAX_ATTEMPTS = 6
+NOTIFICATION_BACKOFF_SECONDS = 5
+NOTIFICATION_MAX_BACKOFF_SECONDS = 15 * 60
+NOTIFICATION_LEASE_SECONDS = 60
+NOTIFICATION_POLL_SECONDS = 1.0
+NOTIFICATION_RETENTION = timedelta(days=7)
+PURGE_INTERVAL_SECONDS = 3600
+
+logger = logging.getLogger(__name__)
+
+_wakeup: Optional[asyncio.Event] = None
+_transport: Optional[Transport] = None
+
+def get_transport() -> Transport:
+    global _transport
+    if _transport is None:
+        _transport = load_transport()
+    return _transport
+
+def _wakeup_event() -> asyncio.Event:
+    global _wakeup
+    if _wakeup is None:
+        _wakeup = asyncio.Event()
+    return _wakeup
+
+def wake_notifier():
+    """Let idle workers pick up freshly committed messages without waiting for the next poll."""
+    _wakeup_event().set()
+
+def _message(channel: str, recipient: str, body: str, subject: Optional[str] = None,
+             dedup_key: Optional[str] = None, expires_in: Optional[timedelta] = None) -> dict:
+    now = datetime.utcnow()
+    return {
+        "channel": channel,
+        "recipient": recipient,
+        "subject": subject,
+        "body": body,
+        "dedup_key": dedup_key,
+        "status": "pending",
+        "attempts": 0,
+        "next_attempt_at": now,
+        "expires_at": now + expires_in if expires_in else None,
+        "created_at": now,
+    }
+
+async def enqueue_notifications(db: AsyncSession, messages: List[dict]):
+    """Queue messages built by _message in the caller's transaction, in one statement."""
+    if not messages:
+        return
+    dialect = postgresql if db.bind.dialect.name == "postgresql" else sqlite
+    # Messages with a dedup_key already queued are skipped; NULL keys never conflict
+    stmt = dialect.insert(DBNotification.__table__).on_conflict_do_nothing(index_elements=[DBNotification.dedup_key])
+    await db.execute(stmt, messages)
+
+async def enqueue_notification(db: AsyncSession, channel: str, recipient: str, body: str,
+                               subject: Optional[str] = None, dedup_key: Optional[str] = None,
+                               expires_in: Optional[timedelta] = None):
+    """Queue a message in the caller's transaction. Commit, then call wake_notifier()."""
+    await enqueue_notifications(db, [_message(channel, recipient, body, subject, dedup_key, expires_in)])
+
+def _contact(user: DBUser):
+    return ("email", user.email) if user.email else ("sms", user.phone_number)
+
+async def notify_otp(db: AsyncSession, phone_number: str, code: str, ttl: timedelta):
+    minutes = max(int(ttl.total_seconds() // 60), 1)
+    await enqueue_notification(
+        db, "sms", phone_number,
+        f"Your VMS verification code is {code}. It expires in {minutes} minute{'s' if minutes != 1 else ''}.",
+        expires_in=ttl,
+    )
+
+def _status_message(appt, visitor: Optional[DBUser]) -> Optional[dict]:
+    if visitor is None or appt.status not in (AppointmentStatus.ACCEPTED, AppointmentStatus.REJECTED):
+        return None
+    channel, recipient = _contact(visitor)
+    status = AppointmentStatus(appt.status).value
+    when = appt.scheduled_time.strftime("%Y-%m-%d %H:%M") if appt.scheduled_time else "the requested time"
+    return _message(
+        channel, recipient,
+        f"Your appointment with {appt.host_name} on {when} has been {status}.",
+        subject=f"Appointment {status}",
+        dedup_key=f"appointment:{appt.id}:{status}",
+    )
+
+def _check_in_message(appt, host: Optional[DBUser], visitor: Optional[DBUser]) -> Optional[dict]:
+    if host is None:
+        return None
+    channel, recipient = _contact(host)
+    return _message(
+        channel, recipient,
+        f"{visitor.full_name if visitor else 'Your visitor'} has checked in at the front desk ({appt.purpose}).",
+        subject="Visitor arrived",
+        dedup_key=f"check_in:{appt.id}",
+    )
+
+async def _users(db: AsyncSession, ids) -> Dict[int, DBUser]:
+    ids = {i for i in ids if i is not None}
+    if not ids:
+        return {}
+    return {u.id: u for u in (await db.scalars(select(DBUser).where(DBUser.id.in_(ids)))).all()}
+
+async def notify_appointment_status(db: AsyncSession, appt: DBAppointment):
+    """Tell the visitor their appointment was accepted or rejected."""
+    if appt.visitor_id is None or appt.status not in (AppointmentStatus.ACCEPTED, AppointmentStatus.REJECTED):
+        return
+    message = _status_message(appt, await db.get(DBUser, appt.visitor_id))
+    if message:
+        await enqueue_notifications(db, [message])
+
+async def notify_host_check_in(db: AsyncSession, appt: DBAppointment):
+    """Alert the host that their visitor has arrived."""
+    if appt.host_id is None:
+        return
+    host = await db.get(DBUser, appt.host_id)
+    visitor = await db.get(DBUser, appt.visitor_id) if appt.visitor_id and host else None
+    message = _check_in_message(appt, host, visitor)
+    if message:
+        await enqueue_notifications(db, [message])
+
+async def notify_appointment_statuses(db: AsyncSession, appts: Sequence):
+    """notify_appointment_status for many appointments (ORM objects or bulk UPDATE rows), one query and one insert."""
+    visitors = await _users(db, (a.visitor_id for a in appts))
+    messages = [_status_message(a, visitors.get(a.visitor_id)) for a in appts]
+    await enqueue_notifications(db, [m for m in messages if m])
+
+async def notify_hosts_check_in(db: AsyncSession, appts: Sequence):
+    """notify_host_check_in for many appointments, one query and one insert."""
+    users = await _users(db, [a.host_id for a in appts] + [a.visitor_id for a in appts])
+    messages = [_check_in_message(a, users.get(a.host_id), users.get(a.visitor_id)) for a in appts]
+    await enqueue_notifications(db, [m for m in messages if m])
+
+def _backoff(attempts: int) -> timedelta:
+    delay = min(NOTIFICATION_BACKOFF_SECONDS * 2 ** (attempts - 1), NOTIFICATION_MAX_BACKOFF_SECONDS)
+    return timedelta(seconds=delay * random.uniform(0.8, 1.2))
+
+async def _has_work(db: AsyncSession, now: datetime) -> bool:
+    """Whether any row is due or has expired, without taking a write lock."""
+    return await db.scalar(
+        select(DBNotification.id)
+        .where(
+            DBNotification.status.in_(["pending", "sending"]),
+            or_(DBNotification.next_attempt_at <= now, DBNotification.expires_at <= now),
+        )
+        .limit(1)
+    ) is not None
+
+async def _claim(db: AsyncSession, now: datetime) -> List[DBNotification]:
+    if not await _has_work(db, now):
+        return []
+    await db.execute(
+        delete(DBNotification)
+        .where(DBNotification.status.in_(["pending", "sending"]), DBNotification.expires_at <= now)
+    )
+    due = (
+        select(DBNotification.id)
+        .where(DBNotification.status.in_(["pending", "sending"]), DBNotification.next_attempt_at <= now)
+        .order_by(DBNotification.next_attempt_at)
+        .limit(NOTIFICATION_BATCH_SIZE)
+    )
+    # The status/time condition is repeated so a row claimed concurrently by another worker is skipped
+    rows = (await db.scalars(
+        update(DBNotification)
+        .where(
+            DBNotification.id.in_(due),
+            DBNotification.status.in_(["pending", "sending"]),
+            DBNotification.next_attempt_at <= now,
+        )
+        .values(
+            status="sending",
+            attempts=DBNotification.attempts + 1,
+            next_attempt_at=now + timedelta(seconds=NOTIFICATION_LEASE_SECONDS),
+        )
+        .returning(DBNotification)
+    )).all()
+    await db.commit()
+    return rows
+
+async def process_batch(transport: Optional[Transport] = None) -> int:
+    """Claim and deliver one batch of due messages. Returns the number claimed."""
+    transport = transport or get_transport()
+    async with AsyncSessionLocal() as db:
+        claimed = await _claim(db, datetime.utcnow())
+        if not claimed:
+            return 0
+        messages = [OutboundMessage(n.id, n.channel, n.recipient, n.subject, n.body) for n in claimed]
+        try:
+            errors = await run_in_threadpool(transport.send_batch, messages)
+        except Exception as e:
+            errors = [f"{type(e).__name__}: {e}"] * len(messages)
+
+        now = datetime.utcnow()
+        for notification, error in zip(claimed, errors):
+            if notification.expires_at is not None and (error is None or notification.attempts >= NOTIFICATION_MAX_ATTEMPTS):
+                # Time-sensitive bodies (OTP codes) are not kept once they are no longer needed
+                await db.delete(notification)
+            elif error is None:
+                notification.status = "sent"
+                notification.sent_at = now
+                notification.last_error = None
+            elif notification.attempts >= NOTIFICATION_MAX_ATTEMPTS:
+                notification.status = "failed"
+                notification.last_error = error
+            else:
+                notification.status = "pending"
+                notification.next_attempt_at = now + _backoff(notification.attempts)
+                notification.last_error = error
+        await db.commit()
+        return len(claimed)
+
+async def purge_notifications() -> int:
+    """Delete finished messages past retention, and any finished time-sensitive ones left over."""
+    now = datetime.utcnow()
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(delete(DBNotification).where(
+            DBNotification.status.in_(["sent", "failed", "expired"]),
+            or_(DBNotification.created_at < now - NOTIFICATION_RETENTION, DBNotification.expires_at.is_not(None)),
+        ))
+        await db.commit()
+        return result.rowcount
+
+async def run_notification_worker():
+    """Background loop started by the app (NOTIFICATION_WORKERS per process)."""
+    wakeup = _wakeup_event()
+    last_purge = 0.0
+    while True:
+        claimed = 0
+        try:
+            claimed = await process_batch()
+            if time.monotonic() - last_purge > PURGE_INTERVAL_SECONDS:
+                await purge_notifications()
+                last_purge = time.monotonic()
+        except Exception:
+            logger.exception("Notification worker error")
+        if claimed == NOTIFICATION_BATCH_SIZE:
+            continue
+        try:
+            await asyncio.wait_for(wakeup.wait(), NOTIFICATION_POLL_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+        wakeup.clear()
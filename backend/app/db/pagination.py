@@ -0,0 +1,117 @@
+from fastapi import HTTPException, Query
+from pydantic import BaseModel
+from sqlalchemy import and_, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Generic, List, Optional, TypeVar
+import base64
+import json
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+
+T = TypeVar("T")
+
+class Page(BaseModel, Generic[T]):
+    items: List[T]
+    next_cursor: Optional[str] = None
+
+@dataclass
+class PageParams:
+    limit: int
+    cursor: Optional[str] = None
+    date_from: Optional[datetime] = None
+    date_to: Optional[datetime] = None
+
+def to_naive(value: Optional[datetime]) -> Optional[datetime]:
+    # Stored timestamps are naive; normalise offset-aware query params the same way bookings do
+    if value is not None and value.tzinfo is not None:
+        return value.astimezone(None).replace(tzinfo=None)
+    return value
+
+def page_params(
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+) -> PageParams:
+    return PageParams(limit=limit, cursor=cursor, date_from=to_naive(date_from), date_to=to_naive(date_to))
+
+def encode_cursor(sort_value: Optional[datetime], row_id: int) -> str:
+    payload = [sort_value.isoformat() if sort_value is not None else None, row_id]
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+
+def decode_cursor(cursor: str):
+    try:
+        sort_value, row_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return (datetime.fromisoformat(sort_value) if sort_value is not None else None), int(row_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid pagination cursor")
+
+def encode_offset(offset: int) -> str:
+    """Cursor for listings ordered by a computed score, which have no stable keyset."""
+    return base64.urlsafe_b64encode(json.dumps({"offset": offset}).encode()).decode()
+
+def decode_offset(cursor: Optional[str]) -> int:
+    if not cursor:
+        return 0
+    try:
+        return max(int(json.loads(base64.urlsafe_b64decode(cursor.encode()))["offset"]), 0)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid pagination cursor")
+
+async def fetch_page(db: AsyncSession, query, params: PageParams, id_col, sort_col=None, date_col=None,
+                     descending: bool = False):
+    """Run `query` as one keyset page ordered by (sort_col, id_col), newest first if `descending`.
+
+    The date range is applied to `date_col` (defaults to `sort_col`). Returns
+    the rows of the page and the cursor for the next one, or None when the
+    listing is exhausted.
+    """
+    date_col = date_col if date_col is not None else sort_col
+    if date_col is not None:
+        if params.date_from is not None:
+            query = query.where(date_col >= params.date_from)
+        if params.date_to is not None:
+            query = query.where(date_col < params.date_to)
+
+    if params.cursor:
+        sort_value, last_id = decode_cursor(params.cursor)
+        after = (lambda col, value: col < value) if descending else (lambda col, value: col > value)
+        if sort_col is not None:
+            query = query.where(or_(
+                after(sort_col, sort_value),
+                and_(sort_col == sort_value, after(id_col, last_id))
+            ))
+        else:
+            query = query.where(after(id_col, last_id))
+
+    order = [sort_col, id_col] if sort_col is not None else [id_col]
+    if descending:
+        order = [col.desc() for col in order]
+    rows = (await db.scalars(query.order_by(*order).limit(params.limit + 1))).all()
+
+    next_cursor = None
+    if len(rows) > params.limit:
+        rows = rows[:params.limit]
+        last = rows[-1]
+        sort_value = getattr(last, sort_col.key) if sort_col is not None else None
+        next_cursor = encode_cursor(sort_value, getattr(last, id_col.key))
+    return rows, next_cursor
+
+def slice_page(items: list, params: PageParams, sort_attr: str, id_attr: str = "id"):
+    """Keyset-page an already ordered in-memory list the same way fetch_page does in SQL."""
+    if params.cursor:
+        sort_value, last_id = decode_cursor(params.cursor)
+        items = [
+            item for item in items
+            if (getattr(item, sort_attr), getattr(item, id_attr)) > (sort_value, last_id)
+        ]
+
+    next_cursor = None
+    if len(items) > params.limit:
+        items = items[:params.limit]
+        last = items[-1]
+        next_cursor = encode_cursor(getattr(last, sort_attr), getattr(last, id_attr))
+    return items, next_cursor
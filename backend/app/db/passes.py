@@ -0,0 +1,136 @@
+"""Issuing visitor passes and checking visitors in with them.
+
+A pass scan is verified entirely in memory (app/core/passes.py) and then
+costs one conditional UPDATE: the appointment is checked in only if it is
+still ACCEPTED. That condition is the authority; the in-process revocation
+set just turns cancelled passes away before they reach the database, and is
+reloaded every PASS_REVOCATION_REFRESH_SECONDS to pick up cancellations made
+by other worker processes.
+"""
+from fastapi import HTTPException
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import datetime, timedelta
+import asyncio
+import logging
+import os
+
+from .models import DBAppointment, DBUser
+from .manifest import invalidate_manifest
+from .notifications import notify_hosts_check_in, wake_notifier
+from .rollups import record_status_changes
+from .scheduling import INACTIVE_STATUSES
+from .transitions import RETURNED_COLUMNS
+from ..core.auth import Principal
+from ..core.config import MAX_APPOINTMENT_MINUTES
+from ..core.database import AsyncSessionLocal
+from ..core.events import publish_appointment
+from ..core.passes import (
+    PassError, is_revoked, issue_pass, pass_window, replace_revocations, revocation_generation, revoke_passes,
+    verify_pass,
+)
+from ..models.appointment import AppointmentStatus
+from ..models.passes import PassCheckIn, VisitorPass
+from ..models.user import UserRole
+
+PASS_REVOCATION_REFRESH_SECONDS = int(os.getenv("PASS_REVOCATION_REFRESH_SECONDS", "60"))
+
+logger = logging.getLogger(__name__)
+
+VISITOR_NAME = select(DBUser.full_name).where(DBUser.id == DBAppointment.visitor_id).scalar_subquery()
+
+async def get_visitor_pass(db: AsyncSession, appointment_id: int, principal: Principal) -> VisitorPass:
+    """Pass for an accepted appointment; visitors may only fetch their own."""
+    appt = await db.scalar(select(DBAppointment).where(DBAppointment.id == appointment_id))
+    if appt is None or (UserRole(principal.role) == UserRole.VISITOR and appt.visitor_id != principal.id):
+        raise HTTPException(status_code=404, detail="Appointment not found")
+    if appt.status != AppointmentStatus.ACCEPTED:
+        raise HTTPException(status_code=409, detail="Passes are only issued for accepted appointments")
+
+    scheduled_time = appt.scheduled_time.replace(tzinfo=None)
+    valid_from, valid_until = pass_window(scheduled_time, appt.duration_minutes)
+    if valid_until <= datetime.utcnow():
+        raise HTTPException(status_code=410, detail="Appointment has already ended")
+    token = issue_pass(appt.id, appt.visitor_id, valid_from, valid_until)
+    return VisitorPass(
+        appointment_id=appt.id, token=token, valid_from=valid_from, valid_until=valid_until,
+        qr_url=f"/visitors/passes/{token}.png",
+    )
+
+def _rejected(status: str) -> HTTPException:
+    status = AppointmentStatus(status)
+    if status in INACTIVE_STATUSES:
+        return HTTPException(status_code=403, detail=f"Pass has been revoked; the appointment was {status.value}")
+    if status in (AppointmentStatus.CHECKED_IN, AppointmentStatus.COMPLETED):
+        return HTTPException(status_code=409, detail="Pass has already been used to check in")
+    return HTTPException(status_code=409, detail=f"Appointment is {status.value}; it must be accepted before check-in")
+
+async def check_in_with_pass(db: AsyncSession, token: str) -> PassCheckIn:
+    try:
+        claims = verify_pass(token)
+    except PassError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    now = datetime.utcnow()
+    if now < claims.valid_from:
+        raise HTTPException(status_code=403, detail=f"Pass is not valid until {claims.valid_from.isoformat()}Z")
+    if now > claims.valid_until:
+        raise HTTPException(status_code=403, detail="Pass has expired")
+    if is_revoked(claims.appointment_id):
+        raise HTTPException(status_code=403, detail="Pass has been revoked")
+
+    row = (await db.execute(
+        update(DBAppointment)
+        .where(
+            DBAppointment.id == claims.appointment_id,
+            DBAppointment.visitor_id == claims.visitor_id,
+            DBAppointment.status == AppointmentStatus.ACCEPTED.value,
+        )
+        .values(status=AppointmentStatus.CHECKED_IN.value, check_in_time=now)
+        .returning(*RETURNED_COLUMNS, VISITOR_NAME.label("visitor_name"))
+        .execution_options(synchronize_session=False)
+    )).first()
+    if row is None:
+        # Nothing was written; find out why
+        status = await db.scalar(select(DBAppointment.status).where(
+            DBAppointment.id == claims.appointment_id, DBAppointment.visitor_id == claims.visitor_id,
+        ))
+        if status is None:
+            raise HTTPException(status_code=404, detail="Appointment not found")
+        if AppointmentStatus(status) in INACTIVE_STATUSES:
+            revoke_passes([claims.appointment_id])
+        raise _rejected(status)
+
+    await record_status_changes(db, [row], AppointmentStatus.ACCEPTED)
+    await notify_hosts_check_in(db, [row])
+    await db.commit()
+    invalidate_manifest(row.scheduled_time)
+    publish_appointment("appointment.checked_in", row)
+    wake_notifier()
+    return PassCheckIn(
+        appointment_id=row.id, visitor_id=row.visitor_id, visitor_name=row.visitor_name,
+        host_name=row.host_name, purpose=row.purpose, scheduled_time=row.scheduled_time,
+        status=AppointmentStatus.CHECKED_IN, check_in_time=row.check_in_time,
+    )
+
+async def load_pass_revocations() -> int:
+    """Replace the revocation set with every cancelled / rejected appointment whose pass could still be open."""
+    generation = revocation_generation()
+    # No pass outlives its appointment's scheduled end
+    cutoff = datetime.utcnow() - timedelta(minutes=MAX_APPOINTMENT_MINUTES)
+    async with AsyncSessionLocal() as db:
+        ids = set((await db.scalars(
+            select(DBAppointment.id).where(
+                DBAppointment.status.in_(INACTIVE_STATUSES), DBAppointment.scheduled_time >= cutoff,
+            )
+        )).all())
+    replace_revocations(ids, generation)
+    return len(ids)
+
+async def run_pass_revocation_loader():
+    """Background loop started by the app."""
+    while True:
+        try:
+            await load_pass_revocations()
+        except Exception:
+            logger.exception("Pass revocation loader error")
+        await asyncio.sleep(PASS_REVOCATION_REFRESH_SECONDS)
@@ -0,0 +1,89 @@
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from .models import DBAppointment, DBUser
+from ..models.appointment import Appointment
+from ..models.user import UserRole
+
+def appointment_listing_query(*criteria):
+    """Base SELECT for appointment listings.
+
+    The visitor is joined into the same statement (name and phone only), so
+    building responses never triggers a per-row lookup.
+    """
+    return (
+        select(DBAppointment)
+        .options(
+            joinedload(DBAppointment.visitor).load_only(DBUser.full_name, DBUser.phone_number)
+        )
+        .where(*criteria)
+    )
+
+def to_appointment(appt: DBAppointment) -> Appointment:
+    res = Appointment.from_orm(appt)
+    if appt.visitor:
+        res.visitor_name = appt.visitor.full_name
+        res.visitor_phone = appt.visitor.phone_number
+    return res
+
+def to_appointments(appts: Sequence[DBAppointment]) -> List[Appointment]:
+    return [to_appointment(appt) for appt in appts]
+
+async def resolve_host(db: AsyncSession, host_name: Optional[str], host_id: Optional[int] = None) -> Tuple[Optional[int], Optional[str]]:
+    """(host_id, host_name) for a booking.
+
+    An explicit host_id wins and supplies the current display name. Otherwise
+    the name is matched against staff accounts; ambiguous or unknown names
+    leave host_id empty and keep the free-text name.
+    """
+    if host_id is not None:
+        host = await db.scalar(select(DBUser).where(DBUser.id == host_id, DBUser.role != UserRole.VISITOR))
+        return (host.id, host.full_name) if host else (None, host_name)
+    if not host_name:
+        return None, host_name
+    ids = (await db.scalars(
+        select(DBUser.id).where(DBUser.full_name == host_name, DBUser.role != UserRole.VISITOR).limit(2)
+    )).all()
+    return (ids[0] if len(ids) == 1 else None), host_name
+
+async def resolve_hosts(db: AsyncSession, keys: Iterable[Tuple[Optional[int], Optional[str]]]) -> Dict[Tuple[Optional[int], Optional[str]], Tuple[Optional[int], Optional[str]]]:
+    """resolve_host for many (host_id, host_name) pairs with one query per kind of key."""
+    keys = set(keys)
+    ids = {host_id for host_id, _ in keys if host_id is not None}
+    names = {name for host_id, name in keys if host_id is None and name}
+    by_id = dict((await db.execute(
+        select(DBUser.id, DBUser.full_name).where(DBUser.id.in_(ids), DBUser.role != UserRole.VISITOR)
+    )).all()) if ids else {}
+    by_name: Dict[str, List[int]] = {}
+    if names:
+        for name, user_id in (await db.execute(
+            select(DBUser.full_name, DBUser.id).where(DBUser.full_name.in_(names), DBUser.role != UserRole.VISITOR)
+        )).all():
+            by_name.setdefault(name, []).append(user_id)
+
+    resolved = {}
+    for host_id, name in keys:
+        if host_id is not None:
+            resolved[(host_id, name)] = (host_id, by_id[host_id]) if host_id in by_id else (None, name)
+        else:
+            matches = by_name.get(name, [])
+            resolved[(host_id, name)] = (matches[0] if len(matches) == 1 else None), name
+    return resolved
+
+def host_schedule_query(host_id: Optional[int], host_name: Optional[str] = None,
+                        date_from: Optional[datetime] = None, date_to: Optional[datetime] = None, *criteria):
+    """Listing query for one host's appointments in [date_from, date_to), ordered by time.
+
+    Served by ix_appointments_host_id_scheduled_time. Hosts without an account
+    (host_id None) fall back to matching the free-text host_name.
+    """
+    host = DBAppointment.host_id == host_id if host_id is not None else DBAppointment.host_name == host_name
+    window = []
+    if date_from is not None:
+        window.append(DBAppointment.scheduled_time >= date_from)
+    if date_to is not None:
+        window.append(DBAppointment.scheduled_time < date_to)
+    return appointment_listing_query(host, *window, *criteria).order_by(DBAppointment.scheduled_time, DBAppointment.id)
@@ -0,0 +1,236 @@
+"""Incrementally maintained appointment rollups for reporting.
+
+Every appointment contributes to one DBAppointmentRollup row, keyed by the
+facility-local hour it is scheduled in, its host_id and its status, so a
+renamed host keeps a single series. Writers call
+record_appointment_created / record_status_change inside their own transaction
+so the rollups commit (or roll back) together with the appointment itself.
+
+The same calls keep each visitor's DBVisitorStats row current, so the
+security-desk profile reads a visitor's counts from one row however many
+appointments they have.
+"""
+from sqlalchemy import case, delete, func, insert, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from datetime import datetime, timezone
+from typing import Dict, Optional, Sequence, Tuple
+from zoneinfo import ZoneInfo
+
+from .models import DBAppointment, DBAppointmentRollup, DBVisitorStats
+from ..core.config import FACILITY_TIMEZONE
+from ..models.appointment import AppointmentStatus
+
+REBUILD_BATCH_SIZE = 5000
+
+OPEN_STATUSES = [AppointmentStatus.PENDING.value, AppointmentStatus.ACCEPTED.value]
+VISIT_STATUSES = [AppointmentStatus.CHECKED_IN.value, AppointmentStatus.COMPLETED.value]
+
+_facility_tz = ZoneInfo(FACILITY_TIMEZONE)
+
+def hour_bucket(scheduled_time: datetime) -> datetime:
+    """Naive UTC start of the facility-local hour containing a stored timestamp."""
+    local = scheduled_time.replace(tzinfo=timezone.utc).astimezone(_facility_tz)
+    return local.replace(minute=0, second=0, microsecond=0).astimezone(timezone.utc).replace(tzinfo=None)
+
+def _status_value(status) -> str:
+    return AppointmentStatus(status).value
+
+def _contribution(status, check_in_time: Optional[datetime], check_out_time: Optional[datetime]) -> Tuple[int, int, int]:
+    """(appointment_count, visit_count, visit_seconds) one appointment adds to its row."""
+    if _status_value(status) == AppointmentStatus.COMPLETED.value and check_in_time and check_out_time:
+        return 1, 1, max(int((check_out_time - check_in_time).total_seconds()), 0)
+    return 1, 0, 0
+
+Totals = Dict[Tuple[datetime, int, str], list]
+
+def _add(totals: Totals, scheduled_time: Optional[datetime], host_id: Optional[int], status, sign: int,
+         check_in_time: Optional[datetime] = None, check_out_time: Optional[datetime] = None):
+    if scheduled_time is None:
+        return
+    # SQLite keeps the wall-clock digits of offset-aware values, so mirror that here
+    key = (hour_bucket(scheduled_time.replace(tzinfo=None)), host_id or 0, _status_value(status))
+    entry = totals.setdefault(key, [0, 0, 0])
+    for i, value in enumerate(_contribution(status, check_in_time, check_out_time)):
+        entry[i] += sign * value
+
+async def _upsert(db: AsyncSession, totals: Totals):
+    """Add per-row deltas to the rollups in one statement (executemany for several rows)."""
+    rows = [
+        {
+            "bucket_start": bucket_start,
+            "host_id": host_id,
+            "status": status,
+            "appointment_count": count,
+            "visit_count": visits,
+            "visit_seconds": seconds,
+        }
+        for (bucket_start, host_id, status), (count, visits, seconds) in totals.items()
+        if count or visits or seconds
+    ]
+    if not rows:
+        return
+    dialect = postgresql if db.bind.dialect.name == "postgresql" else sqlite
+    table = DBAppointmentRollup.__table__
+    stmt = dialect.insert(table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.bucket_start, table.c.host_id, table.c.status],
+        set_={
+            "appointment_count": table.c.appointment_count + stmt.excluded.appointment_count,
+            "visit_count": table.c.visit_count + stmt.excluded.visit_count,
+            "visit_seconds": table.c.visit_seconds + stmt.excluded.visit_seconds,
+        },
+    )
+    await db.execute(stmt, rows)
+
+VisitorTotals = Dict[int, list]
+
+def _visitor_contribution(status) -> Tuple[int, int, int, int]:
+    """(appointment_count, open_count, visit_count, checked_in_count) one appointment adds to its visitor."""
+    status = _status_value(status)
+    return 1, int(status in OPEN_STATUSES), int(status in VISIT_STATUSES), int(status == AppointmentStatus.CHECKED_IN.value)
+
+def _add_visitor(visitors: VisitorTotals, visitor_id: Optional[int], status, sign: int,
+                 check_in_time: Optional[datetime] = None):
+    if visitor_id is None:
+        return
+    entry = visitors.setdefault(visitor_id, [0, 0, 0, 0, None])
+    for i, value in enumerate(_visitor_contribution(status)):
+        entry[i] += sign * value
+    # last_visit_at only moves forward; undoing a check-in leaves it until the next rebuild
+    if sign > 0 and check_in_time and _status_value(status) in VISIT_STATUSES:
+        check_in_time = check_in_time.replace(tzinfo=None)
+        if entry[4] is None or check_in_time > entry[4]:
+            entry[4] = check_in_time
+
+async def _upsert_visitors(db: AsyncSession, visitors: VisitorTotals):
+    rows = [
+        {
+            "visitor_id": visitor_id,
+            "appointment_count": count,
+            "open_count": open_count,
+            "visit_count": visits,
+            "checked_in_count": checked_in,
+            "last_visit_at": last_visit_at,
+        }
+        for visitor_id, (count, open_count, visits, checked_in, last_visit_at) in visitors.items()
+        if count or open_count or visits or checked_in or last_visit_at
+    ]
+    if not rows:
+        return
+    dialect = postgresql if db.bind.dialect.name == "postgresql" else sqlite
+    table = DBVisitorStats.__table__
+    stmt = dialect.insert(table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.visitor_id],
+        set_={
+            "appointment_count": table.c.appointment_count + stmt.excluded.appointment_count,
+            "open_count": table.c.open_count + stmt.excluded.open_count,
+            "visit_count": table.c.visit_count + stmt.excluded.visit_count,
+            "checked_in_count": table.c.checked_in_count + stmt.excluded.checked_in_count,
+            "last_visit_at": case(
+                (stmt.excluded.last_visit_at > table.c.last_visit_at, stmt.excluded.last_visit_at),
+                else_=func.coalesce(table.c.last_visit_at, stmt.excluded.last_visit_at),
+            ),
+        },
+    )
+    await db.execute(stmt, rows)
+
+async def record_appointment_created(db: AsyncSession, appt: DBAppointment):
+    await record_appointments_created(db, [appt])
+
+async def record_appointments_created(db: AsyncSession, appts: Sequence):
+    """record_appointment_created for many new appointments (ORM objects or insert rows), in one upsert each."""
+    totals: Totals = {}
+    visitors: VisitorTotals = {}
+    for appt in appts:
+        _add(totals, appt.scheduled_time, appt.host_id, appt.status, +1, appt.check_in_time, appt.check_out_time)
+        _add_visitor(visitors, appt.visitor_id, appt.status, +1, appt.check_in_time)
+    await _upsert(db, totals)
+    await _upsert_visitors(db, visitors)
+
+async def record_status_change(db: AsyncSession, appt: DBAppointment, old_status,
+                               old_check_in_time: Optional[datetime] = None, old_check_out_time: Optional[datetime] = None):
+    """Move an appointment from its old status row to its current one."""
+    if _status_value(old_status) == _status_value(appt.status):
+        return
+    totals: Totals = {}
+    visitors: VisitorTotals = {}
+    _add(totals, appt.scheduled_time, appt.host_id, old_status, -1, old_check_in_time, old_check_out_time)
+    _add(totals, appt.scheduled_time, appt.host_id, appt.status, +1, appt.check_in_time, appt.check_out_time)
+    _add_visitor(visitors, appt.visitor_id, old_status, -1)
+    _add_visitor(visitors, appt.visitor_id, appt.status, +1, appt.check_in_time)
+    await _upsert(db, totals)
+    await _upsert_visitors(db, visitors)
+
+async def record_status_changes(db: AsyncSession, appts: Sequence, old_status):
+    """record_status_change for many appointments that all left `old_status`, in one upsert each.
+
+    `appts` may be ORM objects or rows returned by a bulk UPDATE. `old_status`
+    is never COMPLETED for bulk transitions, so the old contribution carries no
+    visit time.
+    """
+    totals: Totals = {}
+    visitors: VisitorTotals = {}
+    for appt in appts:
+        if _status_value(old_status) == _status_value(appt.status):
+            continue
+        _add(totals, appt.scheduled_time, appt.host_id, old_status, -1)
+        _add(totals, appt.scheduled_time, appt.host_id, appt.status, +1, appt.check_in_time, appt.check_out_time)
+        _add_visitor(visitors, appt.visitor_id, old_status, -1)
+        _add_visitor(visitors, appt.visitor_id, appt.status, +1, appt.check_in_time)
+    await _upsert(db, totals)
+    await _upsert_visitors(db, visitors)
+
+def rebuild_rollups(db: Session) -> int:
+    """Recompute every rollup row from the appointments table. Returns the number of rows written."""
+    totals: Totals = {}
+    rows = db.execute(
+        select(
+            DBAppointment.scheduled_time, DBAppointment.host_id, DBAppointment.status,
+            DBAppointment.check_in_time, DBAppointment.check_out_time,
+        ).where(DBAppointment.scheduled_time.is_not(None))
+        .execution_options(yield_per=REBUILD_BATCH_SIZE)
+    )
+    for scheduled_time, host_id, status, check_in_time, check_out_time in rows:
+        key = (hour_bucket(scheduled_time), host_id or 0, _status_value(status))
+        count, visits, seconds = _contribution(status, check_in_time, check_out_time)
+        entry = totals.setdefault(key, [0, 0, 0])
+        entry[0] += count
+        entry[1] += visits
+        entry[2] += seconds
+
+    db.execute(delete(DBAppointmentRollup))
+    if totals:
+        db.execute(insert(DBAppointmentRollup), [
+            {
+                "bucket_start": bucket_start,
+                "host_id": host_id,
+                "status": status,
+                "appointment_count": count,
+                "visit_count": visits,
+                "visit_seconds": seconds,
+            }
+            for (bucket_start, host_id, status), (count, visits, seconds) in totals.items()
+        ])
+    db.commit()
+    return len(totals)
+
+def rebuild_visitor_stats(db: Session) -> int:
+    """Recompute every visitor's stats from the appointments table. Returns the number of rows written."""
+    status = DBAppointment.status
+    db.execute(delete(DBVisitorStats))
+    written = db.execute(insert(DBVisitorStats).from_select(
+        ["visitor_id", "appointment_count", "open_count", "visit_count", "checked_in_count", "last_visit_at"],
+        select(
+            DBAppointment.visitor_id,
+            func.count(),
+            func.sum(case((status.in_(OPEN_STATUSES), 1), else_=0)),
+            func.sum(case((status.in_(VISIT_STATUSES), 1), else_=0)),
+            func.sum(case((status == AppointmentStatus.CHECKED_IN.value, 1), else_=0)),
+            func.max(case((status.in_(VISIT_STATUSES), DBAppointment.check_in_time))),
+        ).where(DBAppointment.visitor_id.is_not(None)).group_by(DBAppointment.visitor_id)
+    )).rowcount
+    db.commit()
+    return written
@@ -0,0 +1,207 @@
+"""Booking conflict detection and free-slot search.
+
+A host is busy for [scheduled_time, scheduled_time + duration_minutes) of every
+appointment that is not cancelled or rejected, BLOCKED slots included. No
+appointment is longer than MAX_APPOINTMENT_MINUTES, so everything overlapping a
+window starts in [window_start - MAX_APPOINTMENT_MINUTES, window_end) and is
+found with one range scan on ix_appointments_host_id_scheduled_time.
+
+Hosts with a synced external calendar are also busy during its events (see
+calendars.py). Those are stored in pieces of at most BUSY_SEGMENT and are
+searched the same way on ix_calendar_busy_employee_start.
+"""
+from fastapi import HTTPException
+from sqlalchemy import DateTime, Integer, Select, bindparam, cast, func, literal_column, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+from .models import DBAppointment, DBCalendarBusy, DBUser
+from ..core.calendar import BUSY_SEGMENT
+from ..core.config import FACILITY_TIMEZONE, MAX_APPOINTMENT_MINUTES, WORKDAY_START_HOUR, WORKDAY_END_HOUR
+from ..models.appointment import AppointmentStatus, TimeSlot
+
+# Appointments in these states do not hold their slot
+INACTIVE_STATUSES = [AppointmentStatus.CANCELLED, AppointmentStatus.REJECTED]
+FREE_SLOTS_MAX_DAYS = 31
+
+_facility_tz = ZoneInfo(FACILITY_TIMEZONE)
+
+class Busy(NamedTuple):
+    start: datetime
+    end: datetime
+    appointment_id: Optional[int] = None
+
+def _host_clause(host_id: Optional[int], host_name: Optional[str]):
+    return DBAppointment.host_id == host_id if host_id is not None else DBAppointment.host_name == host_name
+
+async def busy_intervals(db: AsyncSession, host_id: Optional[int], host_name: Optional[str],
+                         start: datetime, end: datetime, exclude_id: Optional[int] = None) -> List[Busy]:
+    """Busy intervals of a host overlapping [start, end), ordered by start."""
+    query = select(DBAppointment.id, DBAppointment.scheduled_time, DBAppointment.duration_minutes).where(
+        _host_clause(host_id, host_name),
+        DBAppointment.scheduled_time >= start - timedelta(minutes=MAX_APPOINTMENT_MINUTES),
+        DBAppointment.scheduled_time < end,
+        DBAppointment.status.notin_(INACTIVE_STATUSES),
+    ).order_by(DBAppointment.scheduled_time)
+    if exclude_id is not None:
+        query = query.where(DBAppointment.id != exclude_id)
+
+    busy = []
+    for appt_id, scheduled_time, duration in await db.execute(query):
+        appt_end = scheduled_time + timedelta(minutes=duration or 0)
+        if appt_end > start:
+            busy.append(Busy(scheduled_time, appt_end, appt_id))
+
+    if host_id is not None:
+        busy.extend(Busy(busy_start, busy_end) for busy_start, busy_end in await db.execute(
+            select(DBCalendarBusy.start_time, DBCalendarBusy.end_time).where(
+                DBCalendarBusy.employee_id == host_id,
+                DBCalendarBusy.start_time >= start - BUSY_SEGMENT,
+                DBCalendarBusy.start_time < end,
+                DBCalendarBusy.end_time > start,
+            )
+        ))
+        busy.sort(key=lambda b: (b.start, b.end))
+    return busy
+
+def _ends_after(dialect: str, moment):
+    """SQL condition: the appointment ends after `moment`."""
+    if dialect == "postgresql":
+        return DBAppointment.scheduled_time + DBAppointment.duration_minutes * literal_column("interval '1 minute'") > moment
+    # SQLite stores DATETIME as text; compare whole epoch seconds
+    def epoch(value):
+        return cast(func.strftime(literal_column("'%s'"), value), Integer)
+    return epoch(DBAppointment.scheduled_time) + DBAppointment.duration_minutes * 60 > epoch(moment)
+
+_conflict_queries: Dict[Tuple[str, bool], Select] = {}
+
+def _conflict_query(dialect: str, by_host_id: bool) -> Select:
+    # Built once per (dialect, host key) with bind parameters; booking checks are hot
+    key = (dialect, by_host_id)
+    if key not in _conflict_queries:
+        host = (DBAppointment.host_id == bindparam("host_id") if by_host_id
+                else DBAppointment.host_name == bindparam("host_name"))
+        _conflict_queries[key] = select(DBAppointment.id, DBAppointment.scheduled_time, DBAppointment.duration_minutes).where(
+            host,
+            DBAppointment.scheduled_time >= bindparam("scan_from", type_=DateTime),
+            DBAppointment.scheduled_time < bindparam("end", type_=DateTime),
+            _ends_after(dialect, bindparam("start", type_=DateTime)),
+            DBAppointment.status.notin_(INACTIVE_STATUSES),
+            DBAppointment.id != bindparam("exclude_id"),
+        ).order_by(DBAppointment.scheduled_time).limit(1)
+    return _conflict_queries[key]
+
+_calendar_conflict_query = select(DBCalendarBusy.start_time, DBCalendarBusy.end_time).where(
+    DBCalendarBusy.employee_id == bindparam("host_id"),
+    DBCalendarBusy.start_time >= bindparam("scan_from", type_=DateTime),
+    DBCalendarBusy.start_time < bindparam("end", type_=DateTime),
+    DBCalendarBusy.end_time > bindparam("start", type_=DateTime),
+).order_by(DBCalendarBusy.start_time).limit(1)
+
+async def find_conflict(db: AsyncSession, host_id: Optional[int], host_name: Optional[str],
+                        start: datetime, end: datetime, exclude_id: Optional[int] = None,
+                        include_calendar: bool = True) -> Optional[Busy]:
+    """First busy interval of a host overlapping [start, end), or None.
+
+    The overlap test runs inside the index range scan, so only a conflicting
+    row (if any) is returned to Python.
+    """
+    query = _conflict_query(db.bind.dialect.name, host_id is not None)
+    # Core-level execute on the session's connection (same transaction) skips ORM result processing
+    connection = await db.connection()
+    row = (await connection.execute(query, {
+        "host_id": host_id,
+        "host_name": host_name,
+        "scan_from": start - timedelta(minutes=MAX_APPOINTMENT_MINUTES),
+        "start": start,
+        "end": end,
+        # Ids are positive, so -1 excludes nothing
+        "exclude_id": exclude_id if exclude_id is not None else -1,
+    })).first()
+    if row is not None:
+        return Busy(row.scheduled_time, row.scheduled_time + timedelta(minutes=row.duration_minutes or 0), row.id)
+
+    if include_calendar and host_id is not None:
+        row = (await connection.execute(_calendar_conflict_query, {
+            "host_id": host_id,
+            "scan_from": start - BUSY_SEGMENT,
+            "start": start,
+            "end": end,
+        })).first()
+        if row is not None:
+            return Busy(row.start_time, row.end_time)
+    return None
+
+async def reserve_slot(db: AsyncSession, appt: DBAppointment):
+    """Flush a new or rescheduled appointment and reject it (409) if it overlaps the host's busy time.
+
+    The flush takes SQLite's write lock, and on PostgreSQL the host row is locked,
+    so the check sees every committed booking and no competing booking for the
+    same host can commit until this transaction ends. On conflict the
+    transaction is rolled back.
+    """
+    duration = appt.duration_minutes or 0
+    if not 0 < duration <= MAX_APPOINTMENT_MINUTES:
+        raise HTTPException(status_code=400, detail=f"duration_minutes must be between 1 and {MAX_APPOINTMENT_MINUTES}")
+
+    if db.bind.dialect.name == "postgresql" and appt.host_id is not None:
+        await db.execute(select(DBUser.id).where(DBUser.id == appt.host_id).with_for_update())
+    db.add(appt)
+    await db.flush()
+
+    # SQLite keeps the wall-clock digits of offset-aware values, so compare the same way
+    start = appt.scheduled_time.replace(tzinfo=None)
+    conflict = await find_conflict(
+        db, appt.host_id, appt.host_name, start, start + timedelta(minutes=duration), exclude_id=appt.id,
+        # Hosts may block out time their own calendar already marks as busy
+        include_calendar=appt.status != AppointmentStatus.BLOCKED,
+    )
+    if conflict:
+        await db.rollback()
+        source = "booked" if conflict.appointment_id is not None else "busy in their calendar"
+        raise HTTPException(
+            status_code=409,
+            detail=f"Host is {source} from {conflict.start.isoformat()} to {conflict.end.isoformat()}"
+        )
+
+def _workday(day: date):
+    """Naive UTC [start, end) of the facility-local working hours on a day."""
+    start = datetime.combine(day, time(WORKDAY_START_HOUR), tzinfo=_facility_tz)
+    end = datetime.combine(day, time(WORKDAY_END_HOUR), tzinfo=_facility_tz)
+    return (
+        start.astimezone(timezone.utc).replace(tzinfo=None),
+        end.astimezone(timezone.utc).replace(tzinfo=None),
+    )
+
+async def free_slots(db: AsyncSession, host_id: Optional[int], host_name: Optional[str],
+                     date_from: date, date_to: date, min_minutes: int = 15) -> List[TimeSlot]:
+    """Open windows of at least min_minutes within working hours on facility-local days [date_from, date_to]."""
+    days = [date_from + timedelta(days=i) for i in range((date_to - date_from).days + 1)]
+    if not days:
+        return []
+    windows = [_workday(day) for day in days]
+    busy = await busy_intervals(db, host_id, host_name, windows[0][0], windows[-1][1])
+    now = datetime.utcnow()
+
+    slots = []
+    i = 0
+    for window_start, window_end in windows:
+        cursor = max(window_start, now)
+        # Busy intervals are sorted by start; skip those that ended before this window
+        while i < len(busy) and busy[i].end <= cursor:
+            i += 1
+        j = i
+        while cursor < window_end:
+            if j < len(busy) and busy[j].start < window_end:
+                gap_end = busy[j].start
+                next_cursor = max(cursor, busy[j].end)
+                j += 1
+            else:
+                gap_end, next_cursor = window_end, window_end
+            if gap_end - cursor >= timedelta(minutes=min_minutes):
+                slots.append(TimeSlot(start=cursor, end=gap_end,
+                                      duration_minutes=int((gap_end - cursor).total_seconds() // 60)))
+            cursor = next_cursor
+    return slots
@@ -0,0 +1,192 @@
+"""Ranked search over users and appointments.
+
+On SQLite the query runs against the FTS5 index from migration 0005, which
+triggers keep current on every write. Each query word matches as a prefix
+("jo" finds "John", "98765" finds "+919876543210"). A word that is not the
+prefix of any indexed term is treated as misspelt and also matches the
+indexed terms within a small edit distance that share its first letters,
+taken from the index vocabulary. Results are ordered by bm25 with names
+weighted above phone, email, purpose and host. Ranking every match of a
+broad query ("ra") would cost time proportional to the table, so only the
+newest SEARCH_RANK_WINDOW matches are ranked; specific queries have fewer
+matches than that and are ranked exactly.
+
+On PostgreSQL the same endpoint uses pg_trgm similarity and substring matches.
+"""
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import load_only
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+import re
+import unicodedata
+
+from .models import DBAppointment, DBUser
+from .queries import appointment_listing_query, to_appointment
+from ..models.search import SearchKind, SearchResult, UserSummary
+
+SEARCH_MAX_RESULTS = 1000
+SEARCH_RANK_WINDOW = 2000
+MAX_QUERY_TERMS = 6
+FUZZY_MIN_TERM_LENGTH = 4
+FUZZY_MAX_CANDIDATES = 5
+# Vocabulary terms examined per misspelt word, all sharing its first FUZZY_PREFIX_LENGTH letters
+FUZZY_SCAN_LIMIT = 5000
+FUZZY_PREFIX_LENGTH = 3
+
+@dataclass
+class SearchHit:
+    kind: SearchKind
+    id: int
+    score: float
+
+def _fold(value: str) -> str:
+    # Same folding as the index tokenizer (unicode61, remove_diacritics 2)
+    decomposed = unicodedata.normalize("NFKD", value.lower())
+    return "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+
+def query_terms(q: str) -> List[str]:
+    if re.fullmatch(r"[\d\s+().-]+", q) and any(ch.isdigit() for ch in q):
+        # A formatted phone number ("+91 98765-43210") is one term
+        return [re.sub(r"\D", "", q)]
+    terms = re.findall(r"\w+", _fold(q))
+    # Single letters match too much as prefixes; keep them only if nothing else is given
+    terms = [t for t in terms if len(t) > 1] or terms
+    return terms[:MAX_QUERY_TERMS]
+
+def _max_typos(term: str) -> int:
+    return 1 if len(term) < 8 else 2
+
+def _within_distance(a: str, b: str, limit: int) -> bool:
+    """Optimal string alignment distance (adjacent swaps count once) <= limit."""
+    if abs(len(a) - len(b)) > limit:
+        return False
+    previous2: List[int] = []
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = a[i - 1] != b[j - 1]
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        if min(current) > limit:
+            return False
+        previous2, previous = previous, current
+    return previous[-1] <= limit
+
+def _prefix_upper_bound(prefix: str) -> str:
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+async def _corrections(db: AsyncSession, term: str) -> List[str]:
+    """Indexed terms close to `term`, if `term` itself is not the prefix of any indexed term."""
+    if len(term) < FUZZY_MIN_TERM_LENGTH or not term.isalpha():
+        return []
+    known = await db.scalar(
+        text("SELECT 1 FROM search_terms WHERE term >= :low AND term < :high LIMIT 1"),
+        {"low": term, "high": _prefix_upper_bound(term)},
+    )
+    if known:
+        return []
+    rows = (await db.execute(
+        text("SELECT term, doc FROM search_terms WHERE term >= :low AND term < :high LIMIT :limit"),
+        {"low": term[:FUZZY_PREFIX_LENGTH], "high": _prefix_upper_bound(term[:FUZZY_PREFIX_LENGTH]),
+         "limit": FUZZY_SCAN_LIMIT},
+    )).all()
+    limit = _max_typos(term)
+    close = [
+        (doc, candidate) for candidate, doc in rows
+        if abs(len(candidate) - len(term)) <= limit and _within_distance(term, candidate, limit)
+    ]
+    close.sort(reverse=True)
+    return [candidate for _, candidate in close[:FUZZY_MAX_CANDIDATES]]
+
+def _match_expression(terms: List[str], corrections: Dict[str, List[str]]) -> str:
+    groups = []
+    for term in terms:
+        options = [f'"{term}"*'] + [f'"{c}"' for c in corrections.get(term, [])]
+        groups.append("(" + " OR ".join(options) + ")")
+    return " AND ".join(groups)
+
+async def _search_sqlite(db: AsyncSession, terms: List[str], kind: Optional[SearchKind],
+                         limit: int, offset: int) -> List[SearchHit]:
+    corrections = {term: await _corrections(db, term) for term in terms}
+    parity = "" if kind is None else f"AND rowid % 2 = {0 if kind == SearchKind.USER else 1}"
+    rows = (await db.execute(
+        text("SELECT rowid, rank FROM ("
+             f"SELECT rowid, rank FROM search_index WHERE search_index MATCH :match {parity} "
+             "ORDER BY rowid DESC LIMIT :window"
+             ") ORDER BY rank, rowid DESC LIMIT :limit OFFSET :offset"),
+        {"match": _match_expression(terms, corrections), "window": SEARCH_RANK_WINDOW,
+         "limit": limit, "offset": offset},
+    )).all()
+    return [
+        SearchHit(SearchKind.USER if rowid % 2 == 0 else SearchKind.APPOINTMENT, rowid // 2, -rank)
+        for rowid, rank in rows
+    ]
+
+async def _search_postgres(db: AsyncSession, terms: List[str], kind: Optional[SearchKind],
+                           limit: int, offset: int) -> List[SearchHit]:
+    digits = "".join(t for t in terms if t.isdigit())
+    params = {
+        "q": " ".join(terms),
+        "like": "%" + "%".join(terms) + "%",
+        "digits": f"%{digits}%" if digits else None,
+        "limit": limit,
+        "offset": offset,
+    }
+    users = (
+        "SELECT id * 2 AS doc, greatest(similarity(full_name, :q), similarity(coalesce(email, ''), :q), "
+        "CASE WHEN phone_number LIKE :digits THEN 1 ELSE 0 END) AS score FROM users "
+        "WHERE full_name % :q OR full_name ILIKE :like OR email ILIKE :like OR phone_number LIKE :digits"
+    )
+    appointments = (
+        "SELECT id * 2 + 1 AS doc, greatest(similarity(purpose, :q), similarity(host_name, :q)) AS score "
+        "FROM appointments WHERE purpose % :q OR host_name % :q OR purpose ILIKE :like OR host_name ILIKE :like"
+    )
+    parts = [users] if kind == SearchKind.USER else [appointments] if kind == SearchKind.APPOINTMENT else [users, appointments]
+    rows = (await db.execute(
+        text(" UNION ALL ".join(parts) + " ORDER BY score DESC, doc LIMIT :limit OFFSET :offset"), params
+    )).all()
+    return [
+        SearchHit(SearchKind.USER if doc % 2 == 0 else SearchKind.APPOINTMENT, doc // 2, float(score))
+        for doc, score in rows
+    ]
+
+async def search(db: AsyncSession, q: str, kind: Optional[SearchKind] = None,
+                 limit: int = 20, offset: int = 0) -> Tuple[List[SearchResult], bool]:
+    """One page of ranked results and whether more follow."""
+    terms = query_terms(q)
+    limit = min(limit, max(SEARCH_MAX_RESULTS - offset, 0))
+    if not terms or limit == 0:
+        return [], False
+
+    if db.bind.dialect.name == "postgresql":
+        hits = await _search_postgres(db, terms, kind, limit + 1, offset)
+    else:
+        hits = await _search_sqlite(db, terms, kind, limit + 1, offset)
+    has_more = len(hits) > limit
+    return await _hydrate(db, hits[:limit]), has_more
+
+async def _hydrate(db: AsyncSession, hits: List[SearchHit]) -> List[SearchResult]:
+    user_ids = [h.id for h in hits if h.kind == SearchKind.USER]
+    appointment_ids = [h.id for h in hits if h.kind == SearchKind.APPOINTMENT]
+    users = {u.id: u for u in (await db.scalars(
+        select(DBUser).options(load_only(
+            DBUser.full_name, DBUser.phone_number, DBUser.email, DBUser.role, DBUser.is_verified
+        )).where(DBUser.id.in_(user_ids))
+    )).all()} if user_ids else {}
+    appointments = {a.id: a for a in (await db.scalars(
+        appointment_listing_query(DBAppointment.id.in_(appointment_ids))
+    )).unique().all()} if appointment_ids else {}
+
+    results = []
+    for hit in hits:
+        # A row deleted since the index was read is simply skipped
+        if hit.kind == SearchKind.USER and hit.id in users:
+            results.append(SearchResult(kind=hit.kind, id=hit.id, score=hit.score,
+                                        user=UserSummary.model_validate(users[hit.id])))
+        elif hit.kind == SearchKind.APPOINTMENT and hit.id in appointments:
+            results.append(SearchResult(kind=hit.kind, id=hit.id, score=hit.score,
+                                        appointment=to_appointment(appointments[hit.id])))
+    return results
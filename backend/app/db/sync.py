@@ -0,0 +1,240 @@
+"""Delta sync for gate kiosks and guard tablets.
+
+Kiosks keep a local replica of users and appointments and poll for changes:
+
+- Every write to users / appointments gets the next value of a global
+  revision counter, and every delete leaves a tombstone (triggers from
+  migration 0006). get_changes returns the rows and tombstones with a
+  revision above the kiosk's cursor, oldest first, plus the cursor to send
+  next time. Cursor 0 is a full download.
+- Tombstones are pruned after SYNC_RETENTION_DAYS. A kiosk whose cursor is
+  older than the newest pruned tombstone gets 410 and must resync from 0.
+- Check-ins and check-outs recorded while offline are uploaded as one batch.
+  Each operation carries an id generated on the kiosk; applied ids are kept
+  for the same retention period, so re-uploading a batch after a dropped
+  response returns the original outcomes instead of applying anything twice.
+"""
+from fastapi import HTTPException
+from sqlalchemy import delete, func, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import load_only
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+import asyncio
+import logging
+import os
+
+from .models import DBAppointment, DBSyncOperation, DBSyncState, DBSyncTombstone, DBUser
+from .queries import appointment_listing_query, to_appointment
+from .manifest import invalidate_manifest
+from .notifications import notify_host_check_in, wake_notifier
+from .rollups import record_status_change
+from ..core.auth import Principal
+from ..core.database import AsyncSessionLocal
+from ..core.events import publish_appointment
+from ..models.appointment import AppointmentStatus
+from ..models.search import SearchKind
+from ..models.sync import (
+    ChangeSet, OfflineAction, OfflineBatch, OfflineOperation, OfflineOutcome, OfflineResult,
+    SyncAppointment, SyncUser, Tombstone,
+)
+
+SYNC_RETENTION_DAYS = int(os.getenv("SYNC_RETENTION_DAYS", "30"))
+SYNC_PAGE_SIZE = 500
+SYNC_MAX_PAGE_SIZE = 2000
+PRUNE_INTERVAL_SECONDS = 3600
+
+logger = logging.getLogger(__name__)
+
+EVENT_TYPES = {
+    OfflineAction.CHECK_IN: "appointment.checked_in",
+    OfflineAction.CHECK_OUT: "appointment.checked_out",
+}
+
+def to_sync_user(user: DBUser) -> SyncUser:
+    return SyncUser(
+        id=user.id, full_name=user.full_name, phone_number=user.phone_number, email=user.email,
+        role=user.role, is_verified=bool(user.is_verified), has_face_id=user.face_image_path is not None,
+        updated_at=user.updated_at, revision=user.revision,
+    )
+
+def to_sync_appointment(appt: DBAppointment) -> SyncAppointment:
+    return SyncAppointment(
+        **to_appointment(appt).model_dump(),
+        check_in_time=appt.check_in_time, check_out_time=appt.check_out_time,
+        updated_at=appt.updated_at, revision=appt.revision,
+    )
+
+async def get_changes(db: AsyncSession, cursor: int, limit: int = SYNC_PAGE_SIZE) -> ChangeSet:
+    state = await db.scalar(select(DBSyncState).where(DBSyncState.id == 1))
+    if 0 < cursor < state.pruned_revision:
+        raise HTTPException(status_code=410, detail="Sync cursor predates retained deletions; resync from cursor 0")
+
+    # Only revisions committed before this point: on databases where each statement sees newer
+    # commits (PostgreSQL READ COMMITTED), a row committed between the three queries below
+    # could otherwise be skipped by a cursor that moved past it
+    high = state.revision
+    users = (await db.scalars(
+        select(DBUser).options(load_only(
+            DBUser.full_name, DBUser.phone_number, DBUser.email, DBUser.role, DBUser.is_verified,
+            DBUser.face_image_path, DBUser.updated_at, DBUser.revision,
+        ))
+        .where(DBUser.revision > cursor, DBUser.revision <= high)
+        .order_by(DBUser.revision).limit(limit + 1)
+    )).all()
+    appointments = (await db.scalars(
+        appointment_listing_query(DBAppointment.revision > cursor, DBAppointment.revision <= high)
+        .order_by(DBAppointment.revision).limit(limit + 1)
+    )).all()
+    tombstones = (await db.scalars(
+        select(DBSyncTombstone)
+        .where(DBSyncTombstone.revision > cursor, DBSyncTombstone.revision <= high)
+        .order_by(DBSyncTombstone.revision).limit(limit + 1)
+    )).all()
+
+    changes = sorted(
+        [(u.revision, "user", u) for u in users]
+        + [(a.revision, "appointment", a) for a in appointments]
+        + [(t.revision, "tombstone", t) for t in tombstones],
+        key=lambda change: change[0],
+    )
+    has_more = len(changes) > limit
+    changes = changes[:limit]
+    # With nothing left the cursor jumps to the high-water mark, so later polls skip revisions of
+    # rows that have since changed again
+    next_cursor = changes[-1][0] if has_more else max(cursor, high)
+    return ChangeSet(
+        users=[to_sync_user(row) for _, kind, row in changes if kind == "user"],
+        appointments=[to_sync_appointment(row) for _, kind, row in changes if kind == "appointment"],
+        deleted=[Tombstone(kind=SearchKind(row.kind), id=row.entity_id, revision=row.revision)
+                 for _, kind, row in changes if kind == "tombstone"],
+        next_cursor=next_cursor,
+        has_more=has_more,
+    )
+
+def _utc(value: datetime) -> datetime:
+    if value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+def _at(value: Optional[datetime]) -> str:
+    return f" at {value.isoformat()}Z" if value else ""
+
+def _apply(appt: DBAppointment, op: OfflineOperation, occurred_at: datetime) -> Tuple[OfflineOutcome, Optional[str]]:
+    """Apply one operation to the appointment's current state, or explain why it cannot be."""
+    status = AppointmentStatus(appt.status)
+    if op.action == OfflineAction.CHECK_IN:
+        if status == AppointmentStatus.ACCEPTED:
+            appt.status = AppointmentStatus.CHECKED_IN
+            appt.check_in_time = occurred_at
+            return OfflineOutcome.APPLIED, None
+        if status in (AppointmentStatus.CHECKED_IN, AppointmentStatus.COMPLETED):
+            return OfflineOutcome.CONFLICT, f"Visitor was already checked in{_at(appt.check_in_time)}"
+        return OfflineOutcome.CONFLICT, f"Appointment is {status.value}; it must be accepted before check-in"
+
+    if status == AppointmentStatus.CHECKED_IN:
+        appt.status = AppointmentStatus.COMPLETED
+        appt.check_out_time = max(occurred_at, appt.check_in_time or occurred_at)
+        return OfflineOutcome.APPLIED, None
+    if status == AppointmentStatus.COMPLETED:
+        return OfflineOutcome.CONFLICT, f"Visitor was already checked out{_at(appt.check_out_time)}"
+    return OfflineOutcome.CONFLICT, f"Appointment is {status.value}; the visitor is not checked in"
+
+async def _apply_batch(db: AsyncSession, principal: Principal, batch: OfflineBatch):
+    ops: Dict[str, OfflineOperation] = {}
+    for op in batch.operations:
+        ops.setdefault(op.op_id, op)
+
+    seen = {row.op_id: row for row in (await db.scalars(
+        select(DBSyncOperation).where(DBSyncOperation.op_id.in_(list(ops)))
+    )).all()} if ops else {}
+    new_ops = [op for op in ops.values() if op.op_id not in seen]
+    appointment_ids = {op.appointment_id for op in new_ops}
+    appts = {a.id: a for a in (await db.scalars(
+        select(DBAppointment).where(DBAppointment.id.in_(appointment_ids)).with_for_update()
+    )).all()} if appointment_ids else {}
+
+    now = datetime.utcnow()
+    outcomes: Dict[str, Tuple[OfflineOutcome, Optional[str]]] = {}
+    changed: Dict[int, List[str]] = {}
+    # In the order they happened, so a check-in and check-out of one visit queued together both apply
+    for op in sorted(new_ops, key=lambda o: (_utc(o.occurred_at), o.action != OfflineAction.CHECK_IN)):
+        occurred_at = min(_utc(op.occurred_at), now)
+        appt = appts.get(op.appointment_id)
+        if appt is None:
+            outcomes[op.op_id] = (OfflineOutcome.NOT_FOUND, "Appointment not found")
+        else:
+            old_status, old_check_in = appt.status, appt.check_in_time
+            outcomes[op.op_id] = _apply(appt, op, occurred_at)
+            if outcomes[op.op_id][0] == OfflineOutcome.APPLIED:
+                await record_status_change(db, appt, old_status, old_check_in)
+                if op.action == OfflineAction.CHECK_IN:
+                    await notify_host_check_in(db, appt)
+                changed.setdefault(appt.id, []).append(EVENT_TYPES[op.action])
+        db.add(DBSyncOperation(
+            op_id=op.op_id, device_id=batch.device_id, user_id=principal.id,
+            appointment_id=op.appointment_id, action=op.action.value, occurred_at=occurred_at,
+            outcome=outcomes[op.op_id][0].value, detail=outcomes[op.op_id][1], received_at=now,
+        ))
+    await db.commit()
+    return ops, seen, outcomes, changed, appts
+
+async def apply_offline_batch(db: AsyncSession, principal: Principal, batch: OfflineBatch) -> List[OfflineResult]:
+    """Apply a kiosk's queued check-ins / check-outs in one transaction; one result per operation."""
+    try:
+        ops, seen, outcomes, changed, appts = await _apply_batch(db, principal, batch)
+    except IntegrityError:
+        # The same batch was being applied concurrently (a retry racing the original upload);
+        # once that commits, every operation in it is a replay
+        await db.rollback()
+        ops, seen, outcomes, changed, appts = await _apply_batch(db, principal, batch)
+
+    for appt_id, events in changed.items():
+        invalidate_manifest(appts[appt_id].scheduled_time)
+        for event in events:
+            publish_appointment(event, appts[appt_id])
+    if changed:
+        wake_notifier()
+
+    # Fresh state of every appointment mentioned, including revisions assigned by the triggers
+    ids = {op.appointment_id for op in ops.values()}
+    current = {a.id: a for a in (await db.scalars(
+        appointment_listing_query(DBAppointment.id.in_(ids)).execution_options(populate_existing=True)
+    )).unique().all()} if ids else {}
+
+    results = []
+    for op in batch.operations:
+        if op.op_id in seen:
+            outcome, detail, replayed = OfflineOutcome(seen[op.op_id].outcome), seen[op.op_id].detail, True
+        else:
+            (outcome, detail), replayed = outcomes[op.op_id], op is not ops[op.op_id]
+        appt = current.get(op.appointment_id)
+        results.append(OfflineResult(
+            op_id=op.op_id, appointment_id=op.appointment_id, outcome=outcome, detail=detail,
+            replayed=replayed, appointment=to_sync_appointment(appt) if appt else None,
+        ))
+    return results
+
+async def prune_sync_history() -> int:
+    """Drop tombstones and offline operation ids past retention. Returns the number of tombstones dropped."""
+    cutoff = datetime.utcnow() - timedelta(days=SYNC_RETENTION_DAYS)
+    async with AsyncSessionLocal() as db:
+        newest = await db.scalar(select(func.max(DBSyncTombstone.revision)).where(DBSyncTombstone.deleted_at < cutoff))
+        dropped = 0
+        if newest is not None:
+            state = await db.scalar(select(DBSyncState).where(DBSyncState.id == 1))
+            state.pruned_revision = max(state.pruned_revision, newest)
+            dropped = (await db.execute(delete(DBSyncTombstone).where(DBSyncTombstone.revision <= newest))).rowcount
+        await db.execute(delete(DBSyncOperation).where(DBSyncOperation.received_at < cutoff))
+        await db.commit()
+        return dropped
+
+async def run_sync_pruner():
+    """Background loop started by the app."""
+    while True:
+        try:
+            await prune_sync_history()
+        except Exception:
+            logger.exception("Sync pruner error")
+        await asyncio.sleep(PRUNE_INTERVAL_SECONDS)
@@ -0,0 +1,112 @@
+"""Bulk appointment status transitions.
+
+A conference group or a shuttle arriving at the gate checks in hundreds of
+visitors at once. bulk_transition moves a list of appointments to one target
+status in a single transaction: one UPDATE ... RETURNING per allowed source
+status, then rollups, notifications and the per-item outcome for everything
+else from a handful of set-based statements. An appointment whose current
+status does not allow the transition is left alone and reported as a
+conflict.
+"""
+from fastapi import HTTPException
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import datetime
+from typing import Dict, List
+
+from .models import DBAppointment
+from .manifest import invalidate_manifest
+from .notifications import notify_appointment_statuses, notify_hosts_check_in, wake_notifier
+from .rollups import record_status_changes
+from .scheduling import INACTIVE_STATUSES
+from ..core.events import publish_appointment
+from ..core.passes import revoke_passes
+from ..models.appointment import AppointmentStatus, BulkOutcome, BulkResult
+
+# Target status -> statuses an appointment may move to it from in bulk. Reactivating a cancelled
+# or rejected booking needs a slot check per appointment, so it stays with the single-item endpoint.
+BULK_TRANSITIONS = {
+    AppointmentStatus.ACCEPTED: [AppointmentStatus.PENDING],
+    AppointmentStatus.REJECTED: [AppointmentStatus.PENDING, AppointmentStatus.ACCEPTED],
+    AppointmentStatus.CANCELLED: [AppointmentStatus.PENDING, AppointmentStatus.ACCEPTED, AppointmentStatus.BLOCKED],
+    AppointmentStatus.CHECKED_IN: [AppointmentStatus.ACCEPTED],
+    AppointmentStatus.COMPLETED: [AppointmentStatus.CHECKED_IN],
+}
+
+EVENT_TYPES = {
+    AppointmentStatus.CHECKED_IN: "appointment.checked_in",
+    AppointmentStatus.COMPLETED: "appointment.checked_out",
+}
+
+RETURNED_COLUMNS = [
+    DBAppointment.id, DBAppointment.visitor_id, DBAppointment.host_id, DBAppointment.host_name,
+    DBAppointment.purpose, DBAppointment.status, DBAppointment.scheduled_time, DBAppointment.duration_minutes,
+    DBAppointment.check_in_time, DBAppointment.check_out_time,
+]
+
+async def bulk_transition(db: AsyncSession, appointment_ids: List[int], target: AppointmentStatus) -> List[BulkResult]:
+    """Move appointments to `target` in one transaction; one result per requested id, in request order."""
+    sources = BULK_TRANSITIONS.get(target)
+    if not sources:
+        raise HTTPException(status_code=400, detail=f"Appointments cannot be moved to {target.value} in bulk")
+
+    now = datetime.utcnow()
+    values = {"status": target.value}
+    if target == AppointmentStatus.CHECKED_IN:
+        values["check_in_time"] = now
+    elif target == AppointmentStatus.COMPLETED:
+        values["check_out_time"] = now
+
+    remaining = list(dict.fromkeys(appointment_ids))
+    changed = []
+    for source in sources:
+        if not remaining:
+            break
+        rows = (await db.execute(
+            update(DBAppointment)
+            .where(DBAppointment.id.in_(remaining), DBAppointment.status == source.value)
+            .values(**values)
+            .returning(*RETURNED_COLUMNS)
+            .execution_options(synchronize_session=False)
+        )).all()
+        if rows:
+            await record_status_changes(db, rows, source)
+            done = {row.id for row in rows}
+            remaining = [i for i in remaining if i not in done]
+            changed += rows
+
+    current: Dict[int, str] = dict((await db.execute(
+        select(DBAppointment.id, DBAppointment.status).where(DBAppointment.id.in_(remaining))
+    )).all()) if remaining else {}
+
+    if target == AppointmentStatus.CHECKED_IN:
+        await notify_hosts_check_in(db, changed)
+    else:
+        await notify_appointment_statuses(db, changed)
+    await db.commit()
+
+    invalidate_manifest(*{row.scheduled_time for row in changed})
+    if target in INACTIVE_STATUSES:
+        revoke_passes(row.id for row in changed)
+    event_type = EVENT_TYPES.get(target, "appointment.status_changed")
+    for row in changed:
+        publish_appointment(event_type, row)
+    if changed:
+        wake_notifier()
+
+    results: Dict[int, BulkResult] = {
+        row.id: BulkResult(appointment_id=row.id, outcome=BulkOutcome.APPLIED, status=target) for row in changed
+    }
+    allowed = ", ".join(s.value for s in sources)
+    for appointment_id in remaining:
+        if appointment_id not in current:
+            results[appointment_id] = BulkResult(
+                appointment_id=appointment_id, outcome=BulkOutcome.NOT_FOUND, detail="Appointment not found"
+            )
+        else:
+            status = AppointmentStatus(current[appointment_id])
+            results[appointment_id] = BulkResult(
+                appointment_id=appointment_id, outcome=BulkOutcome.CONFLICT, status=status,
+                detail=f"Appointment is {status.value}; only {allowed} can move to {target.value}",
+            )
+    return [results[appointment_id] for appointment_id in appointment_ids]
@@ -1,19 +1,28 @@
 from fastapi import FastAPI
+import asyncio
 from fastapi.middleware.cors import CORSMiddleware
+from sqlalchemy import select
 from .api.auth import router as auth_router
 from .api.admin import router as admin_router
 from .api.visitors import router as visitor_router
 from .api.employees import router as employee_router
 from .api.security import router as security_router
-from .db import models
+from .api.uploads import router as upload_router
+from .api.events import router as event_router
+from .api.sync import router as sync_router
+from .db.migrations import pending_migrations
 from .db.models import DBUser
-from .core.database import SessionLocal, engine, Base
-from .core.security import get_password_hash
+from .core.database import AsyncSessionLocal, async_engine
+from .core.security import default_password_hash
+from .core.config import CALENDAR_REFRESH_MINUTES
+from .db.calendars import run_calendar_refresher
+from .core.otp import run_otp_sweeper
+from .db.notifications import NOTIFICATION_WORKERS, run_notification_worker
+from .db.sync import run_sync_pruner
+from .db.passes import run_pass_revocation_loader
+from .db.images import run_face_image_gc
 from .models.user import UserRole
 
-# Create tables
-Base.metadata.create_all(bind=engine)
-
 app = FastAPI(
     title="Visitor Management System API",
     description="Backend for managing visitors in a facility",
@@ -22,26 +31,47 @@ app = FastAPI(
 
 @app.on_event("startup")
 async def startup_event():
-    db = SessionLocal()
-    try:
+    async with async_engine.connect() as conn:
+        pending = await conn.run_sync(pending_migrations)
+    if pending:
+        raise RuntimeError(
+            f"Database schema is behind by {len(pending)} migration(s); run `python migrate.py` first"
+        )
+
+    async with AsyncSessionLocal() as db:
         # Check if admin exists
-        admin = db.query(DBUser).filter(DBUser.role == UserRole.ADMIN).first()
+        admin = await db.scalar(select(DBUser).where(DBUser.role == UserRole.ADMIN))
         if not admin:
             admin_user = DBUser(
                 full_name="System Admin",
                 phone_number="+910000000000",
                 email="admin@vms.com",
-                hashed_password=get_password_hash("admin123"),
+                hashed_password=await default_password_hash(),
                 address={"street": "Main St", "city": "HQ", "state": "TX", "pincode": "123456"},
                 role=UserRole.ADMIN,
                 is_verified=True,
                 password_reset_required=False
             )
             db.add(admin_user)
-            db.commit()
+            await db.commit()
             print("Seeded initial admin user.")
-    finally:
-        db.close()
+
+    app.state.otp_sweeper = asyncio.create_task(run_otp_sweeper())
+    app.state.sync_pruner = asyncio.create_task(run_sync_pruner())
+    app.state.pass_revocation_loader = asyncio.create_task(run_pass_revocation_loader())
+    app.state.face_image_gc = asyncio.create_task(run_face_image_gc())
+    app.state.notification_workers = [asyncio.create_task(run_notification_worker()) for _ in range(NOTIFICATION_WORKERS)]
+    if CALENDAR_REFRESH_MINUTES > 0:
+        app.state.calendar_refresher = asyncio.create_task(run_calendar_refresher(CALENDAR_REFRESH_MINUTES * 60))
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    for name in ("otp_sweeper", "sync_pruner", "pass_revocation_loader", "face_image_gc", "calendar_refresher"):
+        task = getattr(app.state, name, None)
+        if task:
+            task.cancel()
+    for task in getattr(app.state, "notification_workers", []):
+        task.cancel()
 
 # Configure CORS
 app.add_middleware(
@@ -60,6 +90,9 @@ app.include_router(admin_router, prefix="/api/v1/admin", tags=["admin"])
 app.include_router(visitor_router, prefix="/api/v1/visitors", tags=["visitors"])
 app.include_router(employee_router, prefix="/api/v1/employees", tags=["employees"])
 app.include_router(security_router, prefix="/api/v1/security", tags=["security"])
+app.include_router(upload_router, prefix="/api/v1/uploads", tags=["uploads"])
+app.include_router(event_router, prefix="/api/v1/events", tags=["events"])
+app.include_router(sync_router, prefix="/api/v1/sync", tags=["sync"])
 
 @app.get("/")
 async def root():
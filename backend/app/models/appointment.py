@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from enum import Enum
 from datetime import datetime
 from typing import Optional, List
@@ -18,6 +18,7 @@ class AppointmentStatus(str, Enum):
 
 class AppointmentBase(BaseModel):
     host_name: str
+    host_id: Optional[int] = None # Resolved from host_name when omitted
     purpose: str
     appointment_type: AppointmentType
     scheduled_time: datetime
@@ -46,3 +47,25 @@ class Appointment(AppointmentBase):
 
     class Config:
         from_attributes = True
+
+class TimeSlot(BaseModel):
+    start: datetime
+    end: datetime
+    duration_minutes: int
+
+class BulkAppointmentIds(BaseModel):
+    appointment_ids: List[int] = Field(..., min_length=1, max_length=2000)
+
+class BulkStatusUpdate(BulkAppointmentIds):
+    status: AppointmentStatus
+
+class BulkOutcome(str, Enum):
+    APPLIED = "applied"
+    CONFLICT = "conflict"  # the appointment's current status does not allow the transition
+    NOT_FOUND = "not_found"
+
+class BulkResult(BaseModel):
+    appointment_id: int
+    outcome: BulkOutcome
+    status: Optional[AppointmentStatus] = None  # current status after the batch
+    detail: Optional[str] = None
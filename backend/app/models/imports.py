@@ -0,0 +1,25 @@
+from pydantic import BaseModel
+from enum import Enum
+from typing import List, Optional
+from .appointment import AppointmentBase, AppointmentType, VisitorInfo
+
+class ImportFormat(str, Enum):
+    CSV = "csv"
+    NDJSON = "ndjson"
+
+class ImportRow(AppointmentBase):
+    host_name: Optional[str] = None  # defaults to the importing staff member
+    appointment_type: AppointmentType = AppointmentType.PRE_PLANNED
+    visitor_info: VisitorInfo
+
+class ImportRowError(BaseModel):
+    line: int  # 1-based line in the uploaded file where the row starts
+    errors: List[str]
+
+class ImportSummary(BaseModel):
+    rows: int = 0
+    appointments_created: int = 0
+    visitors_created: int = 0
+    visitors_matched: int = 0
+    error_count: int = 0
+    errors: List[ImportRowError] = []  # the first IMPORT_MAX_REPORTED_ERRORS of them
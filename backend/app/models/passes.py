@@ -0,0 +1,24 @@
+from pydantic import BaseModel, Field
+from datetime import datetime
+from typing import Optional
+from .appointment import AppointmentStatus
+
+class VisitorPass(BaseModel):
+    appointment_id: int
+    token: str  # what the QR code encodes
+    valid_from: datetime  # UTC
+    valid_until: datetime
+    qr_url: str  # PNG of the QR code, relative to the API root
+
+class PassScan(BaseModel):
+    token: str = Field(..., min_length=1, max_length=128)
+
+class PassCheckIn(BaseModel):
+    appointment_id: int
+    visitor_id: int
+    visitor_name: Optional[str] = None  # for the guard to compare against the person at the gate
+    host_name: str
+    purpose: str
+    scheduled_time: datetime
+    status: AppointmentStatus
+    check_in_time: datetime
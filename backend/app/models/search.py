@@ -0,0 +1,26 @@
+from pydantic import BaseModel
+from enum import Enum
+from typing import Optional
+from .appointment import Appointment
+
+class SearchKind(str, Enum):
+    USER = "user"
+    APPOINTMENT = "appointment"
+
+class UserSummary(BaseModel):
+    id: int
+    full_name: Optional[str] = None
+    phone_number: Optional[str] = None
+    email: Optional[str] = None
+    role: Optional[str] = None
+    is_verified: bool = False
+
+    class Config:
+        from_attributes = True
+
+class SearchResult(BaseModel):
+    kind: SearchKind
+    id: int
+    score: float  # higher is a better match; only comparable within one result list
+    user: Optional[UserSummary] = None
+    appointment: Optional[Appointment] = None
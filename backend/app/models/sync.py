@@ -0,0 +1,56 @@
+from pydantic import BaseModel, Field
+from enum import Enum
+from datetime import datetime
+from typing import List, Optional
+from .appointment import Appointment
+from .search import SearchKind, UserSummary
+
+class SyncUser(UserSummary):
+    has_face_id: bool = False
+    updated_at: Optional[datetime] = None
+    revision: int
+
+class SyncAppointment(Appointment):
+    check_in_time: Optional[datetime] = None
+    check_out_time: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+    revision: int
+
+class Tombstone(BaseModel):
+    kind: SearchKind
+    id: int
+    revision: int
+
+class ChangeSet(BaseModel):
+    users: List[SyncUser]
+    appointments: List[SyncAppointment]
+    deleted: List[Tombstone]
+    next_cursor: int  # pass back as `cursor`; covers everything in this response
+    has_more: bool
+
+class OfflineAction(str, Enum):
+    CHECK_IN = "check_in"
+    CHECK_OUT = "check_out"
+
+class OfflineOperation(BaseModel):
+    op_id: str = Field(..., min_length=1, max_length=64)  # generated on the kiosk, e.g. a UUID
+    appointment_id: int
+    action: OfflineAction
+    occurred_at: datetime  # when the guard recorded it; naive values are UTC
+
+class OfflineBatch(BaseModel):
+    device_id: str = Field(..., min_length=1, max_length=64)
+    operations: List[OfflineOperation] = Field(..., max_length=500)
+
+class OfflineOutcome(str, Enum):
+    APPLIED = "applied"
+    CONFLICT = "conflict"  # the appointment's current state did not allow it; see detail and appointment
+    NOT_FOUND = "not_found"
+
+class OfflineResult(BaseModel):
+    op_id: str
+    appointment_id: int
+    outcome: OfflineOutcome
+    detail: Optional[str] = None
+    replayed: bool = False  # already received in an earlier upload; outcome is the original one
+    appointment: Optional[SyncAppointment] = None
@@ -48,7 +48,7 @@ class UserCreate(BaseModel):
     email: Optional[EmailStr] = None
     address: UserAddress
     role: Optional[UserRole] = UserRole.VISITOR
-    face_image: Optional[str] = None  # Base64 data from frontend
+    face_image: Optional[str] = None  # Base64 data URL, or "upload:<id>" from /uploads/faces
 
 class UserUpdate(BaseModel):
     full_name: Optional[str] = None
@@ -96,6 +96,10 @@ class FaceLoginRequest(BaseModel):
     phone_number: str
     face_image: str  # Base64 data from frontend
 
+class FaceIdentifyRequest(BaseModel):
+    face_image: str  # Base64 data from frontend
+    top_k: int = 1
+
 class OTPVerify(BaseModel):
     phone_number: str
     otp: str
@@ -20,3 +20,24 @@ class Visitor(VisitorBase):
 
     class Config:
         from_attributes = True
+
+class VisitorStats(BaseModel):
+    appointment_count: int = 0
+    open_count: int = 0  # pending or accepted bookings
+    visit_count: int = 0  # checked in at least once (checked_in or completed)
+    checked_in: bool = False  # on site right now
+    last_visit_at: Optional[datetime] = None  # latest check-in
+
+class VisitorProfileSummary(BaseModel):
+    id: int
+    full_name: str
+    phone_number: str
+    email: Optional[str] = None
+    is_verified: bool = False
+    has_face_id: bool = False
+    address: Optional[dict] = None
+    role: str
+
+class VisitorProfile(BaseModel):
+    profile: VisitorProfileSummary
+    stats: VisitorStats
@@ -0,0 +1,63 @@
+"""Per-request cost of bearer-token authentication.
+
+Times get_current_principal in-process against the seeded admin: with the
+principal cached, with the cache cleared before every call, and the bare
+JWT decode. The old per-request DBUser role lookup is timed for comparison.
+
+    python benchmarks/auth_overhead.py --iterations 5000
+"""
+import argparse
+import asyncio
+import time
+
+import common
+
+async def run(iterations: int):
+    from fastapi.security import HTTPAuthorizationCredentials
+    from jose import jwt
+    from sqlalchemy import select
+
+    from app.core import auth
+    from app.core.database import AsyncSessionLocal
+    from app.core.security import create_access_token
+    from app.db.models import DBUser
+
+    token = create_access_token({"sub": "+910000000000", "role": "admin"})
+    credentials = HTTPAuthorizationCredentials(scheme="Bearer", credentials=token)
+
+    async def timed(call):
+        started = time.perf_counter()
+        for _ in range(iterations):
+            await call()
+        return (time.perf_counter() - started) / iterations * 1e6
+
+    async with AsyncSessionLocal() as db:
+        await auth.get_current_principal(credentials, db)
+
+        async def decode():
+            jwt.decode(token, auth.SECRET_KEY, algorithms=[auth.ALGORITHM])
+
+        async def cached():
+            await auth.get_current_principal(credentials, db)
+
+        async def miss():
+            auth._principals.clear()
+            await auth.get_current_principal(credentials, db)
+
+        async def role_lookup():
+            await db.scalar(select(DBUser).where(DBUser.id == 1))
+
+        for label, call in (("jwt.decode only", decode), ("cached principal", cached),
+                            ("cache miss", miss), ("old DBUser lookup", role_lookup)):
+            print(f"{label:>18}: {await timed(call):7.1f}us per request")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=5000)
+    args = parser.parse_args()
+
+    common.migrate_db()
+    asyncio.run(run(args.iterations))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+"""Bulk check-in and check-out versus one request per appointment.
+
+Seeds 2 x --appointments accepted appointments, checks the first half in
+with one POST /security/check-in/batch and the second half with sequential
+single POST /security/check-in/{id} calls, then checks the first half out
+in one batch.
+
+    python benchmarks/bulk_checkin.py --appointments 1000
+"""
+import argparse
+import time
+
+import common
+
+import httpx
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--appointments", type=int, default=1000)
+    args = parser.parse_args()
+    count = args.appointments
+
+    common.migrate_db()
+    common.seed_appointments(2 * count, common.seed_visitors(2 * count), status="accepted")
+    common.rebuild_rollups()
+    with common.server() as base_url:
+        headers = common.staff_headers(base_url)
+        with httpx.Client(base_url=base_url, headers=headers, timeout=300) as client:
+            batch = list(range(1, count + 1))
+
+            started = time.perf_counter()
+            r = client.post("/security/check-in/batch", json={"appointment_ids": batch})
+            elapsed = time.perf_counter() - started
+            r.raise_for_status()
+            applied = sum(item["outcome"] == "applied" for item in r.json())
+            print(f"batch check-in:   {applied}/{count} applied in {elapsed * 1000:.0f}ms (one request)")
+
+            started = time.perf_counter()
+            for appointment_id in range(count + 1, 2 * count + 1):
+                client.post(f"/security/check-in/{appointment_id}").raise_for_status()
+            print(f"single check-ins: {count} requests in {(time.perf_counter() - started) * 1000:.0f}ms")
+
+            started = time.perf_counter()
+            r = client.post("/security/check-out/batch", json={"appointment_ids": batch})
+            elapsed = time.perf_counter() - started
+            r.raise_for_status()
+            applied = sum(item["outcome"] == "applied" for item in r.json())
+            print(f"batch check-out:  {applied}/{count} applied in {elapsed * 1000:.0f}ms (one request)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""Write contention: many concurrent single check-ins against uvicorn workers.
+
+Seeds --check-ins accepted appointments and posts /security/check-in/{id}
+for all of them with --concurrency requests in flight across --workers
+processes, while --readers clients poll /security/recent-activity. Reports
+throughput, latency and any non-200 responses (before WAL and the sized
+pool these included 500 "database is locked").
+
+    python benchmarks/checkin_contention.py --concurrency 64 --workers 2
+"""
+import argparse
+import asyncio
+from collections import Counter
+import time
+
+import common
+
+import httpx
+
+async def run(base_url: str, args):
+    async with httpx.AsyncClient(base_url=base_url, timeout=120,
+                                 limits=httpx.Limits(max_connections=args.concurrency + args.readers)) as client:
+        semaphore = asyncio.Semaphore(args.concurrency)
+        writes, reads, codes = [], [], Counter()
+        done = False
+
+        async def check_in(appointment_id: int):
+            async with semaphore:
+                started = time.perf_counter()
+                r = await client.post(f"/security/check-in/{appointment_id}")
+                writes.append(time.perf_counter() - started)
+                codes[r.status_code if r.status_code != 500 else f"500 {r.text[:40]}"] += 1
+
+        async def reader():
+            while not done:
+                started = time.perf_counter()
+                await client.get("/security/recent-activity")
+                reads.append(time.perf_counter() - started)
+
+        readers = [asyncio.create_task(reader()) for _ in range(args.readers)]
+        started = time.perf_counter()
+        await asyncio.gather(*(check_in(i) for i in range(1, args.check_ins + 1)))
+        elapsed = time.perf_counter() - started
+        done = True
+        await asyncio.gather(*readers)
+
+    print(f"{args.check_ins} check-ins, {args.concurrency} in flight, {args.workers} workers: "
+          f"{elapsed:.1f}s, {args.check_ins / elapsed:.0f} req/s, {common.summary(writes)}")
+    print(f"responses: {dict(codes)}")
+    if reads:
+        print(f"{args.readers} readers: {len(reads)} requests, {common.summary(reads)}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--check-ins", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--readers", type=int, default=2)
+    args = parser.parse_args()
+
+    common.migrate_db()
+    common.seed_appointments(args.check_ins, common.seed_visitors(100), status="accepted")
+    common.rebuild_rollups()
+    with common.server(workers=args.workers) as base_url:
+        asyncio.run(run(base_url, args))
+    conn = common.connect()
+    checked_in = conn.execute("SELECT count(*) FROM appointments WHERE status = 'checked_in'").fetchone()[0]
+    print(f"appointments checked in: {checked_in}")
+
+if __name__ == "__main__":
+    main()
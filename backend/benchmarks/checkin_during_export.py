@@ -0,0 +1,82 @@
+"""Check-in latency at the security desk while a large report export runs.
+
+Seeds --appointments completed appointments for the export and --check-ins
+accepted ones, then checks in half of the accepted ones on an idle server and
+the other half while /admin/reports/appointments/csv streams the whole
+table. With the async session the p99 should stay roughly flat.
+
+    python benchmarks/checkin_during_export.py --appointments 200000
+"""
+import argparse
+import asyncio
+import time
+
+import common
+
+import httpx
+
+WARMUP = 20
+
+async def check_in(client: httpx.AsyncClient, ids, concurrency: int):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(appointment_id: int):
+        async with semaphore:
+            started = time.perf_counter()
+            r = await client.post(f"/security/check-in/{appointment_id}")
+            r.raise_for_status()
+            latencies.append(time.perf_counter() - started)
+
+    await asyncio.gather(*(one(i) for i in ids))
+    return latencies
+
+async def export(client: httpx.AsyncClient, headers: dict):
+    started, size = time.perf_counter(), 0
+    async with client.stream("GET", "/admin/reports/appointments/csv", headers=headers) as response:
+        response.raise_for_status()
+        async for chunk in response.aiter_bytes():
+            size += len(chunk)
+    return time.perf_counter() - started, size
+
+async def run(base_url: str, args, first_id: int):
+    headers = common.staff_headers(base_url)
+    half = args.check_ins // 2
+    warmup_ids = range(first_id, first_id + WARMUP)
+    idle_ids = range(first_id + WARMUP, first_id + half)
+    busy_ids = range(first_id + half, first_id + args.check_ins)
+    async with httpx.AsyncClient(base_url=base_url, timeout=600) as client:
+        # Connection pools, caches and the notification worker start up on the first requests
+        await check_in(client, warmup_ids, args.concurrency)
+        idle = await check_in(client, idle_ids, args.concurrency)
+        print(f"idle:          {len(idle)} check-ins  {common.summary(idle)}")
+
+        exporting = asyncio.create_task(export(client, headers))
+        await asyncio.sleep(0.2)  # let the export get going
+        started = time.perf_counter()
+        busy = await check_in(client, busy_ids, args.concurrency)
+        print(f"check-in phase took {time.perf_counter() - started:.1f}s")
+        still_running = not exporting.done()
+        print(f"during export: {len(busy)} check-ins  {common.summary(busy)}"
+              f"{'' if still_running else '  (export finished first; use more --appointments)'}")
+        seconds, size = await exporting
+        print(f"export: {args.appointments} rows, {size / 1e6:.1f} MB in {seconds:.1f}s")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--appointments", type=int, default=200_000)
+    parser.add_argument("--check-ins", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=8)
+    args = parser.parse_args()
+
+    common.migrate_db()
+    visitors = common.seed_visitors(1000)
+    common.seed_appointments(args.appointments, visitors, status="completed")
+    first_id = args.appointments + 1
+    common.seed_appointments(args.check_ins, visitors, status="accepted")
+    common.rebuild_rollups()
+    with common.server() as base_url:
+        asyncio.run(run(base_url, args, first_id))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""Shared setup for the benchmark scripts.
+
+Every benchmark runs against a throwaway SQLite database and storage
+directory in a temp dir, never against vms.db. Import this module before
+anything from app/: the engine and storage paths are read at import time.
+"""
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Iterable, List, Sequence
+import atexit
+import os
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WORKDIR = tempfile.mkdtemp(prefix="vms-bench-")
+DB_PATH = os.path.join(WORKDIR, "vms.db")
+
+os.environ["DATABASE_URL"] = f"sqlite:///{DB_PATH}"
+os.environ.setdefault("CALENDAR_REFRESH_MINUTES", "0")
+os.environ.setdefault("NOTIFICATION_TRANSPORT", "file")
+os.environ.setdefault("NOTIFICATION_FILE_PATH", os.path.join(WORKDIR, "notifications.log"))
+sys.path.insert(0, BACKEND_DIR)
+os.chdir(WORKDIR)
+atexit.register(shutil.rmtree, WORKDIR, ignore_errors=True)
+
+ADMIN_EMAIL, ADMIN_PASSWORD = "admin@vms.com", "admin123"
+SERVER_PORT = int(os.getenv("BENCH_PORT", "8765"))
+INSERT_CHUNK = 10_000
+
+def migrate_db():
+    """Create the schema and the seeded admin (user id 1)."""
+    subprocess.run([sys.executable, os.path.join(BACKEND_DIR, "migrate.py")], check=True, stdout=subprocess.DEVNULL)
+
+def connect() -> sqlite3.Connection:
+    return sqlite3.connect(DB_PATH)
+
+def _insert(sql: str, rows: Iterable[Sequence]):
+    conn = connect()
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == INSERT_CHUNK:
+            conn.executemany(sql, batch)
+            batch.clear()
+    conn.executemany(sql, batch)
+    conn.commit()
+    conn.close()
+
+def seed_visitors(count: int, prefix: str = "Visitor") -> List[int]:
+    """Insert `count` visitors and return their ids."""
+    conn = connect()
+    first = (conn.execute("SELECT coalesce(max(id), 0) FROM users").fetchone()[0]) + 1
+    conn.close()
+    now = datetime.utcnow()
+    _insert(
+        "INSERT INTO users (id, full_name, phone_number, email, address, role, is_verified, password_reset_required, created_at) "
+        "VALUES (?, ?, ?, ?, '{}', 'visitor', 1, 0, ?)",
+        ((first + i, f"{prefix} {first + i}", f"+9170{first + i:08d}", f"visitor{first + i}@example.com", now)
+         for i in range(count)),
+    )
+    return list(range(first, first + count))
+
+def seed_appointments(count: int, visitor_ids: Sequence[int], status: str = "accepted",
+                      start: datetime = None, step: timedelta = timedelta(minutes=1), host_id: int = 1,
+                      duration_minutes: int = 30):
+    """Insert `count` appointments for host_id, cycling through visitor_ids, one every `step`."""
+    start = start or datetime.utcnow().replace(microsecond=0)
+    now = datetime.utcnow()
+    _insert(
+        "INSERT INTO appointments (visitor_id, host_id, host_name, purpose, appointment_type, status, scheduled_time, "
+        "duration_minutes, created_at, check_in_time, check_out_time) "
+        "VALUES (?, ?, 'System Admin', 'Benchmark', 'pre_planned', ?, ?, ?, ?, ?, ?)",
+        ((visitor_ids[i % len(visitor_ids)], host_id, status, start + step * i, duration_minutes, now,
+          start + step * i if status in ("checked_in", "completed") else None,
+          start + step * i + timedelta(minutes=duration_minutes) if status == "completed" else None)
+         for i in range(count)),
+    )
+
+def rebuild_rollups():
+    """Bring the rollup and visitor stats tables in line with rows inserted directly."""
+    from sqlalchemy.orm import Session
+    from app.core.database import engine
+    from app.db.rollups import rebuild_rollups as rebuild, rebuild_visitor_stats
+    with Session(engine) as db:
+        rebuild(db)
+        rebuild_visitor_stats(db)
+
+def percentile(values: Sequence[float], p: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p))]
+
+def summary(latencies: Sequence[float]) -> str:
+    return (f"p50 {percentile(latencies, 0.5) * 1000:.1f}ms  p99 {percentile(latencies, 0.99) * 1000:.1f}ms  "
+            f"max {max(latencies) * 1000:.1f}ms")
+
+@contextmanager
+def server(workers: int = 1, **env):
+    """Run uvicorn on SERVER_PORT against the benchmark database; yields the API base URL."""
+    import httpx
+
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--app-dir", BACKEND_DIR, "--port", str(SERVER_PORT),
+         "--workers", str(workers), "--log-level", "warning"],
+        env={**os.environ, **{k: str(v) for k, v in env.items()}},
+        stdout=subprocess.DEVNULL, stderr=open(os.path.join(WORKDIR, "server.log"), "w"),
+    )
+    base = f"http://127.0.0.1:{SERVER_PORT}"
+    try:
+        for _ in range(150):
+            try:
+                if httpx.get(f"{base}/health").status_code == 200:
+                    break
+            except httpx.HTTPError:
+                time.sleep(0.2)
+        else:
+            raise RuntimeError("Server did not start; see server.log")
+        yield f"{base}/api/v1"
+    finally:
+        process.terminate()
+        process.wait()
+
+def staff_headers(base_url: str) -> dict:
+    import httpx
+
+    r = httpx.post(f"{base_url}/auth/login/staff", json={"email": ADMIN_EMAIL, "password": ADMIN_PASSWORD}, timeout=60)
+    r.raise_for_status()
+    return {"Authorization": f"Bearer {r.json()['access_token']}"}
@@ -0,0 +1,65 @@
+"""Booking conflict check latency with a year of appointments for one host.
+
+Seeds --appointments back-to-back appointments for host 1 spread over a
+year and times find_conflict (the check reserve_slot runs for every booking)
+through the async session, for random slots that do and do not overlap an
+existing booking. A free slot also checks the host's calendar busy time,
+so it costs a second query.
+
+    python benchmarks/conflict_check.py --appointments 100000
+"""
+import argparse
+import asyncio
+from datetime import datetime, timedelta
+import random
+import time
+
+import common
+
+async def run(args, start: datetime, step: timedelta):
+    from app.core.database import AsyncSessionLocal
+    from app.db.scheduling import find_conflict
+
+    random.seed(13)
+    booked = timedelta(minutes=args.duration)
+    gap = step - booked
+    assert gap > timedelta(seconds=2), "appointments leave no free gap; lower --duration"
+
+    def overlapping():
+        slot = start + random.random() * step * args.appointments
+        return slot, slot + timedelta(minutes=30)
+
+    def free():
+        # Strictly inside the gap after a random booking
+        slot = start + step * random.randrange(args.appointments) + booked + timedelta(seconds=1)
+        return slot, slot + gap - timedelta(seconds=2)
+
+    async with AsyncSessionLocal() as db:
+        await find_conflict(db, 1, None, *overlapping())
+        for label, pick in (("overlapping", overlapping), ("free", free)):
+            latencies, conflicts = [], 0
+            for _ in range(args.checks):
+                slot_start, slot_end = pick()
+                started = time.perf_counter()
+                conflict = await find_conflict(db, 1, None, slot_start, slot_end)
+                latencies.append(time.perf_counter() - started)
+                conflicts += conflict is not None
+            print(f"{label:>11}: {args.checks} checks, {conflicts} conflicts, "
+                  f"median {common.percentile(latencies, 0.5) * 1e6:.0f}us  p99 {common.percentile(latencies, 0.99) * 1e6:.0f}us")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--appointments", type=int, default=100_000)
+    parser.add_argument("--checks", type=int, default=5000)
+    parser.add_argument("--duration", type=int, default=5, help="minutes per seeded appointment")
+    args = parser.parse_args()
+
+    common.migrate_db()
+    start = datetime.utcnow().replace(second=0, microsecond=0) + timedelta(days=1)
+    step = timedelta(days=365) / args.appointments
+    common.seed_appointments(args.appointments, common.seed_visitors(1000), start=start, step=step,
+                             duration_minutes=args.duration)
+    asyncio.run(run(args, start, step))
+
+if __name__ == "__main__":
+    main()
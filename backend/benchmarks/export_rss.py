@@ -0,0 +1,64 @@
+"""Peak memory of the streaming appointment export.
+
+Seeds --appointments rows and streams them through stream_appointments_csv
+(or _ndjson) in-process, discarding the output. Resident memory is sampled
+after every chunk and split into anonymous and file-backed memory. Both
+include SQLite's own caches, which fill up to their configured sizes and
+then stop growing: the memory-mapped file (SQLITE_MMAP_SIZE, 256 MiB) is
+file-backed, and pages read past it go through the page cache
+(SQLITE_CACHE_SIZE_KB, 64 MiB), which is anonymous. To see the export's own
+footprint, shrink both:
+
+    SQLITE_MMAP_SIZE=0 SQLITE_CACHE_SIZE_KB=2048 python benchmarks/export_rss.py --appointments 1000000
+"""
+import argparse
+import asyncio
+import time
+from typing import Tuple
+
+import common
+
+def rss_mb() -> Tuple[float, float]:
+    """(anonymous, file-backed) resident memory in MiB."""
+    fields = {}
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith(("RssAnon:", "RssFile:")):
+                name, kb, _ = line.split()
+                fields[name] = int(kb) / 1024
+    return fields["RssAnon:"], fields["RssFile:"]
+
+async def run(args):
+    from app.db.exports import stream_appointments_csv, stream_appointments_ndjson
+
+    stream = stream_appointments_ndjson if args.format == "ndjson" else stream_appointments_csv
+    checkpoints = {args.appointments * n // 10 for n in (1, 2, 5, 10)}
+    baseline, file_backed = rss_mb()
+    print(f"before export: anonymous {baseline:.0f} MiB, file-backed {file_backed:.0f} MiB")
+    started, rows, size, peak = time.perf_counter(), 0, 0, baseline
+    async for chunk in stream():
+        rows += chunk.count("\n")
+        size += len(chunk)
+        anonymous, file_backed = rss_mb()
+        peak = max(peak, anonymous)
+        for mark in sorted(c for c in checkpoints if rows >= c):
+            checkpoints.discard(mark)
+            print(f"{mark:>9} rows: anonymous {anonymous:.0f} MiB (peak {peak:.0f}), file-backed {file_backed:.0f} MiB")
+    elapsed = time.perf_counter() - started
+    print(f"exported {rows} lines ({size / 2 ** 20:.0f} MiB of {args.format}) in {elapsed:.1f}s; "
+          f"peak anonymous RSS {peak:.0f} MiB (+{peak - baseline:.0f} MiB over the baseline)")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--appointments", type=int, default=1_000_000)
+    parser.add_argument("--format", choices=["csv", "ndjson"], default="csv")
+    args = parser.parse_args()
+
+    common.migrate_db()
+    started = time.perf_counter()
+    common.seed_appointments(args.appointments, common.seed_visitors(10_000), status="completed")
+    print(f"seeded {args.appointments} appointments in {time.perf_counter() - started:.0f}s")
+    asyncio.run(run(args))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""Bulk import throughput.
+
+Writes a --rows line CSV in which half the rows name visitors already in the
+database (matched by phone) and half are new, then imports it with the same
+pipeline as POST /employees/import and import_appointments.py, reporting
+the wall time and the summary.
+
+    python benchmarks/import_throughput.py --rows 100000
+"""
+import argparse
+import asyncio
+import csv
+from datetime import datetime, timedelta
+import os
+import time
+
+import common
+
+def write_csv(path: str, rows: int, existing_phones):
+    start = datetime.utcnow().replace(microsecond=0) + timedelta(days=1)
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["full_name", "phone_number", "email", "street", "city", "state", "pincode",
+                         "host_name", "purpose", "scheduled_time", "duration_minutes"])
+        for i in range(rows):
+            if i % 2:
+                phone, name, email = existing_phones[i // 2], f"Visitor {i}", ""
+            else:
+                phone, name, email = f"98{i:08d}", f"Guest {i}", f"guest{i}@example.com"
+            writer.writerow([name, phone, email, "1 Main St", "Pune", "MH", "411001", "", "Conference",
+                             (start + timedelta(seconds=i)).isoformat(), 60])
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100_000)
+    args = parser.parse_args()
+
+    common.migrate_db()
+    common.seed_visitors(args.rows // 2)
+    conn = common.connect()
+    phones = [p for (p,) in conn.execute("SELECT phone_number FROM users WHERE role = 'visitor' ORDER BY id")]
+    conn.close()
+    path = os.path.join(common.WORKDIR, "import.csv")
+    write_csv(path, args.rows, phones)
+
+    import import_appointments
+    from app.models.imports import ImportFormat
+
+    started = time.perf_counter()
+    asyncio.run(import_appointments.run(path, ImportFormat.CSV, "+910000000000"))
+    elapsed = time.perf_counter() - started
+    print(f"imported {args.rows} rows in {elapsed:.1f}s ({args.rows / elapsed:.0f} rows/s)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""Search latency over a large visitor base.
+
+Seeds --users visitors with generated names, phones and emails and a fifth
+as many appointments (the FTS index is kept current by triggers, so seeding
+pays the indexing cost too), then times app.db.search.search for prefix,
+phone, full-name and misspelt queries. Each query runs --repeat times and
+the median is reported.
+
+    python benchmarks/search_latency.py --users 1000000
+"""
+import argparse
+import asyncio
+from datetime import datetime
+import random
+import time
+
+import common
+
+SYLLABLES = ["ra", "ja", "an", "vi", "kr", "sh", "na", "ya", "de", "pa", "ka", "la", "mi", "su", "ri",
+             "ta", "ne", "ho", "mo", "ar", "el", "is", "on", "ve", "za", "ch", "bh", "gu", "pr", "sa"]
+PURPOSES = ["Interview", "Delivery", "Vendor meeting", "Maintenance", "Audit", "Client visit", "Courier pickup"]
+
+def _word(low: int, high: int) -> str:
+    return "".join(random.choice(SYLLABLES) for _ in range(random.randint(low, high))).capitalize()
+
+def seed(users: int):
+    random.seed(7)
+    firsts = list({_word(2, 3) for _ in range(3000)}) + ["John", "Priya", "Rahul", "Anita", "Sushmitha", "Maria"]
+    lasts = list({_word(2, 4) for _ in range(20000)}) + ["Smith", "Sharma", "Popuri", "Reddy", "Iyer", "Fernandes"]
+    now = datetime.utcnow()
+
+    def user_rows():
+        for i in range(users):
+            first, last = random.choice(firsts), random.choice(lasts)
+            email = f"{first.lower()}.{last.lower()}{i}@example.com" if i % 3 else None
+            yield (f"{first} {last}", f"+91{6_000_000_000 + i * 3:010d}", email, "{}", "visitor", 1, 0, now)
+
+    common._insert(
+        "INSERT INTO users (full_name, phone_number, email, address, role, is_verified, password_reset_required, "
+        "created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        user_rows(),
+    )
+    common._insert(
+        "INSERT INTO appointments (visitor_id, host_name, purpose, appointment_type, status, scheduled_time, "
+        "duration_minutes, created_at) VALUES (?, 'System Admin', ?, 'pre_planned', 'completed', ?, 30, ?)",
+        ((random.randint(2, users), f"{random.choice(PURPOSES)} {_word(1, 2)}", now, now) for _ in range(users // 5)),
+    )
+
+async def run(repeat: int):
+    from app.core.database import AsyncSessionLocal
+    from app.db.search import search
+    from app.models.search import SearchKind
+
+    conn = common.connect()
+    phone, name = conn.execute("SELECT phone_number, full_name FROM users ORDER BY id DESC LIMIT 1").fetchone()
+    conn.close()
+    queries = [
+        ("john", None), ("jo", None), ("priya sha", None), (name, None), (phone, None), (phone[3:9], None),
+        ("fernandez", None), ("sushmita", None), ("ra", SearchKind.USER), ("delivery", SearchKind.APPOINTMENT),
+        ("interveiw", None),
+    ]
+    async with AsyncSessionLocal() as db:
+        await search(db, "warmup")
+        for q, kind in queries:
+            latencies = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                items, _ = await search(db, q, kind, 20, 0)
+                latencies.append(time.perf_counter() - started)
+            top = [item.user.full_name if item.user else item.appointment.purpose for item in items[:2]]
+            print(f"{q!r:26} {kind.value if kind else 'all':12} {len(items):3} results  "
+                  f"median {common.percentile(latencies, 0.5) * 1000:6.1f}ms  {top}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    common.migrate_db()
+    started = time.perf_counter()
+    seed(args.users)
+    print(f"seeded {args.users} users and {args.users // 5} appointments in {time.perf_counter() - started:.0f}s")
+    asyncio.run(run(args.repeat))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""Health endpoint latency during a burst of concurrent staff logins.
+
+Creates --logins staff accounts and fires one login for each at once, while
+a poller requests /health back to back. bcrypt runs on a bounded worker
+pool off the event loop, so /health should stay fast while the logins queue
+for hashing workers. A second burst against a single account shows the
+per-account limit turning the excess away with 429.
+
+    python benchmarks/staff_login_load.py --logins 50
+"""
+import argparse
+import asyncio
+from collections import Counter
+import time
+
+import common
+
+import httpx
+
+PASSWORD = "bench-password"
+
+def seed_staff(count: int):
+    from app.core.security import get_password_hash
+
+    # One hash shared by every account; logins still pay the full bcrypt cost each
+    hashed = get_password_hash(PASSWORD)
+    conn = common.connect()
+    conn.executemany(
+        "INSERT INTO users (full_name, phone_number, email, hashed_password, address, role, is_verified, "
+        "password_reset_required, created_at) VALUES (?, ?, ?, ?, '{}', 'security', 1, 0, datetime('now'))",
+        [(f"Guard {i}", f"+9160{i:08d}", f"guard{i}@example.com", hashed) for i in range(count)],
+    )
+    conn.commit()
+    conn.close()
+
+async def burst(client: httpx.AsyncClient, emails):
+    health, logins, codes = [], [], Counter()
+    done = False
+
+    async def poll():
+        while not done:
+            started = time.perf_counter()
+            (await client.get("/health")).raise_for_status()
+            health.append(time.perf_counter() - started)
+            await asyncio.sleep(0.005)
+
+    async def login(email: str):
+        started = time.perf_counter()
+        r = await client.post("/api/v1/auth/login/staff", json={"email": email, "password": PASSWORD})
+        logins.append(time.perf_counter() - started)
+        codes[r.status_code] += 1
+
+    poller = asyncio.create_task(poll())
+    started = time.perf_counter()
+    await asyncio.gather(*(login(email) for email in emails))
+    elapsed = time.perf_counter() - started
+    done = True
+    await poller
+    return elapsed, logins, health, codes
+
+async def run(base_url: str, count: int):
+    root = base_url.rsplit("/api/v1", 1)[0]
+    async with httpx.AsyncClient(base_url=root, timeout=300) as client:
+        baseline = []
+        for _ in range(50):
+            started = time.perf_counter()
+            await client.get("/health")
+            baseline.append(time.perf_counter() - started)
+        print(f"/health idle:            {common.summary(baseline)}")
+
+        elapsed, logins, health, codes = await burst(client, [f"guard{i}@example.com" for i in range(count)])
+        print(f"{count} logins, {count} accounts: {elapsed:.1f}s, status {dict(codes)}, login {common.summary(logins)}")
+        print(f"/health during logins:   {common.summary(health)} over {len(health)} requests")
+
+        elapsed, logins, health, codes = await burst(client, ["guard0@example.com"] * count)
+        print(f"{count} logins, one account: {elapsed:.1f}s, status {dict(codes)}")
+        print(f"/health during logins:   {common.summary(health)} over {len(health)} requests")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--logins", type=int, default=50)
+    args = parser.parse_args()
+
+    common.migrate_db()
+    seed_staff(args.logins)
+    with common.server() as base_url:
+        asyncio.run(run(base_url, args.logins))
+
+if __name__ == "__main__":
+    main()
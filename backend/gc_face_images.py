@@ -0,0 +1,19 @@
+import sys
+from app.core.database import SessionLocal
+from app.core.images import collect_garbage
+from app.db.models import DBUser
+
+def gc(dry_run: bool = False):
+    print("Collecting face images no longer referenced by any user...")
+    db = SessionLocal()
+    try:
+        referenced = [path for (path,) in db.query(DBUser.face_image_path).filter(DBUser.face_image_path.isnot(None))]
+    finally:
+        db.close()
+
+    removed = collect_garbage(referenced, dry_run=dry_run)
+    action = "Would remove" if dry_run else "Removed"
+    print(f"{action} {removed['images']} images, {removed['thumbnails']} thumbnails and {removed['uploads']} stale uploads.")
+
+if __name__ == "__main__":
+    gc(dry_run="--dry-run" in sys.argv)
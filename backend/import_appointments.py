@@ -0,0 +1,41 @@
+import argparse
+import asyncio
+from sqlalchemy import select
+from app.core.auth import Principal
+from app.core.database import AsyncSessionLocal
+from app.db.imports import import_appointments, parse_records
+from app.db.models import DBUser
+from app.models.imports import ImportFormat
+
+READ_SIZE = 1 << 16
+
+async def _chunks(path: str):
+    with open(path, "rb") as f:
+        while chunk := f.read(READ_SIZE):
+            yield chunk
+
+async def run(path: str, format: ImportFormat, host_phone: str):
+    async with AsyncSessionLocal() as db:
+        host = await db.scalar(select(DBUser).where(DBUser.phone_number == host_phone))
+        if host is None:
+            raise SystemExit(f"No user with phone number {host_phone}")
+        principal = Principal(id=host.id, phone_number=host.phone_number, full_name=host.full_name, role=host.role)
+        summary = await import_appointments(db, parse_records(format, _chunks(path)), principal)
+
+    print(f"{summary.rows} rows: {summary.appointments_created} appointments booked, "
+          f"{summary.visitors_created} visitors created, {summary.visitors_matched} matched, "
+          f"{summary.error_count} rows rejected.")
+    for error in summary.errors:
+        print(f"  line {error.line}: {'; '.join(error.errors)}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Book visitors in bulk from a CSV or NDJSON file")
+    parser.add_argument("path")
+    parser.add_argument("--format", choices=[f.value for f in ImportFormat], help="default: from the file extension")
+    parser.add_argument("--host-phone", default="+910000000000",
+                        help="phone number of the staff member rows without a host are booked with")
+    args = parser.parse_args()
+    format = ImportFormat(args.format) if args.format else (
+        ImportFormat.NDJSON if args.path.endswith((".ndjson", ".jsonl")) else ImportFormat.CSV
+    )
+    asyncio.run(run(args.path, format, args.host_phone))
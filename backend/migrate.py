@@ -1,47 +1,14 @@
-import sqlite3
-import os
-from app.core.database import engine, Base, DB_PATH
+import argparse
+from app.core.database import DATABASE_URL, SessionLocal, create_sync_engine
+from app.db.migrations import applied_versions, discover, upgrade
 from app.db.models import DBUser
 from app.core.security import get_password_hash
 from app.models.user import UserRole
-from sqlalchemy.orm import Session
-from sqlalchemy import create_engine, inspect
 
-def migrate():
-    print(f"Target Database: {DB_PATH}")
-    
-    # 1. Create tables if they don't exist
-    print("Creating tables (if missing)...")
-    Base.metadata.create_all(bind=engine)
-    
-    # 2. Handle Schema Updates (SQLite doesn't support migrations in create_all)
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    
-    cursor.execute("PRAGMA table_info(users)")
-    columns = [row[1] for row in cursor.fetchall()]
-    
-    updates = [
-        ("calendar_synced", "BOOLEAN DEFAULT 0"),
-        ("calendar_url", "TEXT")
-    ]
-    
-    for col_name, col_type in updates:
-        if col_name not in columns:
-            print(f"Migration: Adding column '{col_name}' to 'users' table...")
-            cursor.execute(f"ALTER TABLE users ADD COLUMN {col_name} {col_type}")
-        else:
-            print(f"Skipping: Column '{col_name}' already exists.")
-            
-    conn.commit()
-    conn.close()
-    
-    # 3. Seed Initial Data
+def seed():
     print("Checking seed data...")
-    from sqlalchemy.orm import sessionmaker
-    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
     db = SessionLocal()
-    
+
     try:
         admin = db.query(DBUser).filter(DBUser.role == UserRole.ADMIN).first()
         if not admin:
@@ -64,7 +31,33 @@ def migrate():
     finally:
         db.close()
 
+def status(engine):
+    with engine.connect() as conn:
+        applied = applied_versions(conn)
+    for migration in discover():
+        state = "applied" if migration.version in applied else "pending"
+        print(f"{migration.version:04d} {state:8} {migration.description}")
+
+def migrate(target=None):
+    engine = create_sync_engine(DATABASE_URL, transactional_ddl=True)
+    print(f"Target Database: {engine.url.render_as_string(hide_password=True)}")
+    try:
+        applied = upgrade(engine, target)
+        print(f"Applied {len(applied)} migration(s)." if applied else "Schema is up to date.")
+    finally:
+        engine.dispose()
+
+    # Seeding uses the current models, which need the complete schema
+    if target is None:
+        seed()
     print("Migration and Initialization completed successfully.")
 
 if __name__ == "__main__":
-    migrate()
+    parser = argparse.ArgumentParser(description="Apply database migrations and seed initial data")
+    parser.add_argument("--status", action="store_true", help="list migrations and whether they are applied")
+    parser.add_argument("--to", type=int, dest="target", help="stop after this migration version")
+    args = parser.parse_args()
+    if args.status:
+        status(create_sync_engine(DATABASE_URL))
+    else:
+        migrate(args.target)
@@ -0,0 +1,15 @@
+from app.core.database import SessionLocal
+from app.db.rollups import rebuild_rollups, rebuild_visitor_stats
+
+def rebuild():
+    print("Rebuilding appointment rollups from historical data...")
+    db = SessionLocal()
+    try:
+        written = rebuild_rollups(db)
+        print(f"Rebuild complete: {written} rollup rows written.")
+        print(f"Visitor stats rebuilt for {rebuild_visitor_stats(db)} visitors.")
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    rebuild()
@@ -1,9 +1,10 @@
 #!/bin/bash
+set -e
 
-# Run migrations
+# Run migrations once, before any worker starts
 echo "Running database migrations..."
 python migrate.py
 
-# Start the application
+# Start the application (WEB_CONCURRENCY sets the number of workers)
 echo "Starting FastAPI server..."
-uvicorn app.main:app --host 0.0.0.0 --port 8000
+exec uvicorn app.main:app --host 0.0.0.0 --port 8000
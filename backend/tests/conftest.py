@@ -0,0 +1,45 @@
+"""Test setup: a throwaway SQLite database and storage directory per session.
+
+The environment is set before the app is imported, since the engine and the
+storage paths are read at import time.
+"""
+import os
+import tempfile
+
+_workdir = tempfile.mkdtemp(prefix="vms-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_workdir, 'vms.db')}"
+os.environ.setdefault("BCRYPT_ROUNDS", "4")
+os.environ.setdefault("CALENDAR_REFRESH_MINUTES", "0")
+os.chdir(_workdir)
+
+import pytest
+from fastapi.testclient import TestClient
+
+import migrate
+from app.core.database import SessionLocal
+from app.main import app
+
+@pytest.fixture(scope="session", autouse=True)
+def database():
+    migrate.migrate()
+    yield
+
+@pytest.fixture(scope="session")
+def client(database):
+    with TestClient(app) as c:
+        yield c
+
+@pytest.fixture(scope="session")
+def staff_headers(client):
+    token = client.post(
+        "/api/v1/auth/login/staff", json={"email": "admin@vms.com", "password": "admin123"}
+    ).json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}
+
+@pytest.fixture
+def db():
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
@@ -0,0 +1,18 @@
+import pytest
+
+@pytest.mark.parametrize("path", [
+    "/api/v1/admin/appointments/all",
+    "/api/v1/admin/users/employees",
+    "/api/v1/admin/users/security",
+    "/api/v1/admin/users/all-staff",
+    "/api/v1/admin/users/visitors",
+    "/api/v1/admin/proxy-image?path=x",
+    "/api/v1/events/stream",
+])
+def test_directory_routes_require_a_token(client, path):
+    assert client.get(path).status_code == 401
+
+def test_proxy_image_accepts_a_query_token(client, staff_headers):
+    token = staff_headers["Authorization"].split()[1]
+    r = client.get("/api/v1/admin/proxy-image", params={"path": "/etc/passwd", "token": token})
+    assert r.status_code == 404
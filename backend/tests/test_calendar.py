@@ -0,0 +1,49 @@
+import asyncio
+
+import httpx
+import pytest
+
+from app.core.calendar import CalendarError, fetch_feed
+
+FEED = b"BEGIN:VCALENDAR\r\nVERSION:2.0\r\nEND:VCALENDAR\r\n"
+
+def _fetch(url, handler):
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            return await fetch_feed(url, client=client)
+    return asyncio.run(run())
+
+def _feed(request):
+    return httpx.Response(200, content=FEED)
+
+@pytest.mark.parametrize("url", [
+    "file:///etc/passwd",
+    "http://127.0.0.1/cal.ics",
+    "http://10.1.2.3/cal.ics",
+    "http://169.254.169.254/latest/meta-data",
+    "http://[::1]/cal.ics",
+    "http://[::ffff:192.168.0.1]/cal.ics",
+    "http://localhost/cal.ics",
+])
+def test_fetch_feed_rejects_non_public_urls(url):
+    with pytest.raises(CalendarError):
+        _fetch(url, _feed)
+
+def test_fetch_feed_checks_every_redirect():
+    def handler(request):
+        if request.url.path == "/cal.ics":
+            return httpx.Response(302, headers={"Location": "/moved.ics"})
+        if request.url.path == "/moved.ics":
+            return httpx.Response(302, headers={"Location": "http://169.254.169.254/latest/meta-data"})
+        return _feed(request)
+
+    with pytest.raises(CalendarError, match="not a public address"):
+        _fetch("http://93.184.216.34/cal.ics", handler)
+
+def test_fetch_feed_follows_public_redirects():
+    def handler(request):
+        if request.url.path == "/cal.ics":
+            return httpx.Response(301, headers={"Location": "https://93.184.216.35/moved.ics"})
+        return _feed(request)
+
+    assert _fetch("webcal://93.184.216.34/cal.ics", handler).body == FEED
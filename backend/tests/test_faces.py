@@ -0,0 +1,34 @@
+import numpy as np
+
+from app.core.faces import EmbeddingStore
+
+def _unit(dim, seed):
+    v = np.random.default_rng(seed).standard_normal(dim).astype(np.float32)
+    return v / np.linalg.norm(v)
+
+def test_stores_sharing_a_directory_see_each_others_enrollments(tmp_path):
+    # Two instances stand in for two worker processes
+    a = EmbeddingStore(str(tmp_path), dim=8, initial_capacity=2)
+    b = EmbeddingStore(str(tmp_path), dim=8, initial_capacity=2)
+
+    a.enroll(1, _unit(8, 1))
+    assert b.has(1)
+    # Enough rows to force b to grow the matrix past a's capacity
+    for user_id in range(2, 6):
+        b.enroll(user_id, _unit(8, user_id))
+    a.enroll(6, _unit(8, 6))
+
+    for store in (a, b):
+        assert len(store) == 6
+        assert store.identify(_unit(8, 4))[0][0] == 4
+    b.remove(1)
+    assert a.verify(1, _unit(8, 1)) is None
+    assert len(EmbeddingStore(str(tmp_path), dim=8)) == 5
+
+def test_identify_face_requires_staff(client):
+    r = client.post("/api/v1/security/identify-face", json={"face_image": "AAAA"})
+    assert r.status_code == 401
+
+def test_face_login_is_refused_for_staff(client):
+    r = client.post("/api/v1/auth/login/face", json={"phone_number": "+910000000000", "face_image": "AAAA"})
+    assert r.status_code == 403
@@ -0,0 +1,55 @@
+import asyncio
+import base64
+import io
+import os
+
+from PIL import Image
+
+from app.core import images
+
+def test_reused_blob_is_not_collected(tmp_path):
+    # Stored long ago and unreferenced: a GC candidate until the same image is uploaded again
+    digest, extension = "ab" * 32, "jpg"
+    path = images.blob_path(digest, extension)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    open(path, "wb").close()
+    thumbs = [images.thumbnail_path(digest, size) for size in images.THUMBNAIL_SIZES]
+    for thumb in thumbs:
+        os.makedirs(os.path.dirname(thumb), exist_ok=True)
+        open(thumb, "wb").close()
+    for stored in [path] + thumbs:
+        os.utime(stored, (0, 0))
+
+    upload = tmp_path / "upload.part"
+    upload.write_bytes(b"same bytes")
+    assert images._publish_blob(str(upload), digest, extension) == (path, False)
+    assert not upload.exists()
+
+    removed = images.collect_garbage([])
+    assert os.path.exists(path) and all(os.path.exists(thumb) for thumb in thumbs)
+    assert removed["images"] == removed["thumbnails"] == 0
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"\0" * 32
+
+def _upload(client):
+    return client.post("/api/v1/uploads/faces", files={"file": ("face.png", PNG, "image/png")})
+
+def test_uploads_are_rate_limited_per_client(client, monkeypatch):
+    monkeypatch.setattr(images, "_uploads_per_ip", images.RateLimiter(2, 60.0))
+    assert _upload(client).status_code == 200
+    assert _upload(client).status_code == 200
+    r = _upload(client)
+    assert r.status_code == 429 and int(r.headers["Retry-After"]) > 0
+
+def test_staging_is_capped(client, monkeypatch):
+    monkeypatch.setattr(images, "MAX_STAGED_UPLOADS", len(os.listdir(images.UPLOAD_STAGING_DIR)))
+    assert _upload(client).status_code == 429
+
+def test_line_wrapped_base64_is_accepted():
+    buffer = io.BytesIO()
+    Image.effect_noise((96, 96), 64).save(buffer, "PNG")
+    data = buffer.getvalue()
+    wrapped = "data:image/png;base64,\n" + base64.encodebytes(data).decode().replace("\n", "\r\n")
+    path = asyncio.run(images.ingest_image(wrapped))
+    with open(path, "rb") as f:
+        assert f.read() == data
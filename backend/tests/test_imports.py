@@ -0,0 +1,58 @@
+import json
+from datetime import datetime, timedelta
+
+from app.db.models import DBAppointment, DBUser
+
+FUTURE = (datetime.utcnow() + timedelta(days=7)).replace(microsecond=0).isoformat()
+PAST = (datetime.utcnow() - timedelta(days=1)).replace(microsecond=0).isoformat()
+HEADER = "full_name,phone_number,email,street,city,state,pincode,host_name,purpose,scheduled_time,duration_minutes\n"
+
+def _import(client, headers, body, format="csv"):
+    r = client.post("/api/v1/employees/import", params={"format": format}, content=body.encode(), headers=headers)
+    assert r.status_code == 200, r.text
+    return r.json()
+
+def _row(name, phone, email="", scheduled_time=FUTURE, purpose="Expo"):
+    return f"{name},{phone},{email},1 Main St,Pune,MH,411001,System Admin,{purpose},{scheduled_time},30\n"
+
+def test_csv_import_matches_visitors_and_reports_bad_lines(client, staff_headers, db):
+    db.add(DBUser(full_name="Known Guest", phone_number="+919812300001", role="visitor"))
+    db.commit()
+
+    body = (
+        HEADER
+        + _row("Known Guest", "98123 00001")                                   # line 2: matched by phone
+        + _row("New Guest", "+919812300002", "new.guest@example.com")          # line 3: created
+        + _row("Late Guest", "+919812300003", scheduled_time=PAST)             # line 4
+        + _row("Odd Guest", "12345")                                           # line 5
+        + _row("New Guest", "9812300002", purpose='"Expo\nday two"')           # lines 6-7: same new visitor
+        + _row("Copy Guest", "+919812300004", "admin@vms.com")                 # line 8: email taken
+    )
+    summary = _import(client, staff_headers, body)
+
+    assert (summary["rows"], summary["appointments_created"], summary["visitors_created"],
+            summary["visitors_matched"], summary["error_count"]) == (6, 3, 1, 1, 3)
+    errors = {e["line"]: e["errors"] for e in summary["errors"]}
+    assert sorted(errors) == [4, 5, 8]
+    assert errors[4][0].startswith("scheduled_time:")
+    assert errors[5][0].startswith("visitor_info.phone_number:")
+    assert "already registered" in errors[8][0]
+
+    new_guest = db.query(DBUser).filter(DBUser.phone_number == "+919812300002").one()
+    purposes = sorted(a.purpose for a in db.query(DBAppointment).filter(DBAppointment.visitor_id == new_guest.id))
+    assert purposes == ["Expo", "Expo\nday two"]
+    assert db.query(DBUser).filter(DBUser.phone_number == "+919812300004").first() is None
+
+def test_ndjson_import_reports_unparseable_lines(client, staff_headers, db):
+    row = {"full_name": "Json Guest", "phone_number": "+919812300010", "street": "1 Main St", "city": "Pune",
+           "state": "MH", "pincode": 411001, "purpose": "Expo", "scheduled_time": FUTURE, "duration_minutes": 30}
+    body = "\n".join([json.dumps(row), "{not json", "[1, 2]", "", json.dumps({**row, "duration_minutes": 0})]) + "\n"
+    summary = _import(client, staff_headers, body, format="ndjson")
+
+    assert (summary["rows"], summary["appointments_created"], summary["visitors_created"]) == (4, 1, 1)
+    assert [e["line"] for e in summary["errors"]] == [2, 3, 5]
+    assert summary["errors"][0]["errors"][0].startswith("Invalid JSON")
+    guest = db.query(DBUser).filter(DBUser.phone_number == "+919812300010").one()
+    assert guest.address["pincode"] == "411001"
+    # No host given: the importing staff member hosts
+    assert db.query(DBAppointment).filter(DBAppointment.visitor_id == guest.id).one().host_id == 1
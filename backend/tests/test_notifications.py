@@ -0,0 +1,15 @@
+import time
+
+from app.db.models import DBNotification
+
+def test_otp_message_is_deleted_once_sent(client, db):
+    phone = "+919999900001"
+    r = client.post("/api/v1/auth/send-otp", params={"phone_number": phone})
+    assert r.status_code == 200, r.text
+
+    # The app's worker delivers it through the console transport
+    deadline = time.monotonic() + 5
+    while db.query(DBNotification).filter(DBNotification.recipient == phone).count():
+        assert time.monotonic() < deadline, "OTP notification was not sent and removed"
+        db.rollback()
+        time.sleep(0.05)
@@ -0,0 +1,60 @@
+import asyncio
+
+import pytest
+
+from app.core import otp
+
+PHONE = "+919876500001"
+
+@pytest.fixture(params=["memory", "sqlite"])
+def backend(request, tmp_path, monkeypatch):
+    store = otp.MemoryOTPBackend() if request.param == "memory" else otp.SQLiteOTPBackend(str(tmp_path / "otp.db"))
+    monkeypatch.setattr(otp, "backend", store)
+    for name, limits in [("_send_per_phone", otp.SEND_LIMIT_PER_PHONE), ("_send_per_ip", otp.SEND_LIMIT_PER_IP),
+                         ("_verify_per_phone", otp.VERIFY_LIMIT_PER_PHONE), ("_verify_per_ip", otp.VERIFY_LIMIT_PER_IP)]:
+        monkeypatch.setattr(otp, name, otp.RateLimiter(*limits))
+    return store
+
+def _wrong(code):
+    return "".join(str((int(digit) + 1) % 10) for digit in code)
+
+def test_code_is_consumed_on_success(backend):
+    code = asyncio.run(otp.issue_otp(PHONE))
+    assert asyncio.run(otp.verify_otp(PHONE, code))
+    assert not asyncio.run(otp.verify_otp(PHONE, code))
+
+def test_expired_code_is_rejected_and_swept(backend, monkeypatch):
+    code = asyncio.run(otp.issue_otp(PHONE))
+    expired = otp.time.time() + otp.OTP_TTL_SECONDS + 1
+    monkeypatch.setattr(otp.time, "time", lambda: expired)
+    assert not asyncio.run(otp.verify_otp(PHONE, code))
+    assert asyncio.run(backend.get(PHONE)) is None
+
+    asyncio.run(otp.issue_otp(PHONE + "9"))
+    assert asyncio.run(backend.sweep(expired + otp.OTP_TTL_SECONDS)) == 1
+
+def test_code_is_burnt_after_max_attempts(backend):
+    code = asyncio.run(otp.issue_otp(PHONE))
+    for _ in range(otp.OTP_MAX_ATTEMPTS):
+        assert not asyncio.run(otp.verify_otp(PHONE, _wrong(code)))
+    assert asyncio.run(backend.get(PHONE)) is None
+    assert not asyncio.run(otp.verify_otp(PHONE, code))
+
+def test_sends_are_rate_limited_per_phone(backend):
+    capacity, refill_seconds = otp.SEND_LIMIT_PER_PHONE
+    for _ in range(capacity):
+        asyncio.run(otp.issue_otp(PHONE))
+    with pytest.raises(otp.OTPRateLimited) as limited:
+        asyncio.run(otp.issue_otp(PHONE))
+    assert 0 < limited.value.retry_after <= refill_seconds
+    # Other numbers have their own bucket
+    asyncio.run(otp.issue_otp(PHONE + "9"))
+
+def test_sqlite_backend_is_shared_between_instances(tmp_path):
+    path = str(tmp_path / "otp.db")
+    first, second = otp.SQLiteOTPBackend(path), otp.SQLiteOTPBackend(path)
+    asyncio.run(first.put(PHONE, otp.OTPRecord("hash", otp.time.time() + 60)))
+    assert asyncio.run(second.record_failure(PHONE)) == 1
+    assert asyncio.run(first.get(PHONE)).attempts == 1
+    asyncio.run(second.delete(PHONE))
+    assert asyncio.run(first.get(PHONE)) is None
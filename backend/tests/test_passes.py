@@ -0,0 +1,55 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from app.core.passes import is_revoked, issue_pass, pass_window
+from app.db.models import DBAppointment
+from app.db.passes import load_pass_revocations
+
+def _appointment(db, starts_in=timedelta(minutes=10), status="accepted"):
+    appt = DBAppointment(visitor_id=1, host_id=1, host_name="System Admin", purpose="Pass", status=status,
+                         scheduled_time=datetime.utcnow().replace(microsecond=0) + starts_in, duration_minutes=30)
+    db.add(appt)
+    db.commit()
+    return appt
+
+def _pass(appt):
+    return issue_pass(appt.id, appt.visitor_id, *pass_window(appt.scheduled_time, appt.duration_minutes))
+
+def _scan(client, headers, token):
+    return client.post("/api/v1/security/scan", json={"token": token}, headers=headers)
+
+def test_scan_checks_in_once(client, staff_headers, db):
+    appt = _appointment(db)
+    token = _pass(appt)
+
+    first = _scan(client, staff_headers, token)
+    assert first.status_code == 200, first.text
+    assert (first.json()["appointment_id"], first.json()["status"]) == (appt.id, "checked_in")
+    again = _scan(client, staff_headers, token)
+    assert again.status_code == 409
+
+def test_tampered_pass_is_rejected(client, staff_headers, db):
+    token = _pass(_appointment(db))
+    tampered = token[:-1] + ("A" if token[-1] != "A" else "B")
+    assert _scan(client, staff_headers, tampered).status_code == 400
+    assert _scan(client, staff_headers, token[:-4]).status_code == 400
+
+def test_expired_pass_is_rejected(client, staff_headers, db):
+    appt = _appointment(db, starts_in=-timedelta(hours=2))
+    r = _scan(client, staff_headers, _pass(appt))
+    assert r.status_code == 403 and "expired" in r.json()["detail"]
+    db.refresh(appt)
+    assert appt.status == "accepted"
+
+def test_revoked_pass_is_refused_after_reload(client, staff_headers, db):
+    appt = _appointment(db)
+    token = _pass(appt)
+    # Cancelled by another worker: this process only learns of it from the loader
+    appt.status = "cancelled"
+    db.commit()
+    assert not is_revoked(appt.id)
+    asyncio.run(load_pass_revocations())
+    assert is_revoked(appt.id)
+
+    r = _scan(client, staff_headers, token)
+    assert r.status_code == 403 and "revoked" in r.json()["detail"]
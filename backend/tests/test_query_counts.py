@@ -0,0 +1,75 @@
+"""Appointment listings load visitors with a join, so their query count does not grow with the rows returned."""
+from contextlib import contextmanager
+from datetime import datetime, time, timedelta
+
+import pytest
+from sqlalchemy import event
+
+from app.core.database import async_engine
+from app.core.security import create_access_token
+from app.db.manifest import facility_today, invalidate_manifest
+from app.db.models import DBAppointment, DBUser
+from app.models.appointment import AppointmentStatus
+
+DAY = facility_today() + timedelta(days=10)
+STATUSES = [AppointmentStatus.PENDING, AppointmentStatus.ACCEPTED, AppointmentStatus.CHECKED_IN, AppointmentStatus.COMPLETED]
+
+LISTINGS = [
+    "/api/v1/admin/appointments/all",
+    f"/api/v1/security/daily-appointments?day={DAY.isoformat()}",
+    "/api/v1/security/recent-activity",
+    "/api/v1/visitors/appointments",
+    "/api/v1/employees/my-schedule",
+]
+# One SELECT with the visitor joined in, whatever the page size
+MAX_QUERIES = 1
+
+@contextmanager
+def count_queries():
+    statements = []
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    event.listen(async_engine.sync_engine, "before_cursor_execute", record)
+    try:
+        yield statements
+    finally:
+        event.remove(async_engine.sync_engine, "before_cursor_execute", record)
+
+def _seed(db, count):
+    """`count` more visitors with one appointment each, plus `count` more appointments for the first of them.
+
+    Returns the phone number of that first visitor.
+    """
+    offset = db.query(DBAppointment).count()
+    visitors = [DBUser(full_name=f"Listing Visitor {offset + i}", phone_number=f"+9180{offset + i:08d}", role="visitor")
+                for i in range(count)]
+    db.add_all(visitors)
+    db.flush()
+    regular = db.query(DBUser).filter(DBUser.full_name.like("Listing Visitor %")).order_by(DBUser.id).first()
+    regular_id, regular_phone = regular.id, regular.phone_number
+    for i, visitor_id in enumerate([v.id for v in visitors] + [regular_id] * count):
+        db.add(DBAppointment(
+            visitor_id=visitor_id, host_id=1, host_name="System Admin", purpose="Meeting",
+            status=STATUSES[i % len(STATUSES)],
+            scheduled_time=datetime.combine(DAY, time(9)) + timedelta(minutes=offset + i),
+        ))
+    db.commit()
+    invalidate_manifest(datetime.combine(DAY, time(9)))
+    return regular_phone
+
+@pytest.mark.parametrize("url", LISTINGS)
+def test_listing_query_count_is_bounded(url, client, staff_headers, db):
+    counts = []
+    for seeded in (10, 30):
+        visitor_phone = _seed(db, seeded)
+        headers = staff_headers
+        if url.startswith("/api/v1/visitors/"):
+            headers = {"Authorization": f"Bearer {create_access_token({'sub': visitor_phone})}"}
+        # Warm the token cache so every counted request authenticates the same way
+        client.get("/api/v1/visitors/appointments/0/pass", headers=headers)
+        with count_queries() as statements:
+            r = client.get(url, headers=headers)
+        assert r.status_code == 200, r.text
+        assert len(r.json()["items"] if isinstance(r.json(), dict) else r.json()) > 0
+        counts.append(len(statements))
+    assert counts[0] == counts[1] <= MAX_QUERIES, (counts, statements)
@@ -0,0 +1,32 @@
+import asyncio
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+from app.core.database import AsyncSessionLocal
+from app.db.models import DBAppointmentRollup
+from app.db.rollups import hour_bucket, record_appointments_created
+
+SCHEDULED = datetime(2031, 3, 4, 10, 15)
+
+async def _record(appts):
+    async with AsyncSessionLocal() as db:
+        await record_appointments_created(db, appts)
+        await db.commit()
+
+def test_renamed_host_keeps_one_series(client, staff_headers, db):
+    checked_in = SCHEDULED + timedelta(minutes=5)
+    asyncio.run(_record([
+        SimpleNamespace(visitor_id=None, host_id=1, host_name=name, scheduled_time=SCHEDULED, status="completed",
+                        check_in_time=checked_in, check_out_time=checked_in + timedelta(minutes=30))
+        for name in ("System Admin", "Renamed Admin")
+    ]))
+
+    rows = db.query(DBAppointmentRollup).filter(DBAppointmentRollup.bucket_start == hour_bucket(SCHEDULED)).all()
+    assert [(r.host_id, r.status, r.appointment_count, r.visit_count) for r in rows] == [(1, "completed", 2, 2)]
+
+    r = client.get("/api/v1/admin/reports/visits", headers=staff_headers, params={
+        "granularity": "hour", "host_name": "System Admin",
+        "date_from": SCHEDULED.replace(minute=0).isoformat(), "date_to": (SCHEDULED + timedelta(hours=1)).isoformat(),
+    })
+    assert r.status_code == 200, r.text
+    assert [(b["visits"], b["average_visit_minutes"]) for b in r.json()] == [(2, 30.0)]
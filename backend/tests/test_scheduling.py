@@ -0,0 +1,24 @@
+from datetime import datetime, time, timedelta
+
+from app.db.manifest import facility_today
+from app.db.models import DBCalendarBusy
+
+def test_free_slots_with_block_matching_calendar_event(client, staff_headers, db):
+    # A host may block out exactly the time their calendar already marks busy; the two
+    # intervals then tie on start and end and must still sort
+    day = facility_today() + timedelta(days=3)
+    start = datetime.combine(day, time(11, 0))
+    db.add(DBCalendarBusy(employee_id=1, uid="tie@test", start_time=start, end_time=start + timedelta(hours=1)))
+    db.commit()
+
+    r = client.post("/api/v1/employees/schedule/block", headers=staff_headers, json={
+        "host_name": "System Admin", "purpose": "Focus", "appointment_type": "pre_planned",
+        "scheduled_time": start.isoformat(), "duration_minutes": 60,
+    })
+    assert r.status_code == 200, r.text
+
+    r = client.get("/api/v1/visitors/free-slots", params={"host_id": 1, "date_from": day.isoformat(), "date_to": day.isoformat()})
+    assert r.status_code == 200, r.text
+    slots = [(s["start"], s["end"]) for s in r.json()]
+    assert (start - timedelta(hours=2)).isoformat() in [s[0] for s in slots]
+    assert all(not (s[0] < (start + timedelta(hours=1)).isoformat() and s[1] > start.isoformat()) for s in slots)
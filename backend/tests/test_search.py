@@ -0,0 +1,34 @@
+from datetime import datetime, timedelta
+
+from app.db.models import DBAppointment, DBUser
+
+def _search(client, headers, q, **params):
+    r = client.get("/api/v1/security/search", params={"q": q, **params}, headers=headers)
+    assert r.status_code == 200, r.text
+    return [(item["kind"], item["id"]) for item in r.json()["items"]]
+
+def _visitor(db, name, phone):
+    user = DBUser(full_name=name, phone_number=phone, email=f"{phone[1:]}@example.com", role="visitor")
+    db.add(user)
+    db.commit()
+    return user.id
+
+def test_words_and_phone_digits_match_as_prefixes(client, staff_headers, db):
+    user_id = _visitor(db, "Zéphyrine Quillfeather", "+919855500011")
+    db.add(DBAppointment(visitor_id=user_id, host_id=1, host_name="System Admin", purpose="Glassblowing demo",
+                         status="pending", scheduled_time=datetime.utcnow() + timedelta(days=2)))
+    db.commit()
+
+    assert _search(client, staff_headers, "zephy", kind="user") == [("user", user_id)]
+    assert _search(client, staff_headers, "quill zeph") == [("user", user_id)]
+    assert ("user", user_id) in _search(client, staff_headers, "98555 000")
+    hits = _search(client, staff_headers, "glassblow", kind="appointment")
+    assert len(hits) == 1 and hits[0][0] == "appointment"
+
+def test_one_typo_matches_from_the_index_vocabulary(client, staff_headers, db):
+    user_id = _visitor(db, "Bartholomew Inkwright", "+919855500022")
+
+    assert _search(client, staff_headers, "inkwrigth", kind="user") == [("user", user_id)]
+    assert _search(client, staff_headers, "bartholomev inkwright") == [("user", user_id)]
+    # Too far from every indexed term
+    assert _search(client, staff_headers, "inkwxxxxx", kind="user") == []
@@ -0,0 +1,80 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from app.db.models import DBAppointment, DBSyncTombstone
+from app.db.sync import SYNC_RETENTION_DAYS, prune_sync_history
+
+SCHEDULED = datetime(2031, 5, 6, 11, 0)
+
+def _appointment(db, status="accepted"):
+    appt = DBAppointment(visitor_id=1, host_id=1, host_name="System Admin", purpose="Sync", status=status,
+                         scheduled_time=SCHEDULED)
+    db.add(appt)
+    db.commit()
+    return appt.id
+
+def _changes(client, headers, cursor):
+    r = client.get("/api/v1/sync/changes", params={"cursor": cursor}, headers=headers)
+    assert r.status_code == 200, r.text
+    return r.json()
+
+def _drain(client, headers, cursor):
+    page = _changes(client, headers, cursor)
+    while page["has_more"]:
+        page = _changes(client, headers, page["next_cursor"])
+    return page["next_cursor"]
+
+def test_cursor_returns_only_newer_changes(client, staff_headers, db):
+    cursor = _drain(client, staff_headers, 0)
+    appt_id = _appointment(db)
+
+    page = _changes(client, staff_headers, cursor)
+    assert [a["id"] for a in page["appointments"]] == [appt_id]
+    assert page["next_cursor"] > cursor and not page["has_more"]
+    assert _changes(client, staff_headers, page["next_cursor"])["appointments"] == []
+
+    appt = db.get(DBAppointment, appt_id)
+    appt.purpose = "Sync, rescheduled"
+    db.commit()
+    updated = _changes(client, staff_headers, page["next_cursor"])
+    assert [(a["id"], a["purpose"]) for a in updated["appointments"]] == [(appt_id, "Sync, rescheduled")]
+
+def test_deletes_leave_tombstones_until_pruned(client, staff_headers, db):
+    appt_id = _appointment(db)
+    cursor = _drain(client, staff_headers, 0)
+    db.delete(db.get(DBAppointment, appt_id))
+    db.commit()
+
+    page = _changes(client, staff_headers, cursor)
+    assert [(t["kind"], t["id"]) for t in page["deleted"]] == [("appointment", appt_id)]
+
+    tombstone = db.get(DBSyncTombstone, ("appointment", appt_id))
+    tombstone.deleted_at = datetime.utcnow() - timedelta(days=SYNC_RETENTION_DAYS + 1)
+    db.commit()
+    assert asyncio.run(prune_sync_history()) >= 1
+    r = client.get("/api/v1/sync/changes", params={"cursor": cursor}, headers=staff_headers)
+    assert r.status_code == 410
+    assert appt_id not in [a["id"] for a in _changes(client, staff_headers, 0)["appointments"]]
+
+def test_replayed_offline_batch_is_applied_once(client, staff_headers, db):
+    appt_id = _appointment(db)
+    occurred_at = (datetime.utcnow() - timedelta(minutes=5)).isoformat()
+    check_in = {"op_id": f"op-{appt_id}", "appointment_id": appt_id, "action": "check_in", "occurred_at": occurred_at}
+    batch = {"device_id": "kiosk-1", "operations": [check_in, check_in]}
+
+    first = client.post("/api/v1/sync/check-ins", json=batch, headers=staff_headers)
+    assert first.status_code == 200, first.text
+    assert [(r["outcome"], r["replayed"]) for r in first.json()] == [("applied", False), ("applied", True)]
+    checked_in_at = first.json()[0]["appointment"]["check_in_time"]
+
+    again = client.post("/api/v1/sync/check-ins", json=batch, headers=staff_headers)
+    assert [(r["outcome"], r["replayed"]) for r in again.json()] == [("applied", True), ("applied", True)]
+    assert again.json()[0]["appointment"]["check_in_time"] == checked_in_at
+
+    # A different operation for the same visit is a conflict, not a second check-in
+    retry = client.post("/api/v1/sync/check-ins", headers=staff_headers, json={
+        "device_id": "kiosk-2", "operations": [{**check_in, "op_id": f"op-{appt_id}-b"}],
+    })
+    assert retry.json()[0]["outcome"] == "conflict"
+    db.expire_all()
+    assert db.get(DBAppointment, appt_id).status == "checked_in"
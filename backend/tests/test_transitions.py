@@ -0,0 +1,49 @@
+from datetime import datetime, timedelta
+
+from app.core.passes import is_revoked
+from app.db.models import DBAppointment
+
+def _appointments(db, *statuses):
+    start = datetime.utcnow().replace(microsecond=0) + timedelta(days=3)
+    appts = [DBAppointment(visitor_id=1, host_id=1, host_name="System Admin", purpose="Bulk", status=status,
+                           scheduled_time=start + timedelta(minutes=i), duration_minutes=30)
+             for i, status in enumerate(statuses)]
+    db.add_all(appts)
+    db.commit()
+    return [appt.id for appt in appts]
+
+def _statuses(db, ids):
+    db.expire_all()
+    return [db.get(DBAppointment, i).status for i in ids]
+
+def test_bulk_check_in_reports_each_item(client, staff_headers, db):
+    accepted, pending, checked_in = _appointments(db, "accepted", "pending", "checked_in")
+    missing = accepted + 10_000
+    r = client.post("/api/v1/security/check-in/batch", headers=staff_headers,
+                    json={"appointment_ids": [accepted, pending, missing, accepted, checked_in]})
+    assert r.status_code == 200, r.text
+    assert [(item["appointment_id"], item["outcome"], item["status"]) for item in r.json()] == [
+        (accepted, "applied", "checked_in"),
+        (pending, "conflict", "pending"),
+        (missing, "not_found", None),
+        (accepted, "applied", "checked_in"),
+        (checked_in, "conflict", "checked_in"),
+    ]
+    assert _statuses(db, [accepted, pending, checked_in]) == ["checked_in", "pending", "checked_in"]
+    assert db.get(DBAppointment, accepted).check_in_time is not None
+
+def test_bulk_cancel_moves_every_allowed_source_and_revokes_passes(client, staff_headers, db):
+    ids = _appointments(db, "pending", "accepted", "completed")
+    r = client.patch("/api/v1/employees/appointments/status", headers=staff_headers,
+                     json={"appointment_ids": ids, "status": "cancelled"})
+    assert r.status_code == 200, r.text
+    assert [item["outcome"] for item in r.json()] == ["applied", "applied", "conflict"]
+    assert _statuses(db, ids) == ["cancelled", "cancelled", "completed"]
+    assert is_revoked(ids[1])
+
+def test_bulk_transition_to_unsupported_status_is_refused(client, staff_headers, db):
+    ids = _appointments(db, "accepted")
+    r = client.patch("/api/v1/employees/appointments/status", headers=staff_headers,
+                     json={"appointment_ids": ids, "status": "pending"})
+    assert r.status_code == 400
+    assert _statuses(db, ids) == ["accepted"]
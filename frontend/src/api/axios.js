@@ -11,13 +11,25 @@ const api = axios.create({
 
 // Add request interceptor to include auth token
 api.interceptors.request.use((config) => {
-    const auth = JSON.parse(localStorage.getItem('vms_auth'));
-    if (auth && auth.token) {
-        config.headers.Authorization = `Bearer ${auth.token}`;
+    const token = localStorage.getItem('token');
+    if (token) {
+        config.headers.Authorization = `Bearer ${token}`;
     }
     return config;
 }, (error) => {
     return Promise.reject(error);
 });
 
+// Follow the next_cursor links of a paginated list endpoint and collect every item
+export const fetchAllPages = async (url, params = {}) => {
+    const items = [];
+    let cursor = null;
+    do {
+        const res = await api.get(url, { params: cursor ? { ...params, cursor } : params });
+        items.push(...res.data.items);
+        cursor = res.data.next_cursor;
+    } while (cursor);
+    return items;
+};
+
 export default api;
@@ -1,7 +1,7 @@
 import React, { useState, useEffect } from 'react';
-import api from '../api/axios';
+import api, { fetchAllPages } from '../api/axios';
 import { useAuth } from '../context/AuthContext';
-import { Check, X, Clock as ClockIcon, Edit2 } from 'lucide-react';
+import { Check, X, Clock as ClockIcon, Edit2, QrCode } from 'lucide-react';
 
 function AppointmentList({ visitorId }) {
     const { user } = useAuth();
@@ -17,14 +17,14 @@ function AppointmentList({ visitorId }) {
             if (user?.role === 'admin') {
                 url = '/admin/appointments/all';
             } else if (user?.role === 'employee' || user?.role === 'security') {
-                url = `/employees/my-schedule?employee_id=${user.id || 1}`;
+                url = `/employees/my-schedule`;
             } else {
-                url = `/visitors/appointments?visitor_id=${visitorId}`;
+                url = '/visitors/appointments';
             }
 
-            const response = await api.get(url);
+            const data = user?.role === 'admin' ? await fetchAllPages(url) : (await api.get(url)).data;
             // Sort by time
-            const sorted = response.data.sort((a, b) => new Date(a.scheduled_time) - new Date(b.scheduled_time));
+            const sorted = data.sort((a, b) => new Date(a.scheduled_time) - new Date(b.scheduled_time));
             setAppointments(sorted);
         } catch (err) {
             console.error('Failed to fetch appointments');
@@ -35,7 +35,7 @@ function AppointmentList({ visitorId }) {
 
     const updateStatus = async (id, status) => {
         try {
-            await api.patch(`/employees/appointments/${id}/status?employee_id=${user.id}`, { status });
+            await api.patch(`/employees/appointments/${id}/status`, { status });
             fetchAppointments();
         } catch (err) {
             alert('Failed to update status');
@@ -44,7 +44,7 @@ function AppointmentList({ visitorId }) {
 
     const updateDuration = async (id) => {
         try {
-            await api.patch(`/employees/appointments/${id}/duration?employee_id=${user.id}`, { duration_minutes: parseInt(newDuration) });
+            await api.patch(`/employees/appointments/${id}/duration`, { duration_minutes: parseInt(newDuration) });
             setEditingDuration(null);
             fetchAppointments();
         } catch (err) {
@@ -52,6 +52,15 @@ function AppointmentList({ visitorId }) {
         }
     };
 
+    const openPass = async (id) => {
+        try {
+            const { data } = await api.get(`/visitors/appointments/${id}/pass`);
+            window.open(`${api.defaults.baseURL}${data.qr_url}`, '_blank');
+        } catch (err) {
+            alert(err.response?.data?.detail || 'Failed to load pass');
+        }
+    };
+
     useEffect(() => {
         if (user) fetchAppointments();
     }, [visitorId, user]);
@@ -146,6 +155,9 @@ function AppointmentList({ visitorId }) {
                                         <span className={`status-pill ${appt.status}`}>
                                             {appt.status}
                                         </span>
+                                        {user?.role === 'visitor' && appt.status === 'accepted' && (
+                                            <button onClick={() => openPass(appt.id)} className="text-btn" title="Gate pass"><QrCode size={14} /> Pass</button>
+                                        )}
                                     </td>
                                     {canManage && (
                                         <td>
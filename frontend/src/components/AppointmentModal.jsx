@@ -1,5 +1,5 @@
 import React, { useState, useEffect, useRef, useCallback } from 'react';
-import api from '../api/axios';
+import api, { fetchAllPages } from '../api/axios';
 import DatePicker from 'react-datepicker';
 import "react-datepicker/dist/react-datepicker.css";
 import { User, Calendar, Clock, X, Search, UserPlus, Camera } from 'lucide-react';
@@ -57,10 +57,10 @@ function AppointmentModal({ onClose, onSuccess, preSelectedVisitor = null, initi
             try {
                 const [empRes, visRes] = await Promise.all([
                     api.get('/admin/users/employees'),
-                    isStaff ? api.get('/employees/visitor-list') : Promise.resolve({ data: [] })
+                    isStaff ? fetchAllPages('/employees/visitor-list') : Promise.resolve([])
                 ]);
                 setEmployees(empRes.data);
-                setVisitors(visRes.data);
+                setVisitors(visRes);
             } catch (err) {
                 console.error("Failed to fetch data", err);
             }
@@ -68,12 +68,19 @@ function AppointmentModal({ onClose, onSuccess, preSelectedVisitor = null, initi
         fetchData();
     }, [isStaff]);
 
+    const scheduleDay = scheduledTime.toDateString();
+
     useEffect(() => {
         if (hostName) {
             const fetchHostSchedule = async () => {
                 setFetchingSchedule(true);
                 try {
-                    const res = await api.get(`/visitors/host-schedule?host_name=${encodeURIComponent(hostName)}`);
+                    // Only the selected day; the server rejects overlapping bookings itself
+                    const dayStart = new Date(scheduleDay);
+                    const dayEnd = new Date(dayStart.getTime() + 24 * 60 * 60 * 1000);
+                    const res = await api.get('/visitors/host-schedule', {
+                        params: { host_name: hostName, date_from: dayStart.toISOString(), date_to: dayEnd.toISOString() }
+                    });
                     setHostAppointments(res.data);
                 } catch (err) {
                     console.error("Schedule fetch failed");
@@ -84,7 +91,7 @@ function AppointmentModal({ onClose, onSuccess, preSelectedVisitor = null, initi
             const timer = setTimeout(fetchHostSchedule, 500);
             return () => clearTimeout(timer);
         }
-    }, [hostName]);
+    }, [hostName, scheduleDay]);
 
     const handleHostChange = (e) => {
         const value = e.target.value;
@@ -133,7 +140,7 @@ function AppointmentModal({ onClose, onSuccess, preSelectedVisitor = null, initi
         try {
             let url;
             if (isBlockedSlot) {
-                url = `/employees/schedule/block?employee_id=${user.id || 1}`;
+                url = `/employees/schedule/block`;
             } else if (isStaff) {
                 if (visitorMode === 'existing') {
                     if (!selectedVisitor) {
@@ -150,10 +157,9 @@ function AppointmentModal({ onClose, onSuccess, preSelectedVisitor = null, initi
                     }
                     payload.visitor_info = newVisitor;
                 }
-                url = `/employees/book-for-visitor?employee_id=${user.id || 1}`;
+                url = `/employees/book-for-visitor`;
             } else {
-                payload.visitor_id = user.id || 1;
-                url = `/visitors/appointments?visitor_id=${user.id || 1}`;
+                url = '/visitors/appointments';
             }
 
             await api.post(url, payload);
@@ -13,7 +13,7 @@ function CalendarSync() {
         e.preventDefault();
         setLoading(true);
         try {
-            const res = await api.post(`/employees/sync-calendar?employee_id=${user.id}`, {
+            const res = await api.post(`/employees/sync-calendar`, {
                 calendar_url: calendarUrl
             });
 
@@ -17,7 +17,7 @@ function InteractiveCalendar({ visitorId, onSlotDoubleClick, refreshTrigger }) {
     const fetchAppointments = async () => {
         setLoading(true);
         try {
-            const res = await api.get(`/visitors/appointments?visitor_id=${visitorId}`);
+            const res = await api.get('/visitors/appointments');
             setAppointments(res.data);
         } catch (err) {
             console.error("Failed to fetch appointments for calendar");
@@ -1,5 +1,5 @@
 import React, { useState, useRef, useCallback } from 'react';
-import api from '../api/axios';
+import api, { fetchAllPages } from '../api/axios';
 import Webcam from 'react-webcam';
 import { UserPlus, Shield, User as UserIcon, Camera, Check } from 'lucide-react';
 import { useEffect } from 'react';
@@ -35,7 +35,7 @@ function ManageUsers({ adminId }) {
         setMessage('');
         setLoading(true);
         try {
-            await api.post(`/admin/create-user?admin_id=${adminId}`, formData);
+            await api.post(`/admin/create-user`, formData);
             setMessage('User created successfully!');
             setFormData({
                 full_name: '',
@@ -56,8 +56,8 @@ function ManageUsers({ adminId }) {
         let mounted = true;
         const fetchVisitors = async () => {
             try {
-                const res = await api.get('/admin/users/visitors');
-                if (mounted) setVisitors(res.data);
+                const data = await fetchAllPages('/admin/users/visitors');
+                if (mounted) setVisitors(data);
             } catch (e) {
                 // ignore
             }
@@ -1,5 +1,5 @@
 import React, { useState, useEffect } from 'react';
-import api from '../api/axios';
+import api, { fetchAllPages } from '../api/axios';
 import { Download, BarChart2, Users, Calendar, CheckCircle, Clock, ChevronRight } from 'lucide-react';
 
 function Reports({ adminId }) {
@@ -11,7 +11,7 @@ function Reports({ adminId }) {
 
     const fetchStats = async () => {
         try {
-            const response = await api.get(`/admin/reports/stats?admin_id=${adminId}`);
+            const response = await api.get(`/admin/reports/stats`);
             setStats(response.data);
         } catch (err) {
             console.error("Failed to fetch stats");
@@ -22,17 +22,11 @@ function Reports({ adminId }) {
         setRecordsLoading(true);
         try {
             if (tab === 'visitors') {
-                const res = await api.get('/employees/visitor-list');
-                setRecords(res.data);
+                setRecords(await fetchAllPages('/employees/visitor-list'));
             } else {
-                const res = await api.get('/admin/appointments/all');
-                let filtered = res.data;
-                if (tab === 'pending') {
-                    filtered = res.data.filter(a => a.status === 'pending');
-                } else if (tab === 'completed') {
-                    filtered = res.data.filter(a => a.status === 'completed');
-                }
-                setRecords(filtered);
+                // Status filtering is done server-side
+                const params = (tab === 'pending' || tab === 'completed') ? { status: tab } : {};
+                setRecords(await fetchAllPages('/admin/appointments/all', params));
             }
         } catch (err) {
             console.error("Failed to fetch records");
@@ -58,7 +52,7 @@ function Reports({ adminId }) {
 
     const downloadReport = async () => {
         try {
-            const response = await api.get(`/admin/reports/appointments/csv?admin_id=${adminId}`, {
+            const response = await api.get(`/admin/reports/appointments/csv`, {
                 responseType: 'blob',
             });
             const url = window.URL.createObjectURL(new Blob([response.data]));
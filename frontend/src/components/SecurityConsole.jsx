@@ -1,6 +1,6 @@
 import React, { useState, useEffect } from 'react';
-import api from '../api/axios';
-import { Search, LogIn, LogOut, User, ShieldCheck, History, Info, Plus } from 'lucide-react';
+import api, { fetchAllPages } from '../api/axios';
+import { Search, LogIn, LogOut, User, ShieldCheck, History, Info, Plus, QrCode } from 'lucide-react';
 import AppointmentModal from './AppointmentModal';
 import VisitorsTable from './VisitorsTable';
 
@@ -15,19 +15,20 @@ function SecurityConsole() {
     const [visitors, setVisitors] = useState([]);
     const [showModal, setShowModal] = useState(false);
     const [preSelectedVisitor, setPreSelectedVisitor] = useState(null);
+    const [passToken, setPassToken] = useState('');
+    const [scanResult, setScanResult] = useState(null);
 
     const fetchDailyAppointments = async () => {
         try {
             const [dailyRes, recentRes] = await Promise.all([
-                api.get('/security/daily-appointments'),
+                fetchAllPages('/security/daily-appointments'),
                 api.get('/security/recent-activity')
             ]);
-            setAppointments(dailyRes.data);
+            setAppointments(dailyRes);
             setRecentActivity(recentRes.data);
             // fetch visitors list for quick lookup
             try {
-                const vres = await api.get('/admin/users/visitors');
-                setVisitors(vres.data);
+                setVisitors(await fetchAllPages('/admin/users/visitors'));
             } catch (e) {
                 // non-fatal
             }
@@ -38,8 +39,16 @@ function SecurityConsole() {
 
     useEffect(() => {
         fetchDailyAppointments();
-        const interval = setInterval(fetchDailyAppointments, 30000); // Poll every 30s
-        return () => clearInterval(interval);
+        // Refresh as soon as the server pushes a change; slow polling is only a fallback
+        const events = new EventSource(`${api.defaults.baseURL}/events/stream?token=${encodeURIComponent(localStorage.getItem('token') || '')}`);
+        const refresh = () => fetchDailyAppointments();
+        ['appointment.created', 'appointment.status_changed', 'appointment.checked_in',
+            'appointment.checked_out', 'resync'].forEach((type) => events.addEventListener(type, refresh));
+        const interval = setInterval(fetchDailyAppointments, 120000);
+        return () => {
+            events.close();
+            clearInterval(interval);
+        };
     }, []);
 
     const handleCheckIn = async (id) => {
@@ -60,14 +69,36 @@ function SecurityConsole() {
         }
     };
 
+    // QR scanners type the pass token followed by Enter, which submits this form
+    const scanPass = async (e) => {
+        e.preventDefault();
+        if (!passToken) return;
+        try {
+            const { data } = await api.post('/security/scan', { token: passToken });
+            setScanResult({ ok: true, text: `${data.visitor_name} checked in to see ${data.host_name}` });
+            fetchDailyAppointments();
+        } catch (err) {
+            setScanResult({ ok: false, text: err.response?.data?.detail || "Pass check-in failed" });
+        } finally {
+            setPassToken('');
+        }
+    };
+
     const searchProfile = async (e) => {
         e.preventDefault();
         if (!searchPhone) return;
         setLoading(true);
         setError('');
         try {
-            const res = await api.get(`/security/visitor-profile/${searchPhone}`);
-            setSelectedVisitor(res.data);
+            // Best match by name, phone or email, then its full profile
+            const { data } = await api.get('/security/search', { params: { q: searchPhone, kind: 'user', limit: 1 } });
+            if (data.items.length === 0) throw new Error('not found');
+            const phone = encodeURIComponent(data.items[0].user.phone_number);
+            const [profileRes, historyRes] = await Promise.all([
+                api.get(`/security/visitor-profile/${phone}`),
+                api.get(`/security/visitor-profile/${phone}/history`, { params: { limit: 3 } })
+            ]);
+            setSelectedVisitor({ ...profileRes.data, history: historyRes.data.items });
         } catch (err) {
             setError("Visitor not found");
             setSelectedVisitor(null);
@@ -151,11 +182,23 @@ function SecurityConsole() {
             {/* Profile Lookup */}
             <div className="profile-lookup">
                 <div className="card">
+                    <h3><QrCode size={18} /> Scan Pass</h3>
+                    <form onSubmit={scanPass} className="search-bar">
+                        <input
+                            type="text"
+                            placeholder="Scan visitor QR pass"
+                            value={passToken}
+                            onChange={(e) => setPassToken(e.target.value)}
+                        />
+                        <button type="submit"><LogIn size={18} /></button>
+                    </form>
+                    {scanResult && <p className={scanResult.ok ? 'hint' : 'error-text'}>{scanResult.text}</p>}
+
                     <h3><User size={18} /> Visitor ID Lookup</h3>
                     <form onSubmit={searchProfile} className="search-bar">
                         <input
                             type="text"
-                            placeholder="Phone Number (+91...)"
+                            placeholder="Name or phone number"
                             value={searchPhone}
                             onChange={(e) => setSearchPhone(e.target.value)}
                         />
@@ -222,12 +265,23 @@ function SecurityConsole() {
                                     <label>Address</label>
                                     <p>{selectedVisitor.profile.address?.city}, {selectedVisitor.profile.address?.state}</p>
                                 </div>
+                                <div className="detail-item">
+                                    <label>Visits</label>
+                                    <p>
+                                        {selectedVisitor.stats.visit_count}
+                                        {selectedVisitor.stats.last_visit_at && ` (last ${new Date(selectedVisitor.stats.last_visit_at).toLocaleDateString()})`}
+                                    </p>
+                                </div>
+                                <div className="detail-item">
+                                    <label>On Site</label>
+                                    <p>{selectedVisitor.stats.checked_in ? 'Checked in now' : 'No'}</p>
+                                </div>
                             </div>
 
                             <div className="history-section">
                                 <h5><History size={14} /> Recent Visits</h5>
                                 <ul className="visit-history">
-                                    {selectedVisitor.appointment_history.slice(0, 3).map(h => (
+                                    {selectedVisitor.history.map(h => (
                                         <li key={h.id}>
                                             <span>{new Date(h.scheduled_time).toLocaleDateString()}</span>
                                             <span>{h.host_name}</span>
@@ -1,5 +1,5 @@
 import React, { useState, useEffect, useRef, useCallback } from 'react';
-import api from '../api/axios';
+import api, { fetchAllPages } from '../api/axios';
 import Webcam from 'react-webcam';
 import { Save, UserCog, AlertCircle, RefreshCw, Camera, Check } from 'lucide-react';
 
@@ -15,8 +15,7 @@ function StaffManager({ adminId }) {
     const fetchStaff = async () => {
         setLoading(true);
         try {
-            const res = await api.get('/admin/users/all-staff');
-            setStaff(res.data);
+            setStaff(await fetchAllPages('/admin/users/all-staff'));
         } catch (err) {
             setError("Failed to load staff list");
         } finally {
@@ -35,7 +34,7 @@ function StaffManager({ adminId }) {
 
     const handleSave = async (id) => {
         try {
-            await api.patch(`/admin/users/${id}?admin_id=${adminId}`, editingData);
+            await api.patch(`/admin/users/${id}`, editingData);
             setEditMode(null);
             setShowCamera(false);
             fetchStaff();
@@ -96,7 +95,7 @@ function StaffManager({ adminId }) {
                                         </div>
                                     ) : (
                                         <div className="staff-avatar-sm">
-                                            {user.face_image_path ? <img src={`${api.defaults.baseURL}/admin/proxy-image?path=${user.face_image_path}`} alt="staff" /> : user.full_name.charAt(0)}
+                                            {user.face_image_path ? <img src={`${api.defaults.baseURL}/admin/proxy-image?size=64&path=${encodeURIComponent(user.face_image_path)}&token=${encodeURIComponent(localStorage.getItem('token') || '')}`} alt="staff" /> : user.full_name.charAt(0)}
                                         </div>
                                     )}
                                 </td>